@@ -1,3 +1,5 @@
+using System.Buffers.Binary;
+using System.Net.Http.Headers;
 using System.Net.Http.Json;
 using System.Text.Json;
 using SecureAuth.Api.DTOs;
@@ -31,11 +33,18 @@ public class PythonRAGService : IPythonRAGService
                 openai_api_key = config.OpenAIApiKey
             };
 
-            var response = await _httpClient.PostAsJsonAsync($"{_pythonApiBaseUrl}/embed", request);
+            using var message = new HttpRequestMessage(HttpMethod.Post, $"{_pythonApiBaseUrl}/embed")
+            {
+                Content = JsonContent.Create(request)
+            };
+            // Raw float32 body instead of JSON decimals
+            message.Headers.Accept.Add(new MediaTypeWithQualityHeaderValue("application/octet-stream"));
+
+            using var response = await _httpClient.SendAsync(message);
             response.EnsureSuccessStatusCode();
 
-            var result = await response.Content.ReadFromJsonAsync<EmbeddingResponse>();
-            return result?.Embedding ?? Array.Empty<double>();
+            var payload = await response.Content.ReadAsByteArrayAsync();
+            return DecodeEmbedding(payload);
         }
         catch (Exception ex)
         {
@@ -101,8 +110,21 @@ public class PythonRAGService : IPythonRAGService
         }
     }
 
-    private class EmbeddingResponse
+    // Binary /embed body: uint32 count, uint32 dimension, then count * dimension
+    // float32 values, all little-endian
+    private static double[] DecodeEmbedding(byte[] payload)
     {
-        public double[] Embedding { get; set; } = Array.Empty<double>();
+        if (payload.Length < 8)
+            throw new InvalidDataException("Embedding payload too short");
+
+        var count = BinaryPrimitives.ReadUInt32LittleEndian(payload.AsSpan(0, 4));
+        var dimension = (int)BinaryPrimitives.ReadUInt32LittleEndian(payload.AsSpan(4, 4));
+        if (count != 1 || payload.Length != 8 + dimension * 4)
+            throw new InvalidDataException("Unexpected embedding payload size");
+
+        var embedding = new double[dimension];
+        for (var i = 0; i < dimension; i++)
+            embedding[i] = BinaryPrimitives.ReadSingleLittleEndian(payload.AsSpan(8 + i * 4, 4));
+        return embedding;
     }
 }
@@ -0,0 +1,65 @@
+"""Benchmark local bulk encoding throughput against worker process count.
+
+Usage:
+    python -m benchmarks.bench_local_encode --docs 4000 --workers 1,2,4,8
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+from src.embeddings.local_embeddings import LocalEmbeddings
+
+WORDS = (
+    "elbise tişört pamuklu rahat günlük yaz kış ceket siyah beyaz kırmızı "
+    "mavi bedeni kumaş şık spor klasik uzun kısa kol yaka desenli düz"
+).split()
+
+
+def _documents(count: int, words: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        " ".join(rng.choice(WORDS, size=rng.integers(words // 2, words * 2)))
+        for _ in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="intfloat/multilingual-e5-large", help="Sentence transformer model")
+    parser.add_argument("--docs", type=int, default=2000, help="Documents per configuration")
+    parser.add_argument("--words", type=int, default=60, help="Average words per document")
+    parser.add_argument(
+        "--workers",
+        default="1,2,4,8",
+        help="Comma-separated worker process counts (capped at CPU count)"
+    )
+    parser.add_argument("--threads-per-worker", type=int, default=0, help="torch threads per worker (0 = CPUs / workers)")
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    documents = _documents(args.docs, args.words)
+    print(f"[INFO] {args.docs} documents, ~{args.words} words each, {cpus} CPUs")
+
+    for workers in sorted({min(int(w), cpus) for w in args.workers.split(",")}):
+        threads = args.threads_per_worker or max(1, cpus // workers)
+        embedder = LocalEmbeddings(
+            model=args.model,
+            bulk_workers=workers,
+            bulk_threads_per_worker=threads
+        )
+        try:
+            embedder.embed_documents(documents[:workers * 8])  # warm up (loads replicas)
+            start = time.perf_counter()
+            embedder.embed_documents(documents)
+            elapsed = time.perf_counter() - start
+        finally:
+            embedder.close()
+        print(f"workers={workers:<3} threads={threads:<3} {args.docs / elapsed:10.1f} docs/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Benchmark search response serialization: pydantic models vs pre-serialized fragments.
+
+Both paths serve the same precomputed search results (no embedding or
+scoring), so the numbers isolate response building. Requests go through a
+FastAPI app in process over ASGI.
+
+Usage:
+    python -m benchmarks.bench_search_response --products 20000 --top-k 10
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+import httpx
+import numpy as np
+from fastapi import FastAPI, Response
+
+from src.api.responses import FastJSONResponse
+from src.api.server import ProductResult, SearchResponse
+from src.product_json import ORJSON_AVAILABLE, dumps
+from src.rag_engine import ProductIndex
+
+COLORS = ["Siyah", "Beyaz", "Kırmızı", "Mavi", "Yeşil", "Bej"]
+SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+
+
+def _products(count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            "product_id": i // 4,
+            "variant_id": i,
+            "title": f"Pamuklu Günlük Elbise {i}",
+            "vendor": "Örnek Marka",
+            "product_type": "Elbise",
+            "price": round(float(rng.uniform(100, 2000)), 2),
+            "colors": list(rng.choice(COLORS, size=3, replace=False)),
+            "sizes": SIZES[:int(rng.integers(2, len(SIZES)))],
+            "text": "",
+        }
+        for i in range(count)
+    ]
+
+
+def _app(index: ProductIndex, result_sets: List[list]) -> FastAPI:
+    app = FastAPI(default_response_class=FastJSONResponse)
+
+    # The serialization used before fragments
+    @app.get("/pydantic/{n}")
+    async def pydantic_path(n: int):
+        results = result_sets[n]
+        products = [
+            ProductResult(
+                product_id=r["product"]["product_id"],
+                variant_id=r["product"]["variant_id"],
+                title=r["product"]["title"],
+                vendor=r["product"]["vendor"],
+                product_type=r["product"]["product_type"],
+                price=r["product"]["price"],
+                colors=r["product"]["colors"],
+                sizes=r["product"]["sizes"],
+                similarity=r["similarity"]
+            )
+            for r in results
+        ]
+        payload = SearchResponse(query="elbise", results=products, count=len(products)).model_dump_json()
+        return Response(content=payload, media_type="application/json")
+
+    @app.get("/fragments/{n}")
+    async def fragment_path(n: int):
+        results = result_sets[n]
+        body = b",".join(
+            index.result_fragment(r["product"]) + dumps(float(r["similarity"])) + b"}" for r in results
+        )
+        payload = (
+            b'{"query":' + dumps("elbise") + b',"results":[' + body
+            + f'],"count":{len(results)}}}'.encode("utf-8")
+        )
+        return FastJSONResponse(content=payload)
+
+    return app
+
+
+async def _run(app: FastAPI, path: str, requests: int, concurrency: int, sets: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def worker(offset: int) -> None:
+            for i in range(offset, requests, concurrency):
+                response = await client.get(f"{path}/{i % sets}")
+                response.raise_for_status()
+
+        await asyncio.gather(*(worker(c) for c in range(concurrency)))  # warm up
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(c) for c in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20000, help="Catalog rows")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per response")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per path")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    args = parser.parse_args()
+
+    products = _products(args.products)
+    matrix = np.zeros((len(products), 1), dtype=np.float32)
+    start = time.perf_counter()
+    index = ProductIndex(products, matrix, "bench")
+    print(
+        f"[INFO] {args.products} products indexed in {time.perf_counter() - start:.2f}s, "
+        f"top_k={args.top_k}, orjson={'yes' if ORJSON_AVAILABLE else 'no'}"
+    )
+
+    rng = np.random.default_rng(1)
+    result_sets = [
+        [
+            {"product": products[row], "similarity": float(score)}
+            for row, score in zip(rng.integers(0, len(products), args.top_k), np.sort(rng.random(args.top_k))[::-1])
+        ]
+        for _ in range(256)
+    ]
+    app = _app(index, result_sets)
+
+    rates = {}
+    for path in ("/pydantic", "/fragments"):
+        rates[path] = asyncio.run(_run(app, path, args.requests, args.concurrency, len(result_sets)))
+        print(f"{path:<12} {rates[path]:10.1f} req/s")
+    print(f"speedup      {rates['/fragments'] / rates['/pydantic']:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark sharded search latency against shard (process) count.
+
+Usage:
+    python -m benchmarks.bench_sharded_search --rows 500000 --dim 1024
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import time
+from typing import List
+
+import numpy as np
+
+from src.sharded_index import ShardedIndex
+from src.utils.ranking import select_top
+
+
+def _percentiles(samples: List[float]) -> str:
+    ms = np.array(samples) * 1000
+    return f"p50={np.percentile(ms, 50):8.2f}ms  p99={np.percentile(ms, 99):8.2f}ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000, help="Catalog rows")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per configuration")
+    parser.add_argument("--top-k", type=int, default=10, help="Results per query")
+    parser.add_argument(
+        "--shards",
+        default="1,2,4,8,16,32",
+        help="Comma-separated shard counts (capped at CPU count)"
+    )
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((args.rows, args.dim), dtype=np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    product_ids = np.arange(args.rows) // 6
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    print(f"[INFO] {args.rows} rows x {args.dim} dims, {args.queries} queries, {cpus} CPUs")
+
+    samples = []
+    for q in queries:
+        start = time.perf_counter()
+        select_top(matrix @ q, args.top_k, product_ids, True)
+        samples.append(time.perf_counter() - start)
+    print(f"in-process        {_percentiles(samples)}")
+
+    for shards in sorted({min(int(s), cpus) for s in args.shards.split(",")}):
+        index = ShardedIndex(matrix, product_ids, shards)
+        try:
+            index.search(queries[:1], args.top_k, True)  # warm up workers
+            samples = []
+            for q in queries:
+                start = time.perf_counter()
+                index.search(q[None, :], args.top_k, True)
+                samples.append(time.perf_counter() - start)
+        finally:
+            index.close()
+        print(f"shards={shards:<3}        {_percentiles(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -45,6 +45,16 @@ class Config:
         """Get local embedding model."""
         return self.get('embedding', 'local', 'model', default='intfloat/multilingual-e5-large')
 
+    @property
+    def embedding_sidecar_enabled(self) -> bool:
+        """Whether local embeddings are served by the shared inference sidecar."""
+        return bool(self.get('embedding', 'local', 'sidecar', 'enabled', default=False))
+
+    @property
+    def embedding_sidecar_socket(self) -> str:
+        """Get Unix socket path of the inference sidecar."""
+        return self.get('embedding', 'local', 'sidecar', 'socket', default='/tmp/feattie-embeddings.sock')
+
     @property
     def llm_model(self) -> str:
         """Get LLM model."""
@@ -65,6 +75,11 @@ class Config:
         """Get products RAG path."""
         return self.get('data', 'products_rag', default='./out/products_rag.jsonl')
 
+    @property
+    def index_snapshot_path(self) -> str:
+        """Get directory of the persisted search index snapshot."""
+        return self.get('data', 'index_snapshot', default='./out/index_snapshot')
+
 
 # Global config instance
 _config = None
@@ -1,14 +1,59 @@
 """Main entry point for running the API server."""
+import os
+import subprocess
+import sys
+import time
+
 import uvicorn
 from config import get_config
 
+
+def start_embedding_sidecar(config) -> subprocess.Popen:
+    """Start the shared embedding inference process and wait until it listens."""
+    sidecar = config.get('embedding', 'local', 'sidecar', default={})
+    socket_path = config.embedding_sidecar_socket
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    process = subprocess.Popen([
+        sys.executable, "-m", "src.embeddings.inference_server",
+        "--socket", socket_path,
+        "--model", config.local_embedding_model,
+        "--device", config.get('embedding', 'local', 'device', default='cpu'),
+        "--threads", str(sidecar.get('threads', 0)),
+        "--max-batch", str(sidecar.get('max_batch', 64)),
+        "--max-wait-ms", str(sidecar.get('max_wait_ms', 5)),
+    ])
+
+    deadline = time.time() + sidecar.get('startup_timeout', 300)
+    while not os.path.exists(socket_path):
+        if process.poll() is not None:
+            raise RuntimeError(f"Embedding sidecar exited with code {process.returncode}")
+        if time.time() > deadline:
+            process.terminate()
+            raise RuntimeError("Timed out waiting for the embedding sidecar to start")
+        time.sleep(0.2)
+
+    return process
+
+
 if __name__ == "__main__":
     config = get_config()
 
-    uvicorn.run(
-        "src.api.server:app",
-        host=config.api_host,
-        port=config.api_port,
-        reload=config.get('api', 'reload', default=False),
-        workers=config.get('api', 'workers', default=1)
-    )
+    sidecar_process = None
+    if config.embedding_provider == "local" and config.embedding_sidecar_enabled:
+        sidecar_process = start_embedding_sidecar(config)
+
+    try:
+        uvicorn.run(
+            "src.api.server:app",
+            host=config.api_host,
+            port=config.api_port,
+            reload=config.get('api', 'reload', default=False),
+            workers=config.get('api', 'workers', default=1)
+        )
+    finally:
+        if sidecar_process is not None:
+            sidecar_process.terminate()
+            sidecar_process.wait()
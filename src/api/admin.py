@@ -0,0 +1,104 @@
+"""Admin-only endpoints shared by the API servers.
+
+Admin endpoints are disabled unless ``ADMIN_API_TOKEN`` is set; callers must
+send the same value in the ``X-Admin-Token`` header.
+"""
+from __future__ import annotations
+
+import hmac
+import json
+import os
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from pydantic import BaseModel
+
+from src.utils.openai_pool import get_openai_pool
+from src.utils.profiling import get_profiler
+from src.utils.startup import get_startup_report
+
+
+def require_admin(x_admin_token: Optional[str] = Header(default=None)) -> None:
+    """FastAPI dependency guarding admin endpoints."""
+    expected = os.environ.get("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_TOKEN not set)")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, expected):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+
+class ProfileRequest(BaseModel):
+    requests: Optional[int] = None
+    seconds: Optional[float] = None
+
+
+@router.post("/profile", status_code=202)
+async def start_profile(request: ProfileRequest):
+    """Profile the next N requests and/or the next T seconds."""
+    try:
+        session = get_profiler().start_session(
+            max_requests=request.requests,
+            duration=request.seconds
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return session.status()
+
+
+@router.get("/profile")
+async def get_profile(format: str = "text", limit: int = 50):
+    """Get profiling results (``text``, ``pstats`` or ``collapsed``).
+
+    Returns the session status with 202 while the session is still running.
+    """
+    session = get_profiler().session
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profiling session")
+    if not session.done:
+        return Response(
+            content=json.dumps(session.status()),
+            status_code=202,
+            media_type="application/json"
+        )
+
+    try:
+        payload = session.render(format, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if format == "pstats":
+        return Response(
+            content=payload,
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": 'attachment; filename="profile.pstats"'}
+        )
+    return Response(content=payload, media_type="text/plain; charset=utf-8")
+
+
+@router.get("/slow-requests")
+async def get_slow_requests():
+    """Download captured slow requests (oldest first)."""
+    profiler = get_profiler()
+    return Response(
+        content=json.dumps(list(profiler.slow_requests), ensure_ascii=False),
+        media_type="application/json",
+        headers={"Content-Disposition": 'attachment; filename="slow-requests.json"'}
+    )
+
+
+@router.get("/startup")
+async def get_startup():
+    """Startup-time report broken down by import and phase."""
+    return get_startup_report().summary()
+
+
+@router.get("/openai-clients")
+async def openai_clients():
+    """OpenAI client pool size and connection reuse."""
+    return get_openai_pool().stats()
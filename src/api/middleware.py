@@ -0,0 +1,54 @@
+"""HTTP middleware shared by the API servers."""
+from __future__ import annotations
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+
+from src.utils import metrics
+from src.utils.admission import Overloaded
+from src.utils.profiling import get_profiler
+
+# Paths that are never profiled or captured as slow requests
+_UNPROFILED_PREFIXES = ("/admin", "/metrics")
+
+
+def _endpoint_label(request: Request) -> str:
+    """Resolve the route template (e.g. ``/similar/{product_id}``) for a request.
+
+    Using the template rather than the raw path keeps metric label
+    cardinality bounded.
+    """
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", request.url.path)
+    return "unmatched"
+
+
+async def track_latency(request: Request, call_next):
+    """Time every request and expose it to ``metrics.stage`` blocks.
+
+    Requests are also handed to the profiler so that active profiling
+    sessions and slow-request capture see them.
+    """
+    with metrics.track_request(_endpoint_label(request)) as timings:
+        if request.url.path.startswith(_UNPROFILED_PREFIXES):
+            return await call_next(request)
+        with get_profiler().observe(timings):
+            return await call_next(request)
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """``fastapi.concurrency.run_in_threadpool`` that stays visible to profiling sessions."""
+    return await _run_in_threadpool(get_profiler().call, fn, *args, **kwargs)
+
+
+async def overloaded_handler(request: Request, exc: Overloaded) -> JSONResponse:
+    """Turn a shed request into a fast 429/503 with ``Retry-After``."""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": str(exc), "operation": exc.operation, "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
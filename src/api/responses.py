@@ -0,0 +1,48 @@
+"""Response classes shared by the API servers."""
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+from src.product_json import dumps
+from src.utils.metrics import RESULT_CACHE_LOOKUPS
+from src.utils.result_cache import etag_for, etag_matches
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` encoded with orjson when available.
+
+    Bodies that are already serialized (``bytes``) are sent as is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
+
+
+def cached_response(
+    operation: str,
+    payload: bytes,
+    if_none_match: Optional[str],
+    max_age: int,
+    etag: Optional[str] = None
+) -> Response:
+    """JSON response with ETag/Cache-Control, or 304 if the client's copy is current.
+
+    Args:
+        operation: Metrics label
+        payload: Response body
+        if_none_match: Request ``If-None-Match`` header
+        max_age: ``Cache-Control`` max-age in seconds
+        etag: ETag to use instead of one computed from ``payload`` (for
+            bodies with per-request fields such as timings)
+    """
+    etag = etag or etag_for(payload)
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if etag_matches(if_none_match, etag):
+        RESULT_CACHE_LOOKUPS.labels(operation, "not_modified").inc()
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
@@ -1,17 +1,32 @@
 """FastAPI server for product search and recommendations."""
 from __future__ import annotations
 
+# Imported first so the import timer sees the heavy imports below
+from src.utils import startup
+
+import asyncio
+import json
 from contextlib import asynccontextmanager
 from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
+from src.product_json import dumps, product_fragment, results_json
 from src.rag_engine import ProductRAG
+from src.similar_products import SimilarProducts
 from src.assistant import ProductAssistant
+from src.api import admin
+from src.api.middleware import overloaded_handler, run_in_threadpool, track_latency
+from src.api.responses import FastJSONResponse, cached_response
+from src.utils import metrics
+from src.utils.admission import Overloaded, admit
+from src.utils.coalesce import coalesce, normalize_query
+from src.utils.result_cache import ResultCache
 from config import get_config
 
 # Load environment variables
@@ -20,41 +35,95 @@ load_dotenv()
 # Load configuration
 config = get_config()
 
+# Search result cache (see search.cache_*), None when disabled
+result_cache: Optional[ResultCache] = None
+if config.get('search', 'cache_enabled', default=True):
+    result_cache = ResultCache(
+        max_entries=config.get('search', 'cache_max_entries', default=10000),
+        max_bytes=int(config.get('search', 'cache_max_memory_mb', default=32) * 1024 * 1024),
+    )
+
 # Global variables to store RAG and Assistant
 rag: Optional[ProductRAG] = None
 assistant: Optional[ProductAssistant] = None
+similar: Optional[SimilarProducts] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize RAG and Assistant on startup, keep in memory."""
-    global rag, assistant
+    global rag, assistant, similar
 
     print("[INFO] Starting up - Loading RAG system...")
 
+    # Local models are served by the shared sidecar when it is enabled
+    embedding_provider = config.embedding_provider
+    provider_kwargs = {}
+    if embedding_provider == "local" and config.embedding_sidecar_enabled:
+        embedding_provider = "sidecar"
+        provider_kwargs["socket_path"] = config.embedding_sidecar_socket
+    elif embedding_provider == "local":
+        provider_kwargs["bulk_workers"] = config.get('embedding', 'local', 'bulk_workers', default=0)
+        provider_kwargs["bulk_threads_per_worker"] = config.get(
+            'embedding', 'local', 'bulk_threads_per_worker', default=1
+        )
+
     # Initialize RAG with config
     rag = ProductRAG(
         jsonl_path=config.products_rag_path,
-        embedding_provider=config.embedding_provider,
+        embedding_provider=embedding_provider,
         embedding_model=(
             config.openai_embedding_model
             if config.embedding_provider == "openai"
             else config.local_embedding_model
-        )
+        ),
+        shards=config.get('search', 'shards', default=0),
+        index_mode=config.get('search', 'index_mode', default='variant'),
+        checkpoint_dir=config.get('data', 'index_checkpoint', default='./out/index_checkpoint'),
+        **provider_kwargs
     )
 
-    print("[INFO] Creating embeddings (one-time operation)...")
-    rag.create_embeddings()
+    # Serve the last snapshot right away; (re)build in the background if
+    # there is none or the catalog changed since it was saved
+    with startup.phase("load_snapshot"):
+        loaded = rag.load_snapshot(config.index_snapshot_path)
+
+    if not loaded or rag.snapshot_is_stale():
+        print("[INFO] Building index in the background...")
+        rag.start_background_build(snapshot_dir=config.index_snapshot_path)
+
+    # Neighbour graph for /similar, updated incrementally on every new index
+    if config.get('similar', 'enabled', default=True):
+        similar = SimilarProducts(
+            config.get('similar', 'path', default='./out/similar_products'),
+            k=config.get('similar', 'neighbours', default=20),
+            workers=config.get('similar', 'workers', default=0) or None,
+            memory_mb=config.get('similar', 'memory_mb', default=512)
+        )
+        rag.add_index_listener(similar.refresh)
 
     print("[INFO] Initializing LLM Assistant...")
-    assistant = ProductAssistant(rag, model=config.llm_model)
+    with startup.phase("assistant_init"):
+        assistant = ProductAssistant(
+            rag,
+            model=config.llm_model,
+            context_token_budget=config.get('llm', 'context_token_budget', default=1200)
+        )
+
+    if rag.ready:
+        print("[INFO] ✅ Server ready! Embeddings cached in memory.")
+    else:
+        print("[INFO] Accepting traffic; /ready reports 503 until the index is built.")
+    startup.get_startup_report().finish()
 
-    print("[INFO] ✅ Server ready! Embeddings cached in memory.")
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
 
     yield
 
     # Cleanup on shutdown
     print("[INFO] Shutting down...")
+    lag_monitor.cancel()
+    rag.close()
 
 
 # Create FastAPI app with lifespan
@@ -62,7 +131,8 @@ app = FastAPI(
     title="Shopify RAG Product Search",
     description="Product search and recommendation API using RAG",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
 # Enable CORS
@@ -76,6 +146,15 @@ if cors_config.get('enabled', True):
         allow_headers=["*"],
     )
 
+# Per-request latency tracking (see /metrics)
+app.middleware("http")(track_latency)
+
+# Shed requests answer 503 with Retry-After
+app.add_exception_handler(Overloaded, overloaded_handler)
+
+# Admin-only profiling and startup endpoints
+app.include_router(admin.router)
+
 # Serve static files (widget script)
 try:
     app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -91,14 +170,15 @@ class SearchRequest(BaseModel):
 
 
 class ProductResult(BaseModel):
-    product_id: int
-    variant_id: int
-    title: str
-    vendor: str
-    product_type: str
-    price: float
-    colors: List[str]
-    sizes: List[str]
+    # Catalog fields may be null (e.g. an unparseable price)
+    product_id: Optional[int] = None
+    variant_id: Optional[int] = None
+    title: Optional[str] = None
+    vendor: Optional[str] = None
+    product_type: Optional[str] = None
+    price: Optional[float] = None
+    colors: Optional[List[str]] = None
+    sizes: Optional[List[str]] = None
     similarity: float
 
 
@@ -108,6 +188,18 @@ class SearchResponse(BaseModel):
     count: int
 
 
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    top_k: int = 3
+    deduplicate: bool = True
+
+
+class SimilarResponse(BaseModel):
+    product_id: int
+    results: List[ProductResult]
+    count: int
+
+
 class AskRequest(BaseModel):
     query: str
     top_k: int = 3
@@ -119,6 +211,129 @@ class AskResponse(BaseModel):
     products_considered: int
 
 
+def _require_index() -> None:
+    """Fail with 503 while no search index is loaded."""
+    if rag is None or not rag.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Search index not ready",
+            headers={"Retry-After": "5"}
+        )
+
+
+async def _embed(query: str):
+    """Embed a query under admission control, sharing identical in-flight calls."""
+    async def run():
+        async with admit("embed"):
+            return await run_in_threadpool(rag.embed_query, query)
+
+    return await coalesce("embed", normalize_query(query), run)
+
+
+async def _retrieve(query: str, top_k: int, deduplicate: bool):
+    """Embed and search under admission control, off the event loop.
+
+    Identical concurrent searches share one computation.
+    """
+    async def run():
+        query_embedding = await _embed(query)
+        async with admit("search"):
+            return await run_in_threadpool(
+                rag.search_by_vector, query_embedding, top_k, deduplicate, query
+            )
+
+    return await coalesce("search", (normalize_query(query), top_k, deduplicate), run)
+
+
+async def _answer(query: str, top_k: int) -> str:
+    """Retrieve and ask the LLM, sharing identical in-flight questions."""
+    async def run():
+        results = await _retrieve(query, top_k, True)
+        async with admit("llm"):
+            return await run_in_threadpool(assistant.answer, query, results)
+
+    return await coalesce("ask", (normalize_query(query), top_k), run)
+
+
+async def _retrieve_many(queries: List[str], top_k: int, deduplicate: bool):
+    """Batch counterpart of ``_retrieve``."""
+    async with admit("embed"):
+        query_embeddings = await run_in_threadpool(rag.embed_queries, queries)
+    async with admit("search"):
+        return await run_in_threadpool(
+            rag.search_by_vectors, query_embeddings, top_k, deduplicate, queries
+        )
+
+
+def _results_json(results) -> bytes:
+    """Results as a JSON array, stitched from the index's pre-serialized products."""
+    index = rag.index if rag is not None else None
+    return results_json(results, index.result_fragment if index is not None else product_fragment)
+
+
+async def _cached_results(operation: str, query: str, top_k: int, deduplicate: bool, render) -> bytes:
+    """Serialized results of a search, cached until the index version changes.
+
+    ``render`` turns retrieval results into the cached JSON fragment; the
+    query itself is added per request, so queries differing only in case
+    or whitespace share an entry.
+    """
+    key = (normalize_query(query), top_k, deduplicate)
+    version = rag.index_version
+    if result_cache is not None:
+        fragment = result_cache.get(operation, "default", version, key)
+        if fragment is not None:
+            return fragment
+
+    results = await _retrieve(query, top_k, deduplicate)
+    with metrics.stage("serialize"):
+        fragment = render(results)
+
+    # Not cached if a new index was swapped in while searching
+    if result_cache is not None and rag.index_version == version:
+        result_cache.put(operation, "default", version, key, fragment)
+    return fragment
+
+
+def _search_fragment(results) -> bytes:
+    """``SearchResponse`` fields after ``query``."""
+    return b'"results":' + _results_json(results) + f',"count":{len(results)}}}'.encode("utf-8")
+
+
+def _product_ids_fragment(results) -> bytes:
+    """``/product-ids`` fields after ``query``."""
+    product_ids = [r["product"]["product_id"] for r in results]
+    return b'"product_ids":' + dumps(product_ids) + f',"count":{len(product_ids)}}}'.encode("utf-8")
+
+
+async def _cached_search(
+    operation: str,
+    query: str,
+    top_k: int,
+    deduplicate: bool,
+    render,
+    if_none_match: Optional[str]
+) -> Response:
+    """Search response with ETag/Cache-Control (304 if the client's copy is current)."""
+    _require_index()
+    metrics.set_request_labels(provider=config.embedding_provider)
+
+    try:
+        fragment = await _cached_results(operation, query, top_k, deduplicate, render)
+        payload = b'{"query":' + dumps(query) + b"," + fragment
+        return cached_response(
+            operation,
+            payload,
+            if_none_match,
+            config.get('search', 'cache_max_age', default=60)
+        )
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -130,89 +345,192 @@ async def root():
         "endpoints": {
             "search": "/search - Search for products",
             "ask": "/ask - Get AI recommendations",
-            "product_ids": "/product-ids - Get product IDs only"
+            "search_batch": "/search/batch - Search many queries (NDJSON)",
+            "product_ids": "/product-ids - Get product IDs only",
+            "similar": "/similar/{product_id} - Precomputed similar products",
+            "ready": "/ready - Readiness probe"
         }
     }
 
 
-@app.post("/search", response_model=SearchResponse)
-async def search_products(request: SearchRequest):
-    """Search for products using RAG."""
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once an index is being served, 503 before."""
+    if rag is None or not rag.ready:
+        status = rag.build_status() if rag is not None else {"ready": False}
+        return Response(
+            content=json.dumps(status),
+            status_code=503,
+            media_type="application/json"
+        )
+    return rag.build_status()
+
+
+@app.post("/admin/reload", status_code=202, dependencies=[Depends(admin.require_admin)])
+async def reload_index():
+    """Rebuild the index from a fresh products_rag.jsonl and hot-swap it."""
     if rag is None:
         raise HTTPException(status_code=503, detail="RAG system not initialized")
 
-    try:
-        results = rag.search(
-            query=request.query,
-            top_k=request.top_k,
-            deduplicate=request.deduplicate
-        )
+    if not rag.start_background_build(
+        jsonl_path=config.products_rag_path,
+        snapshot_dir=config.index_snapshot_path
+    ):
+        raise HTTPException(status_code=409, detail="An index build is already running")
 
-        products = [
-            ProductResult(
-                product_id=r["product"]["product_id"],
-                variant_id=r["product"]["variant_id"],
-                title=r["product"]["title"],
-                vendor=r["product"]["vendor"],
-                product_type=r["product"]["product_type"],
-                price=r["product"]["price"],
-                colors=r["product"]["colors"],
-                sizes=r["product"]["sizes"],
-                similarity=r["similarity"]
-            )
-            for r in results
-        ]
+    return rag.build_status()
 
-        return SearchResponse(
-            query=request.query,
-            results=products,
-            count=len(products)
-        )
 
+@app.get("/admin/index", dependencies=[Depends(admin.require_admin)])
+async def index_status():
+    """Status of the served index and any background build."""
+    if rag is None:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    return {**rag.build_status(), "result_cache": result_cache.stats() if result_cache is not None else None}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    payload, content_type = metrics.render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
+@app.post("/search", response_model=SearchResponse)
+async def search_products(request: SearchRequest, if_none_match: Optional[str] = Header(default=None)):
+    """Search for products using RAG."""
+    return await _cached_search(
+        "search", request.query, request.top_k, request.deduplicate, _search_fragment, if_none_match
+    )
+
+
+@app.get("/search", response_model=SearchResponse)
+async def search_products_get(
+    q: str,
+    top_k: int = 3,
+    deduplicate: bool = True,
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """Cacheable GET form of ``POST /search`` (for the widget and CDNs)."""
+    return await _cached_search("search", q, top_k, deduplicate, _search_fragment, if_none_match)
+
+
+@app.post("/search/batch")
+async def search_batch(request: BatchSearchRequest):
+    """Search many queries at once.
+
+    Queries are embedded and scored in chunks; results stream back as NDJSON,
+    one ``SearchResponse`` line per query in request order. If a later chunk
+    fails, a final ``{"index": ..., "error": ...}`` line is written instead.
+    """
+    _require_index()
+    metrics.set_request_labels(provider=config.embedding_provider)
+
+    max_queries = config.get('search', 'batch_max_queries', default=10000)
+    if len(request.queries) > max_queries:
+        raise HTTPException(status_code=400, detail=f"At most {max_queries} queries per batch")
+    chunk_size = max(1, config.get('search', 'batch_chunk_size', default=256))
+
+    # The first chunk runs before the response starts, so overload and
+    # errors still map to an HTTP status
+    try:
+        first = await _retrieve_many(request.queries[:chunk_size], request.top_k, request.deduplicate)
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    async def lines():
+        results = first
+        for start in range(0, len(request.queries), chunk_size):
+            queries = request.queries[start:start + chunk_size]
+            if start:
+                try:
+                    results = await _retrieve_many(queries, request.top_k, request.deduplicate)
+                except Exception as e:
+                    yield dumps({"index": start, "error": str(e)}) + b"\n"
+                    return
+
+            for query, query_results in zip(queries, results):
+                yield b'{"query":' + dumps(query) + b"," + _search_fragment(query_results) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 
 @app.post("/ask", response_model=AskResponse)
 async def ask_assistant(request: AskRequest):
     """Get AI product recommendations."""
     if assistant is None:
         raise HTTPException(status_code=503, detail="Assistant not initialized")
+    _require_index()
+
+    metrics.set_request_labels(provider=config.embedding_provider)
 
     try:
-        response = assistant.ask(request.query, top_k=request.top_k)
+        response = await _answer(request.query, request.top_k)
 
-        return AskResponse(
-            query=request.query,
-            response=response,
-            products_considered=request.top_k
-        )
+        with metrics.stage("serialize"):
+            payload = AskResponse(
+                query=request.query,
+                response=response,
+                products_considered=request.top_k
+            ).model_dump_json()
+
+        return Response(content=payload, media_type="application/json")
 
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/product-ids")
-async def get_product_ids(request: SearchRequest):
+async def get_product_ids(request: SearchRequest, if_none_match: Optional[str] = Header(default=None)):
     """Get only product IDs from search."""
-    if rag is None:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    return await _cached_search(
+        "product_ids", request.query, request.top_k, request.deduplicate, _product_ids_fragment, if_none_match
+    )
 
-    try:
-        product_ids = rag.get_product_ids(
-            query=request.query,
-            top_k=request.top_k,
-            deduplicate=request.deduplicate
+
+@app.get("/product-ids")
+async def get_product_ids_get(
+    q: str,
+    top_k: int = 3,
+    deduplicate: bool = True,
+    if_none_match: Optional[str] = Header(default=None)
+):
+    """Cacheable GET form of ``POST /product-ids``."""
+    return await _cached_search("product_ids", q, top_k, deduplicate, _product_ids_fragment, if_none_match)
+
+
+@app.get("/similar/{product_id}", response_model=SimilarResponse)
+async def similar_products(product_id: int, top_k: int = 10):
+    """Most similar products, served from the precomputed neighbour graph."""
+    graph = similar.graph if similar is not None else None
+    index = rag.index if rag is not None else None
+    if graph is None or index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Similar-products graph not ready",
+            headers={"Retry-After": "30"}
         )
 
-        return {
-            "query": request.query,
-            "product_ids": product_ids,
-            "count": len(product_ids)
-        }
+    neighbours = graph.lookup(product_id, top_k)
+    if neighbours is None:
+        raise HTTPException(status_code=404, detail=f"Unknown product: {product_id}")
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Products removed since the graph was computed are skipped
+    results = []
+    for neighbour_id, score in neighbours:
+        product = index.product(neighbour_id)
+        if product is not None:
+            results.append({"product": product, "similarity": score})
+
+    payload = (
+        f'{{"product_id":{product_id},"results":'.encode("utf-8")
+        + _results_json(results) + f',"count":{len(results)}}}'.encode("utf-8")
+    )
+    return FastJSONResponse(content=payload)
 
 
 if __name__ == "__main__":
@@ -4,25 +4,182 @@ This version supports tenant-specific embeddings and search.
 """
 from __future__ import annotations
 
+# Imported first so the import timer sees the heavy imports below
+from src.utils import startup
+
+import asyncio
+import json
+import threading
+from contextlib import asynccontextmanager
 from typing import List, Optional
 import numpy as np
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-from src.embeddings.openai_embeddings import OpenAIEmbeddings
-from src.embeddings.local_embeddings import LocalEmbeddings
+from src.embeddings import get_embedding_provider
+from src.api import admin
+from src.api.middleware import overloaded_handler, run_in_threadpool, track_latency
+from src.api.responses import cached_response
+from src.api.vector_codec import (
+    BINARY_MEDIA_TYPE, ENCODING_FORMATS, encode_base64, encode_binary, wants_binary
+)
+from src.utils import metrics
+from src.utils.admission import Overloaded, admit_tenant, max_tenant_cost
+from src.utils.coalesce import coalesce, normalize_query
+from src.utils.result_cache import ResultCache, etag_for
+from src.utils.tokens import count_tokens, truncate_to_tokens
+from src.tenant_context import get_context_store
+from src.sessions import get_session_store, trim_history
+from src.vector_store import get_vector_store
+from src.utils.openai_pool import get_openai_client
+from config import get_config
 
 # Load environment variables
 load_dotenv()
 
+# Load configuration
+config = get_config()
+
+# Search result cache (see search.cache_*), None when disabled
+result_cache: Optional[ResultCache] = None
+if config.get('search', 'cache_enabled', default=True):
+    result_cache = ResultCache(
+        max_entries=config.get('search', 'cache_max_entries', default=10000),
+        max_bytes=int(config.get('search', 'cache_max_memory_mb', default=32) * 1024 * 1024),
+    )
+
+# Shared inference sidecar client (see embedding.local.sidecar)
+_sidecar_embedder = None
+
+# Background tasks (session compaction), referenced until they finish
+_background_tasks = set()
+
+# In-process local models, loaded once per model name
+_local_embedders = {}
+_local_embedders_lock = threading.Lock()
+
+
+def _local_embedder(model: str):
+    """Get a local-model embedder, going through the sidecar when it serves ``model``."""
+    global _sidecar_embedder
+
+    if config.embedding_sidecar_enabled and model == config.local_embedding_model:
+        if _sidecar_embedder is None:
+            _sidecar_embedder = get_embedding_provider(
+                "sidecar",
+                socket_path=config.embedding_sidecar_socket,
+                model=model
+            )
+        return _sidecar_embedder
+
+    with _local_embedders_lock:
+        embedder = _local_embedders.get(model)
+        if embedder is None:
+            embedder = _local_embedders[model] = get_embedding_provider("local", model=model)
+        return embedder
+
+
+def _request_embedder(provider: str, model: Optional[str], api_key: Optional[str]):
+    """Embedder for a request's provider/model choice."""
+    if provider.lower() == "openai":
+        if not api_key:
+            raise HTTPException(status_code=400, detail="OpenAI API key required")
+
+        return get_embedding_provider(
+            "openai",
+            api_key=api_key,
+            model=model or "text-embedding-3-large"
+        )
+
+    # Local embeddings
+    return _local_embedder(model or "intfloat/multilingual-e5-large")
+
+
+def _context_embedder(request: "ChatRequest"):
+    """Embedder for tenant context retrieval (see ``tenant_context``)."""
+    if config.get('tenant_context', 'embedding_provider', default="local") == "openai":
+        return get_embedding_provider(
+            "openai",
+            api_key=request.llm_api_key,
+            model=config.openai_embedding_model
+        )
+    return _local_embedder(config.local_embedding_model)
+
+
+async def _select_context(request: "ChatRequest") -> str:
+    """The part of the tenant context relevant to this query, within the token budget.
+
+    Contexts that fit the budget are used whole; larger ones are chunked and
+    embedded once per tenant, and only the best chunks are returned. If
+    retrieval fails the context is truncated to the budget instead.
+    """
+    budget = config.get('tenant_context', 'token_budget', default=800)
+    context = request.context
+    if not config.get('tenant_context', 'enabled', default=True) or count_tokens(context) <= budget:
+        return context
+
+    try:
+        embedder = _context_embedder(request)
+        store = get_context_store()
+        index = store.lookup(request.tenant_id, context, embedder.model_name)
+        async with admit_tenant("embed", request.tenant_id):
+            if index is None:
+                index = await run_in_threadpool(store.get, request.tenant_id, context, embedder)
+            query_embedding = await run_in_threadpool(embedder.embed_query, request.query)
+        return index.select(query_embedding, budget)
+    except Exception as e:
+        print(f"[WARN] Context retrieval failed for tenant {request.tenant_id}: {e}")
+        return truncate_to_tokens(context, budget)
+
+
+async def _embed_bulk(tenant_id: int, texts: List[str], embed, stage_name: str) -> np.ndarray:
+    """Embed many texts in chunks, each admitted for the tenant at one unit per text.
+
+    Chunks never exceed the tenant's burst, and a tenant over its rate is
+    paced (up to ``api.embed_bulk_max_wait_s`` per chunk) rather than
+    rejected part way through.
+    """
+    chunk_size = config.get('api', 'embed_bulk_chunk_size', default=32)
+    max_cost = max_tenant_cost("embed", tenant_id)
+    if max_cost is not None:
+        chunk_size = min(chunk_size, int(max_cost))
+    chunk_size = max(1, chunk_size)
+    max_wait = config.get('api', 'embed_bulk_max_wait_s', default=10)
+
+    blocks = []
+    for start in range(0, len(texts), chunk_size):
+        chunk = texts[start:start + chunk_size]
+        async with admit_tenant("embed", tenant_id, cost=len(chunk), max_wait=max_wait):
+            with metrics.stage(stage_name):
+                vectors = await run_in_threadpool(embed, chunk)
+        blocks.append(np.asarray(vectors, dtype=np.float32).reshape(len(chunk), -1))
+    return np.concatenate(blocks)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run background monitors for the lifetime of the app."""
+    lag_monitor = asyncio.create_task(metrics.monitor_event_loop_lag())
+    startup.get_startup_report().finish()
+
+    yield
+
+    lag_monitor.cancel()
+    with _local_embedders_lock:
+        for embedder in _local_embedders.values():
+            embedder.close()
+        _local_embedders.clear()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="Multi-Tenant RAG API",
     description="Tenant-aware embedding generation and search",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Enable CORS
@@ -34,6 +191,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request latency tracking (see /metrics)
+app.middleware("http")(track_latency)
+
+# Admin-only profiling and startup endpoints
+app.include_router(admin.router)
+
+# Shed requests answer 503 with Retry-After
+app.add_exception_handler(Overloaded, overloaded_handler)
+
 
 # Request/Response models
 class EmbedRequest(BaseModel):
@@ -42,18 +208,57 @@ class EmbedRequest(BaseModel):
     embedding_provider: str = "local"  # "local" or "openai"
     embedding_model: Optional[str] = None
     openai_api_key: Optional[str] = None
+    encoding_format: str = "float"  # "float" or "base64" (see vector_codec)
 
 
 class EmbedResponse(BaseModel):
-    embedding: List[float]
+    embedding: Optional[List[float]] = None
+    embedding_base64: Optional[str] = None
     dimension: int
 
 
+class EmbedBatchRequest(BaseModel):
+    tenant_id: int
+    texts: List[str]
+    embedding_provider: str = "local"  # "local" or "openai"
+    embedding_model: Optional[str] = None
+    openai_api_key: Optional[str] = None
+    encoding_format: str = "float"  # "float" or "base64" (see vector_codec)
+
+
+class EmbedBatchResponse(BaseModel):
+    embeddings: Optional[List[List[float]]] = None
+    embeddings_base64: Optional[str] = None  # count × dimension float32, row by row
+    dimension: int
+    count: int
+
+
 class TenantSearchRequest(BaseModel):
     tenant_id: int
     query: str
     top_k: int = 3
     include_contexts: bool = True
+    embedding_provider: str = "local"  # Must match the provider used at ingest
+    openai_api_key: Optional[str] = None
+
+
+class VectorItem(BaseModel):
+    id: int
+    text: Optional[str] = None  # Embedded server-side when no embedding is given
+    embedding: Optional[List[float]] = None
+
+
+class VectorUpsertRequest(BaseModel):
+    tenant_id: int
+    items: List[VectorItem]
+    embedding_provider: str = "local"  # "local" or "openai"
+    embedding_model: Optional[str] = None
+    openai_api_key: Optional[str] = None
+
+
+class VectorDeleteRequest(BaseModel):
+    tenant_id: int
+    ids: List[int]
 
 
 # API Endpoints
@@ -67,58 +272,279 @@ async def root():
     }
 
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint."""
+    payload, content_type = metrics.render_metrics()
+    return Response(content=payload, media_type=content_type)
+
+
+def _check_encoding(encoding_format: str) -> None:
+    if encoding_format not in ENCODING_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"encoding_format must be one of: {', '.join(ENCODING_FORMATS)}"
+        )
+
+
 @app.post("/embed", response_model=EmbedResponse)
-async def generate_embedding(request: EmbedRequest):
-    """Generate embedding for a single text."""
+async def generate_embedding(request: EmbedRequest, accept: Optional[str] = Header(default=None)):
+    """Generate embedding for a single text.
+
+    Send ``Accept: application/octet-stream`` for a binary float32 body, or
+    ``encoding_format: "base64"`` for base64 in JSON (see ``vector_codec``).
+    """
+    metrics.set_request_labels(
+        tenant=request.tenant_id,
+        provider=request.embedding_provider.lower()
+    )
+
     try:
+        _check_encoding(request.encoding_format)
+
         # Initialize embedding provider based on config
-        if request.embedding_provider.lower() == "openai":
-            if not request.openai_api_key:
-                raise HTTPException(status_code=400, detail="OpenAI API key required")
+        with metrics.stage("provider_init"):
+            embedder = _request_embedder(
+                request.embedding_provider,
+                request.embedding_model,
+                request.openai_api_key
+            )
 
-            model = request.embedding_model or "text-embedding-3-large"
-            embedder = OpenAIEmbeddings(
-                api_key=request.openai_api_key,
-                model=model
+        # Generate embedding; identical concurrent requests share one call
+        async def run():
+            async with admit_tenant("embed", request.tenant_id):
+                return await run_in_threadpool(embedder.embed_query, request.text)
+
+        key = (
+            request.tenant_id,
+            request.embedding_provider.lower(),
+            embedder.model_name,
+            request.openai_api_key,
+            normalize_query(request.text)
+        )
+        with metrics.stage("embed_query"):
+            embedding = await coalesce("tenant_embed", key, run)
+
+        with metrics.stage("serialize"):
+            if wants_binary(accept):
+                return Response(content=encode_binary(embedding), media_type=BINARY_MEDIA_TYPE)
+
+            if request.encoding_format == "base64":
+                response = EmbedResponse(embedding_base64=encode_base64(embedding), dimension=embedder.dimension)
+            else:
+                response = EmbedResponse(embedding=embedding.tolist(), dimension=embedder.dimension)
+            payload = response.model_dump_json(exclude_none=True)
+
+        return Response(content=payload, media_type="application/json")
+
+    except (HTTPException, Overloaded):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/embed/batch", response_model=EmbedBatchResponse)
+async def generate_embeddings(request: EmbedBatchRequest, accept: Optional[str] = Header(default=None)):
+    """Generate embeddings for many texts in one call.
+
+    Encodings are negotiated as for ``/embed``; binary bodies hold all
+    vectors after one header.
+    """
+    metrics.set_request_labels(
+        tenant=request.tenant_id,
+        provider=request.embedding_provider.lower()
+    )
+
+    try:
+        _check_encoding(request.encoding_format)
+        max_texts = config.get('api', 'embed_batch_max_texts', default=256)
+        if len(request.texts) > max_texts:
+            raise HTTPException(status_code=400, detail=f"At most {max_texts} texts per request")
+
+        with metrics.stage("provider_init"):
+            embedder = _request_embedder(
+                request.embedding_provider,
+                request.embedding_model,
+                request.openai_api_key
             )
-        else:
-            # Local embeddings
-            model = request.embedding_model or "intfloat/multilingual-e5-large"
-            embedder = LocalEmbeddings(model=model)
 
-        # Generate embedding
-        embedding = embedder.embed_query(request.text)
+        embeddings = np.zeros((0, embedder.dimension), dtype=np.float32)
+        if request.texts:
+            embeddings = await _embed_bulk(
+                request.tenant_id, request.texts, embedder.embed_queries, "embed_query"
+            )
 
-        return EmbedResponse(
-            embedding=embedding.tolist(),
-            dimension=embedder.dimension
-        )
+        with metrics.stage("serialize"):
+            if wants_binary(accept):
+                return Response(content=encode_binary(embeddings), media_type=BINARY_MEDIA_TYPE)
+
+            response = EmbedBatchResponse(dimension=embeddings.shape[1], count=len(embeddings))
+            if request.encoding_format == "base64":
+                response.embeddings_base64 = encode_base64(embeddings)
+            else:
+                response.embeddings = embeddings.tolist()
+            payload = response.model_dump_json(exclude_none=True)
+
+        return Response(content=payload, media_type="application/json")
 
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/search")
-async def tenant_search(request: TenantSearchRequest):
+async def tenant_search(request: TenantSearchRequest, if_none_match: Optional[str] = Header(default=None)):
     """
     Search products for a specific tenant.
-    This endpoint will be called by .NET API with tenant-specific product data.
+    Searches the vectors ingested through /vectors/upsert; results are cached
+    until the tenant's vectors change.
     """
-    # TODO: Implement tenant-specific search
-    # For now, return a placeholder response
-    return {
-        "query": request.query,
-        "products": [],
-        "contexts_used": [],
-        "search_time_ms": 0,
-        "message": "Tenant search endpoint - implement with database integration"
-    }
+    import time
+    start_time = time.time()
+
+    metrics.set_request_labels(
+        tenant=request.tenant_id,
+        provider=request.embedding_provider.lower()
+    )
+
+    try:
+        store = await run_in_threadpool(get_vector_store().tenant, request.tenant_id)
+        key = (normalize_query(request.query), request.top_k, request.embedding_provider.lower())
+        version = store.version
+
+        fragment = None
+        if result_cache is not None:
+            fragment = result_cache.get("tenant_search", request.tenant_id, version, key)
+
+        if fragment is None:
+            if not len(store):
+                products = []
+            else:
+                with metrics.stage("provider_init"):
+                    embedder = _request_embedder(
+                        request.embedding_provider,
+                        store.model,
+                        request.openai_api_key
+                    )
+
+                async with admit_tenant("embed", request.tenant_id):
+                    with metrics.stage("embed_query"):
+                        query_embedding = await run_in_threadpool(embedder.embed_query, request.query)
+
+                with metrics.stage("score"):
+                    hits = await run_in_threadpool(store.search, query_embedding, request.top_k)
+                products = [{"product_id": product_id, "score": score} for product_id, score in hits]
+
+            fragment = json.dumps(products).encode("utf-8")
+            if result_cache is not None and store.version == version:
+                result_cache.put("tenant_search", request.tenant_id, version, key, fragment)
+
+        # The ETag covers the results, not the per-request timing
+        query = json.dumps(request.query, ensure_ascii=False).encode("utf-8")
+        payload = (
+            b'{"query":' + query + b',"products":' + fragment + b',"contexts_used":[],'
+            + f'"search_time_ms":{(time.time() - start_time) * 1000}}}'.encode("utf-8")
+        )
+        return cached_response(
+            "tenant_search",
+            payload,
+            if_none_match,
+            config.get('search', 'cache_max_age', default=60),
+            etag=etag_for(query + b"," + fragment)
+        )
+
+    except (HTTPException, Overloaded):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/vectors/upsert")
+async def upsert_vectors(request: VectorUpsertRequest):
+    """
+    Bulk-ingest product vectors for a tenant.
+    Items carry either an embedding or a text to embed; writes are durable
+    once this returns.
+    """
+    metrics.set_request_labels(
+        tenant=request.tenant_id,
+        provider=request.embedding_provider.lower()
+    )
+
+    try:
+        max_items = config.get('api', 'upsert_max_items', default=2000)
+        if len(request.items) > max_items:
+            raise HTTPException(status_code=400, detail=f"At most {max_items} items per request")
+
+        ids = [item.id for item in request.items]
+        vectors = [item.embedding for item in request.items]
+        model = request.embedding_model
+
+        pending = [i for i, item in enumerate(request.items) if item.embedding is None]
+        if pending:
+            if any(request.items[i].text is None for i in pending):
+                raise HTTPException(status_code=400, detail="Each item needs an embedding or a text")
+
+            with metrics.stage("provider_init"):
+                embedder = _request_embedder(
+                    request.embedding_provider,
+                    request.embedding_model,
+                    request.openai_api_key
+                )
+            model = embedder.model_name
+
+            embedded = await _embed_bulk(
+                request.tenant_id, [request.items[i].text for i in pending], embedder.embed_texts, "embed_texts"
+            )
+            for i, vector in zip(pending, embedded):
+                vectors[i] = vector
+
+        store = await run_in_threadpool(get_vector_store().tenant, request.tenant_id)
+        with metrics.stage("write"):
+            count = await run_in_threadpool(store.upsert, ids, vectors, model) if ids else 0
+
+        return {"tenant_id": request.tenant_id, "upserted": count, "vectors": len(store)}
+
+    except (HTTPException, Overloaded):
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/vectors/delete")
+async def delete_vectors(request: VectorDeleteRequest):
+    """Delete product vectors of a tenant by id."""
+    metrics.set_request_labels(tenant=request.tenant_id)
+
+    try:
+        store = await run_in_threadpool(get_vector_store().tenant, request.tenant_id)
+        with metrics.stage("write"):
+            deleted = await run_in_threadpool(store.delete, request.ids)
+        return {"tenant_id": request.tenant_id, "deleted": deleted, "vectors": len(store)}
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/vectors/{tenant_id}")
+async def vector_stats(tenant_id: int):
+    """Size and compaction state of a tenant's vector store."""
+    store = await run_in_threadpool(get_vector_store().tenant, tenant_id)
+    return store.stats()
 
 
 class ChatRequest(BaseModel):
     tenant_id: int
     query: str
     context: str
+    # With session_id the history is kept server-side; conversation_history
+    # is then only used to seed a new session
+    session_id: Optional[str] = None
     conversation_history: Optional[List[dict]] = None
     system_prompt: Optional[str] = None
     llm_provider: str = "openai"  # "openai" or "local"
@@ -132,6 +558,50 @@ class ChatResponse(BaseModel):
     response: str
     tokens_used: Optional[int] = None
     elapsed_ms: float
+    session_id: Optional[str] = None
+
+
+SUMMARY_PROMPT = (
+    "Bir alışveriş asistanı ile müşteri arasındaki konuşmayı özetliyorsun. "
+    "Mevcut özeti yeni mesajlarla birleştirerek kısa bir özet yaz; müşterinin "
+    "tercihlerini, bütçesini ve bahsedilen ürünleri koru."
+)
+
+
+def _summarizer(client, model: str):
+    """Session summarizer calling the chat model (see ``SessionStore.compact``)."""
+    max_tokens = config.get('sessions', 'summary_max_tokens', default=200)
+
+    def summarize(previous: str, messages: List[dict]) -> str:
+        transcript = "\n".join(
+            f"{'Müşteri' if m['role'] == 'user' else 'Asistan'}: {m['content']}"
+            for m in messages
+        )
+        response = client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Mevcut özet:\n{previous or '-'}\n\nYeni mesajlar:\n{transcript}"}
+            ],
+            temperature=0.3,
+            max_tokens=max_tokens
+        )
+        return response.choices[0].message.content
+
+    return summarize
+
+
+async def _compact_session(sessions, session, tenant_id: int, client, model: str) -> None:
+    """Summarize a session's old turns as background LLM work for the tenant.
+
+    Compaction only runs on an idle LLM slot; when busy or rate limited the
+    turns stay queued and are retried after the session's next message.
+    """
+    try:
+        async with admit_tenant("llm", tenant_id, background=True):
+            await run_in_threadpool(sessions.compact, session, _summarizer(client, model))
+    except Overloaded:
+        pass
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -142,53 +612,98 @@ async def chat_completion(request: ChatRequest):
     import time
     start_time = time.time()
 
+    metrics.set_request_labels(
+        tenant=request.tenant_id,
+        provider=request.llm_provider.lower()
+    )
+
     try:
         if request.llm_provider.lower() == "openai":
             if not request.llm_api_key:
                 raise HTTPException(status_code=400, detail="OpenAI API key required")
 
-            from openai import OpenAI
-            client = OpenAI(api_key=request.llm_api_key)
-
-            # Build messages
-            messages = []
-
-            # System prompt with context
-            system_content = request.system_prompt or "Sen yardımcı bir alışveriş asistanısın."
-            if request.context:
-                system_content += f"\n\nBağlam Bilgileri:\n{request.context}"
-
-            messages.append({"role": "system", "content": system_content})
+            client = get_openai_client(request.llm_api_key)
 
-            # Add conversation history
-            if request.conversation_history:
-                for msg in request.conversation_history[-6:]:  # Last 3 exchanges
-                    role = "user" if msg.get("role") == "USER" else "assistant"
-                    messages.append({"role": role, "content": msg.get("content", "")})
+            # Only the parts of the tenant context relevant to this query
+            context = request.context
+            if context:
+                with metrics.stage("context_retrieval"):
+                    context = await _select_context(request)
 
-            # Add current query
-            messages.append({"role": "user", "content": request.query})
+            # Build messages
+            sessions = get_session_store()
+            with metrics.stage("format_context"):
+                messages = []
+
+                # System prompt with context
+                system_content = request.system_prompt or "Sen yardımcı bir alışveriş asistanısın."
+                if context:
+                    system_content += f"\n\nBağlam Bilgileri:\n{context}"
+
+                messages.append({"role": "system", "content": system_content})
+
+                # Add conversation history, bounded by the history token budget
+                history = [
+                    {
+                        "role": "user" if msg.get("role") == "USER" else "assistant",
+                        "content": msg.get("content", "")
+                    }
+                    for msg in request.conversation_history or []
+                ]
+                if request.session_id:
+                    session = sessions.get(request.session_id, request.tenant_id)
+                    if history and not session.messages and not session.summary:
+                        for msg in history:
+                            sessions.append(session, msg["role"], msg["content"])
+                    messages.extend(sessions.history(session))
+                else:
+                    messages.extend(trim_history(history, sessions.history_token_budget))
+
+                # Add current query
+                messages.append({"role": "user", "content": request.query})
 
             # Call OpenAI
             model = request.llm_model or "gpt-4o-mini"
-            response = client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=request.temperature,
-                max_tokens=request.max_tokens
-            )
+            async with admit_tenant("llm", request.tenant_id):
+                with metrics.stage("llm"):
+                    response = await run_in_threadpool(
+                        client.chat.completions.create,
+                        model=model,
+                        messages=messages,
+                        temperature=request.temperature,
+                        max_tokens=request.max_tokens
+                    )
+
+            answer = response.choices[0].message.content
+
+            if request.session_id:
+                sessions.append(session, "user", request.query)
+                sessions.append(session, "assistant", answer or "")
+                # Fold turns that left the history window into the summary
+                if sessions.needs_compaction(session):
+                    task = asyncio.create_task(
+                        _compact_session(sessions, session, request.tenant_id, client, model)
+                    )
+                    _background_tasks.add(task)
+                    task.add_done_callback(_background_tasks.discard)
 
             elapsed_ms = (time.time() - start_time) * 1000
 
-            return ChatResponse(
-                response=response.choices[0].message.content,
-                tokens_used=response.usage.total_tokens if response.usage else None,
-                elapsed_ms=elapsed_ms
-            )
+            with metrics.stage("serialize"):
+                payload = ChatResponse(
+                    response=answer,
+                    tokens_used=response.usage.total_tokens if response.usage else None,
+                    elapsed_ms=elapsed_ms,
+                    session_id=request.session_id
+                ).model_dump_json()
+
+            return Response(content=payload, media_type="application/json")
         else:
             # Local LLM (placeholder - you can integrate ollama or other local models)
             raise HTTPException(status_code=501, detail="Local LLM not implemented yet")
 
+    except (HTTPException, Overloaded):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
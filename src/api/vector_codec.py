@@ -0,0 +1,47 @@
+"""Compact encodings of embedding vectors in API responses.
+
+A 3072-dim vector is ~60 KB as JSON decimals but 12 KB as float32. Clients
+choose the encoding per request:
+
+* ``Accept: application/octet-stream``: raw binary body, an 8-byte header
+  (``<II``: vector count, dimension) followed by count × dimension
+  little-endian float32 values, row by row.
+* ``encoding_format: "base64"``: JSON as usual, with the same float32 bytes
+  (without the header) base64-encoded in a single string.
+* ``encoding_format: "float"`` (default): JSON lists of floats.
+"""
+from __future__ import annotations
+
+import base64
+import struct
+from typing import Optional
+
+import numpy as np
+
+BINARY_MEDIA_TYPE = "application/octet-stream"
+ENCODING_FORMATS = ("float", "base64")
+
+# Vector count, dimension
+BINARY_HEADER = struct.Struct("<II")
+
+
+def wants_binary(accept: Optional[str]) -> bool:
+    """Whether the ``Accept`` header asks for the binary encoding."""
+    return bool(accept) and BINARY_MEDIA_TYPE in accept
+
+
+def as_block(vectors) -> np.ndarray:
+    """Vectors as a contiguous little-endian float32 2-D array."""
+    block = np.ascontiguousarray(vectors, dtype="<f4")
+    return block.reshape(1, -1) if block.ndim == 1 else block
+
+
+def encode_binary(vectors) -> bytes:
+    """Header plus raw float32 values (see module docstring)."""
+    block = as_block(vectors)
+    return BINARY_HEADER.pack(*block.shape) + block.tobytes()
+
+
+def encode_base64(vectors) -> str:
+    """Base64 of the raw float32 values, row by row."""
+    return base64.b64encode(as_block(vectors).tobytes()).decode("ascii")
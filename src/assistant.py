@@ -4,10 +4,12 @@ from __future__ import annotations
 import json
 from typing import List, Dict, Any
 
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from src.prompt_context import pack_products, snippet_with_tokens
 from src.rag_engine import ProductRAG
+from src.utils.metrics import stage
+from src.utils.openai_pool import get_openai_client
 
 # Load environment variables
 load_dotenv()
@@ -38,56 +40,32 @@ Format:
 - Ürün önerirken özelliklerini vurgula
 """
 
-    def __init__(self, rag: ProductRAG, model: str = "gpt-4o-mini"):
+    def __init__(self, rag: ProductRAG, model: str = "gpt-4o-mini", context_token_budget: int = 1200):
         """Initialize the assistant.
 
         Args:
             rag: ProductRAG instance for search
             model: OpenAI model to use (default: gpt-4o-mini)
+            context_token_budget: Maximum tokens of product context per prompt
         """
         self.rag = rag
-        self.client = OpenAI()
+        self.client = get_openai_client()
         self.model = model
+        self.context_token_budget = context_token_budget
 
     def _format_product_context(self, results: List[Dict[str, Any]]) -> str:
-        """Format search results into context for LLM."""
-        if not results:
-            return "Hiç ürün bulunamadı."
-
-        context_parts = []
-        for i, result in enumerate(results, 1):
-            p = result["product"]
-
-            # Format product info
-            product_info = [
-                f"Ürün {i}:",
-                f"  Başlık: {p['title']}",
-                f"  Marka: {p['vendor']}",
-                f"  Kategori: {p['product_type']}",
-                f"  Fiyat: {p['price']} TL",
-            ]
-
-            if p.get('colors'):
-                product_info.append(f"  Renkler: {', '.join(p['colors'])}")
-
-            if p.get('sizes'):
-                product_info.append(f"  Bedenler: {', '.join(p['sizes'])}")
-
-            # Add description from text field
-            text = p.get('text', '')
-            if 'Tags:' in text:
-                parts = text.split('Tags:')
-                if len(parts) > 1 and len(parts[1]) > 50:
-                    desc = parts[1].split('.', 1)
-                    if len(desc) > 1:
-                        description = desc[1].strip()
-                        if description:
-                            product_info.append(f"  Açıklama: {description[:300]}")
-
-            product_info.append(f"  Eşleşme Skoru: {result['similarity']:.2f}")
-            context_parts.append("\n".join(product_info))
-
-        return "\n\n".join(context_parts)
+        """Format search results into context for LLM, within the token budget."""
+        index = self.rag.index
+        entries = []
+        for result in results:
+            if index is not None:
+                snippet, tokens = index.context_snippet(result["product"])
+            else:
+                snippet, tokens = snippet_with_tokens(result["product"])
+            entries.append((snippet, tokens, result["similarity"]))
+
+        context, _ = pack_products(entries, self.context_token_budget)
+        return context
 
     def ask(self, query: str, top_k: int = 3) -> str:
         """Ask the assistant a question and get product recommendations.
@@ -102,11 +80,24 @@ Format:
         # Search for relevant products
         results = self.rag.search(query, top_k=top_k, deduplicate=True)
 
+        return self.answer(query, results)
+
+    def answer(self, query: str, results: List[Dict[str, Any]]) -> str:
+        """Get an LLM answer for a query from already retrieved products.
+
+        Args:
+            query: User's question
+            results: Search results (as returned by ``ProductRAG.search``)
+
+        Returns:
+            Assistant's response
+        """
         # Format context
-        context = self._format_product_context(results)
+        with stage("format_context"):
+            context = self._format_product_context(results)
 
-        # Create user message
-        user_message = f"""Müşteri Sorusu: {query}
+            # Create user message
+            user_message = f"""Müşteri Sorusu: {query}
 
 Bulunan Ürünler:
 {context}
@@ -114,14 +105,15 @@ Bulunan Ürünler:
 Lütfen müşteriye yukarıdaki ürünlere göre yardımcı ol ve uygun önerilerde bulun."""
 
         # Get LLM response
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": self.SYSTEM_PROMPT},
-                {"role": "user", "content": user_message}
-            ],
-            temperature=0.7,
-            max_tokens=500
-        )
+        with stage("llm"):
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.SYSTEM_PROMPT},
+                    {"role": "user", "content": user_message}
+                ],
+                temperature=0.7,
+                max_tokens=500
+            )
 
         return response.choices[0].message.content
@@ -0,0 +1,156 @@
+"""Checkpoints and progress of index builds.
+
+Embedded batches are appended to a checkpoint as they complete, keyed by a
+digest of the text, so a build that fails part way (API error, OOM, restart)
+resumes with only the texts that are still missing. The checkpoint is tied
+to the embedding model and removed once a build succeeds.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+import numpy as np
+
+_DIGEST_SIZE = 20
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class BuildCheckpoint:
+    """Append-only file of (text digest, vector) records."""
+
+    def __init__(self, directory: str, model_name: str, dimension: int):
+        """Open the checkpoint in ``directory``, discarding one for another model."""
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self._record_size = _DIGEST_SIZE + 4 * dimension
+        self._vectors_path = self.directory / "vectors.bin"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        meta = {"model": model_name, "dimension": dimension}
+        meta_path = self.directory / "meta.json"
+        try:
+            previous = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            previous = None
+        if previous != meta:
+            self._vectors_path.unlink(missing_ok=True)
+            meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+        self._vectors: Dict[bytes, np.ndarray] = {}
+        self._load()
+        self._file = self._vectors_path.open("ab")
+
+    def _load(self) -> None:
+        try:
+            data = self._vectors_path.read_bytes()
+        except FileNotFoundError:
+            return
+
+        complete = len(data) // self._record_size
+        if complete * self._record_size != len(data):
+            # Torn last record from a crash mid-write
+            with self._vectors_path.open("r+b") as f:
+                f.truncate(complete * self._record_size)
+
+        records = np.frombuffer(data, dtype=np.uint8, count=complete * self._record_size)
+        records = records.reshape(complete, self._record_size)
+        vectors = records[:, _DIGEST_SIZE:].copy().view("<f4")
+        for digest, vector in zip(records[:, :_DIGEST_SIZE], vectors):
+            self._vectors[digest.tobytes()] = vector
+
+    def __len__(self) -> int:
+        return len(self._vectors)
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Checkpointed vector of ``text``, if any."""
+        return self._vectors.get(text_digest(text))
+
+    def append(self, texts: Sequence[str], vectors: Sequence[np.ndarray]) -> None:
+        """Durably record a completed batch."""
+        block = np.asarray(vectors, dtype="<f4").reshape(len(texts), self.dimension)
+        records = bytearray()
+        for text, vector in zip(texts, block):
+            digest = text_digest(text)
+            self._vectors[digest] = vector
+            records += digest
+            records += vector.tobytes()
+        self._file.write(records)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def remove_checkpoint(directory: str) -> None:
+    """Remove a checkpoint (after a successful build)."""
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+class BuildProgress:
+    """Progress of one index build, readable from other threads."""
+
+    def __init__(self, total: int, done: int = 0):
+        """Start tracking.
+
+        Args:
+            total: Texts to embed
+            done: Texts already embedded (resumed from a checkpoint)
+        """
+        self.total = total
+        self.resumed = done
+        self.done = done
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def advance(self, count: int) -> None:
+        with self._lock:
+            self.done += count
+
+    def finish(self) -> None:
+        self.finished_at = time.time()
+
+    def fail(self, error: str) -> None:
+        """Record that the build stopped with ``error``."""
+        self.error = error
+        self.finished_at = time.time()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State (running, done or failed), done/total, rate (texts/s in this run) and ETA."""
+        with self._lock:
+            done = self.done
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        embedded = done - self.resumed
+        rate = embedded / elapsed if elapsed > 0 and embedded > 0 else None
+        remaining = self.total - done
+        if self.error is not None:
+            state, eta = "failed", None
+        elif self.finished_at is not None:
+            state, eta = "done", 0
+        else:
+            state = "running"
+            eta = round(remaining / rate, 1) if rate and remaining else (0 if not remaining else None)
+        return {
+            "state": state,
+            "error": self.error,
+            "done": done,
+            "total": self.total,
+            "resumed": self.resumed,
+            "percent": round(100 * done / self.total, 1) if self.total else 100.0,
+            "rate_per_second": round(rate, 1) if rate else None,
+            "eta_seconds": eta,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
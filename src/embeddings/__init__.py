@@ -1,25 +1,50 @@
-"""Embedding providers."""
+"""Embedding providers.
+
+Provider classes are imported lazily so that, for example, an OpenAI-only
+deployment never imports sentence-transformers/torch.
+"""
 from .base import EmbeddingProvider
-from .openai_embeddings import OpenAIEmbeddings
-from .local_embeddings import LocalEmbeddings
 
 
 def get_embedding_provider(provider: str, **kwargs) -> EmbeddingProvider:
     """Factory function to get embedding provider.
 
     Args:
-        provider: "openai" or "local"
+        provider: "openai", "local" or "sidecar" (local model served by
+            ``src.embeddings.inference_server``)
         **kwargs: Provider-specific arguments
 
     Returns:
         EmbeddingProvider instance
     """
     if provider == "openai":
+        from .openai_embeddings import OpenAIEmbeddings
         return OpenAIEmbeddings(**kwargs)
     elif provider == "local":
+        from .local_embeddings import LocalEmbeddings
         return LocalEmbeddings(**kwargs)
+    elif provider == "sidecar":
+        from .remote_embeddings import RemoteEmbeddings
+        return RemoteEmbeddings(**kwargs)
     else:
-        raise ValueError(f"Unknown provider: {provider}. Choose 'openai' or 'local'")
+        raise ValueError(f"Unknown provider: {provider}. Choose 'openai', 'local' or 'sidecar'")
+
+
+def __getattr__(name: str):
+    """Resolve provider classes on first access."""
+    if name == "OpenAIEmbeddings":
+        from .openai_embeddings import OpenAIEmbeddings
+        return OpenAIEmbeddings
+    if name == "LocalEmbeddings":
+        from .local_embeddings import LocalEmbeddings
+        return LocalEmbeddings
+    if name == "RemoteEmbeddings":
+        from .remote_embeddings import RemoteEmbeddings
+        return RemoteEmbeddings
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-__all__ = ['EmbeddingProvider', 'OpenAIEmbeddings', 'LocalEmbeddings', 'get_embedding_provider']
+__all__ = [
+    'EmbeddingProvider', 'OpenAIEmbeddings', 'LocalEmbeddings', 'RemoteEmbeddings',
+    'get_embedding_provider'
+]
@@ -1,12 +1,22 @@
 """Base embedding provider interface."""
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Callable, Iterator, List, Optional, Tuple
 import numpy as np
 
+from src.utils.tokens import count_tokens, truncate_to_tokens
+from .batching import plan_batches
+
 
 class EmbeddingProvider(ABC):
     """Abstract base class for embedding providers."""
 
+    # Token limits used by embed_documents; providers override these
+    max_input_tokens = 512
+    max_batch_tokens = 8192
+    max_batch_items = 64
+    # Whether a batch costs len(batch) * longest text (padding), not the sum
+    padded_batches = True
+
     @abstractmethod
     def embed_texts(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
         """Create embeddings for multiple texts.
@@ -32,6 +42,107 @@ class EmbeddingProvider(ABC):
         """
         pass
 
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Tokens each text uses as model input (estimated if no tokenizer is available)."""
+        return [count_tokens(text) for text in texts]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the leading part of ``text`` that fits in ``max_tokens`` input tokens."""
+        return truncate_to_tokens(text, max_tokens)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed one planned batch (a single request or model call).
+
+        Returns:
+            Contiguous float32 array, one row per text
+        """
+        vectors = self.embed_texts(texts, batch_size=len(texts))
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+
+    def _embed_batches(self, batches: List[List[str]]) -> Iterator[np.ndarray]:
+        """Embed planned batches, yielding blocks in order (one at a time by default)."""
+        for texts in batches:
+            yield self._embed_batch(texts)
+
+    def iter_document_blocks(self, texts: List[str]) -> Iterator[Tuple[List[int], np.ndarray]]:
+        """Embed many documents with token-aware batching, block by block.
+
+        Texts longer than ``max_input_tokens`` are cut to their leading
+        tokens, and batches are packed up to ``max_batch_tokens`` instead of a
+        fixed number of texts.
+
+        Yields:
+            ``(positions, block)``: indices into ``texts`` and a contiguous
+            float32 array with their embeddings, one row per position
+        """
+        texts = list(texts)
+        counts = self.count_tokens(texts)
+        truncated = 0
+        for i, tokens in enumerate(counts):
+            if tokens > self.max_input_tokens:
+                texts[i] = self.truncate(texts[i], self.max_input_tokens)
+                counts[i] = self.max_input_tokens
+                truncated += 1
+        if truncated:
+            print(f"[INFO] Truncated {truncated} texts to {self.max_input_tokens} tokens")
+
+        batches = plan_batches(counts, self.max_batch_tokens, self.max_batch_items, self.padded_batches)
+        print(f"[INFO] Embedding {len(texts)} texts ({sum(counts)} tokens) in {len(batches)} batches...")
+
+        done = 0
+        report_every = max(1, len(texts) // 10)
+        batch_texts = [[texts[i] for i in batch] for batch in batches]
+        for batch, block in zip(batches, self._embed_batches(batch_texts)):
+            yield batch, block
+
+            previous, done = done, done + len(batch)
+            if done == len(texts) or done // report_every != previous // report_every:
+                print(f"[INFO] Embedded {done}/{len(texts)} texts")
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        on_batch: Optional[Callable[[List[str], np.ndarray], None]] = None,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Embed many documents into one matrix (see ``iter_document_blocks``).
+
+        Args:
+            texts: Documents to embed
+            on_batch: Called with the texts and block of every completed
+                batch, e.g. to checkpoint them
+            out: Preallocated ``(len(texts), dimension)`` float32 array (or
+                memmap) to write into
+
+        Returns:
+            Embedding matrix, one row per text in input order
+        """
+        if out is None:
+            out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for positions, block in self.iter_document_blocks(texts):
+            out[positions] = block
+            if on_batch is not None:
+                on_batch([texts[i] for i in positions], block)
+        return out
+
+    def embed_queries(self, queries: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Create embeddings for many queries.
+
+        Providers override this to embed queries in batches; the default
+        embeds them one at a time.
+
+        Args:
+            queries: Query texts
+            batch_size: Batch size for processing
+
+        Returns:
+            List of embedding vectors, one per query
+        """
+        return [self.embed_query(query) for query in queries]
+
+    def close(self) -> None:
+        """Release resources held by the provider (worker processes, connections)."""
+
     @property
     @abstractmethod
     def dimension(self) -> int:
@@ -0,0 +1,48 @@
+"""Token-aware batch planning for bulk embedding."""
+from typing import List, Sequence
+
+
+def plan_batches(
+    token_counts: Sequence[int],
+    max_batch_tokens: int,
+    max_batch_items: int,
+    padded: bool = False
+) -> List[List[int]]:
+    """Group texts into batches that stay within a token budget.
+
+    Args:
+        token_counts: Tokens of each text
+        max_batch_tokens: Token budget per batch
+        max_batch_items: Maximum texts per batch
+        padded: Batch cost is ``len(batch) * longest`` (local models pad every
+            text to the longest one). Texts are then grouped by length so
+            little compute is spent on padding.
+
+    Returns:
+        Lists of text indices; each text appears in exactly one batch
+    """
+    order = range(len(token_counts))
+    if padded:
+        order = sorted(order, key=lambda i: token_counts[i])
+
+    batches: List[List[int]] = []
+    batch: List[int] = []
+    total = longest = 0
+    for i in order:
+        tokens = max(1, token_counts[i])
+        if padded:
+            cost = (len(batch) + 1) * max(longest, tokens)
+        else:
+            cost = total + tokens
+
+        if batch and (cost > max_batch_tokens or len(batch) >= max_batch_items):
+            batches.append(batch)
+            batch, total, longest = [], 0, 0
+
+        batch.append(i)
+        total += tokens
+        longest = max(longest, tokens)
+
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,87 @@
+"""Multi-process bulk encoding for local sentence-transformers models.
+
+One ``model.encode`` call scales poorly past a few cores, so bulk indexing
+can instead spread batches over worker processes. Each worker loads its own
+model replica with a pinned torch/BLAS thread count; results come back in
+submission order.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+# Model replica of a worker process
+_worker_model = None
+
+
+def _init_worker(model: str, device: str, threads: int) -> None:
+    # Must be set before torch initializes its thread pools
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    global _worker_model
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(model, device=device)
+
+
+def _encode(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(
+        texts,
+        batch_size=len(texts),
+        convert_to_numpy=True,
+        normalize_embeddings=True
+    ).astype(np.float32, copy=False)
+
+
+class EncodePool:
+    """Pool of worker processes, each holding a replica of one model."""
+
+    def __init__(self, model: str, device: str = "cpu", workers: int = 2, threads_per_worker: int = 1):
+        """Start the workers (models load in the background).
+
+        Args:
+            model: Sentence transformer model name
+            device: Device for every replica
+            workers: Number of worker processes
+            threads_per_worker: torch intra-op threads per worker
+        """
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        # spawn: workers must not inherit the server's threads and locks
+        self._executor: Optional[ProcessPoolExecutor] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model, device, threads_per_worker)
+        )
+        print(f"[INFO] Bulk encode pool started: {workers} processes x {threads_per_worker} threads")
+
+    def map(self, batches: Iterable[List[str]]) -> Iterator[np.ndarray]:
+        """Encode prepared text batches, yielding one float32 array per batch in order.
+
+        At most two batches per worker are in flight, so large inputs are not
+        all queued (and pickled) up front.
+        """
+        if self._executor is None:
+            raise RuntimeError("Encode pool is closed")
+
+        pending = []
+        for texts in batches:
+            pending.append(self._executor.submit(_encode, texts))
+            if len(pending) >= 2 * self.workers:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,281 @@
+"""Embedding inference sidecar shared by all API workers.
+
+One process loads the sentence-transformers model, pins torch's thread count
+and serves encode requests over a Unix socket. Requests arriving from
+different workers within ``max_wait_ms`` are encoded together, so memory
+stays flat as workers are added and the model sees larger batches.
+
+Like the in-process ``LocalEmbeddings`` lock, requests have two priorities:
+interactive (single search queries) and bulk (document and batch encoding).
+Bulk requests are split into ``max_batch`` chunks and interactive requests
+are served before the next chunk, so a large batch never holds queries up
+for more than one model call.
+
+Wire format (both directions): a 4-byte big-endian length followed by a JSON
+header. ``encode`` requests may carry ``"priority": "interactive"|"bulk"``;
+without it, a single query text is interactive and anything else bulk.
+Responses to ``encode`` are followed by ``count * dim`` little-endian
+float32 values.
+
+Run with::
+
+    python -m src.embeddings.inference_server --socket /tmp/feattie-embeddings.sock
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import struct
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+
+_LENGTH = struct.Struct(">I")
+
+# Text kinds ``encode`` accepts (see ``prepare_texts``)
+KINDS = ("query", "passage")
+
+
+def pack_header(header: Dict[str, Any]) -> bytes:
+    """Frame a JSON header for the socket."""
+    payload = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    return _LENGTH.pack(len(payload)) + payload
+
+
+def unpack_length(data: bytes) -> int:
+    return _LENGTH.unpack(data)[0]
+
+
+HEADER_LENGTH_SIZE = _LENGTH.size
+
+
+class _Pending:
+    """An encode request, possibly split into several chunks."""
+
+    __slots__ = ("kind", "texts", "future", "parts", "remaining")
+
+    def __init__(self, kind: str, texts: List[str], future: asyncio.Future, chunks: int):
+        self.kind = kind
+        self.texts = texts
+        self.future = future
+        self.parts: List[Optional[np.ndarray]] = [None] * chunks
+        self.remaining = chunks
+
+
+# (request, chunk number, first text, end of texts)
+_Chunk = Tuple[_Pending, int, int, int]
+
+
+class InferenceServer:
+    """Batches encode requests from many connections onto one model."""
+
+    def __init__(self, embedder, max_batch: int = 64, max_wait_ms: float = 5.0):
+        """Initialize the server.
+
+        Args:
+            embedder: LocalEmbeddings instance
+            max_batch: Maximum number of texts encoded in one model call
+            max_wait_ms: How long to wait for more requests to fill a batch
+        """
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._interactive: Deque[_Chunk] = deque()
+        self._bulk: Deque[_Chunk] = deque()
+        self._arrived: Optional[asyncio.Event] = None
+        # A single thread owns the model; torch parallelism happens inside it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+
+    def _encode(self, kind: str, texts: List[str]) -> np.ndarray:
+        prepared = self.embedder.prepare_texts(texts, kind)
+        embeddings = self.embedder.model.encode(
+            prepared,
+            batch_size=self.max_batch,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return np.asarray(embeddings, dtype="<f4")
+
+    def _enqueue(self, kind: str, texts: List[str], interactive: bool) -> asyncio.Future:
+        """Queue a request as chunks of at most ``max_batch`` texts."""
+        future = asyncio.get_running_loop().create_future()
+        starts = range(0, len(texts), self.max_batch)
+        pending = _Pending(kind, texts, future, len(starts))
+        queue = self._interactive if interactive else self._bulk
+        for number, start in enumerate(starts):
+            queue.append((pending, number, start, min(start + self.max_batch, len(texts))))
+        self._arrived.set()
+        return future
+
+    async def _wait_arrival(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a new request; False on timeout."""
+        self._arrived.clear()
+        try:
+            await asyncio.wait_for(self._arrived.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @staticmethod
+    def _queued_texts(queue: Deque[_Chunk]) -> int:
+        return sum(stop - start for _, _, start, stop in queue)
+
+    async def _fill(self, queue: Deque[_Chunk]) -> None:
+        """Wait up to ``max_wait`` for ``queue`` to hold a full batch.
+
+        Waiting for bulk work stops as soon as an interactive request arrives.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while self._queued_texts(queue) < self.max_batch:
+            if queue is self._bulk and self._interactive:
+                return
+            timeout = deadline - loop.time()
+            if timeout <= 0 or not await self._wait_arrival(timeout):
+                return
+
+    def _take(self, queue: Deque[_Chunk]) -> List[_Chunk]:
+        """Pop chunks of live requests, up to ``max_batch`` texts (at least one chunk)."""
+        batch: List[_Chunk] = []
+        size = 0
+        while queue:
+            pending, _, start, stop = queue[0]
+            if pending.future.done():
+                queue.popleft()
+                continue
+            if batch and size + stop - start > self.max_batch:
+                break
+            batch.append(queue.popleft())
+            size += stop - start
+        return batch
+
+    async def _batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._interactive and not self._bulk:
+                await self._wait_arrival()
+                continue
+
+            if self._interactive:
+                await self._fill(self._interactive)
+                batch = self._take(self._interactive)
+            else:
+                await self._fill(self._bulk)
+                if self._interactive:
+                    continue  # a query arrived while the bulk batch filled
+                batch = self._take(self._bulk)
+
+            for kind in KINDS:
+                chunks = [c for c in batch if c[0].kind == kind and not c[0].future.done()]
+                if not chunks:
+                    continue
+                texts = [t for pending, _, start, stop in chunks for t in pending.texts[start:stop]]
+                try:
+                    vectors = await loop.run_in_executor(self._executor, self._encode, kind, texts)
+                except Exception as e:
+                    for pending, _, _, _ in chunks:
+                        if not pending.future.done():
+                            pending.future.set_exception(e)
+                    continue
+
+                offset = 0
+                for pending, number, start, stop in chunks:
+                    pending.parts[number] = vectors[offset:offset + stop - start]
+                    offset += stop - start
+                    pending.remaining -= 1
+                    if pending.remaining == 0 and not pending.future.done():
+                        pending.future.set_result(np.concatenate(pending.parts))
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    length = unpack_length(await reader.readexactly(HEADER_LENGTH_SIZE))
+                    request = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    break
+
+                op = request.get("op")
+                if op == "info":
+                    writer.write(pack_header({
+                        "model": self.embedder.model_name,
+                        "dim": self.embedder.dimension,
+                        "max_tokens": self.embedder.max_input_tokens,
+                        "pid": os.getpid(),
+                    }))
+                elif op == "encode" and request.get("kind", "passage") not in KINDS:
+                    writer.write(pack_header({"error": f"Unknown kind: {request.get('kind')}"}))
+                elif op == "encode" and not request.get("texts"):
+                    writer.write(pack_header({"count": 0, "dim": self.embedder.dimension}))
+                elif op == "encode":
+                    kind = request.get("kind", "passage")
+                    texts = request["texts"]
+                    priority = request.get("priority")
+                    if priority is None:
+                        priority = "interactive" if kind == "query" and len(texts) == 1 else "bulk"
+                    future = self._enqueue(kind, texts, priority == "interactive")
+                    try:
+                        vectors = await future
+                    except Exception as e:
+                        writer.write(pack_header({"error": str(e)}))
+                    else:
+                        writer.write(pack_header({"count": len(texts), "dim": int(vectors.shape[1])}))
+                        writer.write(vectors.tobytes())
+                else:
+                    writer.write(pack_header({"error": f"Unknown op: {op}"}))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path: str) -> None:
+        """Serve forever on ``socket_path``."""
+        self._arrived = asyncio.Event()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        server = await asyncio.start_unix_server(self._handle, path=socket_path)
+        batcher = asyncio.create_task(self._batch_loop())
+        print(f"[INFO] Embedding sidecar listening on {socket_path} (pid {os.getpid()})")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Embedding inference sidecar")
+    parser.add_argument("--socket", default="/tmp/feattie-embeddings.sock", help="Unix socket path")
+    parser.add_argument("--model", default="intfloat/multilingual-e5-large", help="Sentence transformer model")
+    parser.add_argument("--device", default="cpu", help="Device to use ('cpu' or 'cuda')")
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--max-batch", type=int, default=64, help="Maximum texts per model call")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0, help="Batching window in milliseconds")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+
+    if args.threads > 0:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    from .local_embeddings import LocalEmbeddings
+
+    embedder = LocalEmbeddings(model=args.model, device=args.device)
+    server = InferenceServer(embedder, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+    try:
+        asyncio.run(server.serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
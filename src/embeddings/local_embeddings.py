@@ -1,25 +1,74 @@
-"""Local embedding provider using sentence-transformers."""
-from typing import List
-import numpy as np
+"""Local embedding provider using sentence-transformers.
+
+sentence-transformers (and torch) are only imported when a model is first
+loaded, not when this module is imported.
 
-try:
-    from sentence_transformers import SentenceTransformer
-    SENTENCE_TRANSFORMERS_AVAILABLE = True
-except ImportError:
-    SENTENCE_TRANSFORMERS_AVAILABLE = False
+The model is shared by interactive queries and bulk indexing. Bulk work is
+encoded one batch at a time and gives the model up between batches, and a
+waiting query always goes before the next bulk batch. With ``bulk_workers``
+set, bulk work runs on a pool of worker processes instead (see
+``encode_pool``) and queries keep the in-process model to themselves.
+"""
+import importlib.util
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+import numpy as np
 
 from .base import EmbeddingProvider
+from .encode_pool import EncodePool
+from src.utils.metrics import LOADED_MODELS
+from src.utils.startup import phase
+
+SENTENCE_TRANSFORMERS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+
+
+class _PriorityLock:
+    """Exclusive model lock with two classes: interactive callers go first."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._busy = False
+        self._interactive_waiting = 0
+
+    @contextmanager
+    def hold(self, interactive: bool):
+        with self._cond:
+            if interactive:
+                self._interactive_waiting += 1
+            try:
+                while self._busy or (not interactive and self._interactive_waiting):
+                    self._cond.wait()
+            finally:
+                if interactive:
+                    self._interactive_waiting -= 1
+            self._busy = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
 
 
 class LocalEmbeddings(EmbeddingProvider):
     """Local embedding provider using sentence-transformers."""
 
-    def __init__(self, model: str = "intfloat/multilingual-e5-large", device: str = "cpu"):
+    def __init__(
+        self,
+        model: str = "intfloat/multilingual-e5-large",
+        device: str = "cpu",
+        bulk_workers: int = 0,
+        bulk_threads_per_worker: int = 1
+    ):
         """Initialize local embeddings.
 
         Args:
             model: Sentence transformer model name
             device: Device to use ('cpu' or 'cuda')
+            bulk_workers: Worker processes for bulk encoding (0/1 = in-process)
+            bulk_threads_per_worker: torch threads of each bulk worker
         """
         if not SENTENCE_TRANSFORMERS_AVAILABLE:
             raise ImportError(
@@ -27,43 +76,150 @@ class LocalEmbeddings(EmbeddingProvider):
                 "Install it with: pip install sentence-transformers"
             )
 
+        from sentence_transformers import SentenceTransformer
+
         print(f"[INFO] Loading local embedding model: {model}")
         self._model_name = model
-        self.model = SentenceTransformer(model, device=device)
+        self._device = device
+        with phase(f"load_model:{model}"):
+            self.model = SentenceTransformer(model, device=device)
         self._dimension = self.model.get_sentence_embedding_dimension()
+        self._lock = _PriorityLock()
+        self.max_input_tokens = self.model.max_seq_length or self.max_input_tokens
+
+        LOADED_MODELS.labels(model).inc()
+        weakref.finalize(self, LOADED_MODELS.labels(model).dec)
+
+        # Started on first bulk call, so query-only processes never pay for it
+        self.bulk_workers = bulk_workers
+        self.bulk_threads_per_worker = bulk_threads_per_worker
+        self._pool: Optional[EncodePool] = None
+        self._pool_lock = threading.Lock()
+
+    def _bulk_pool(self) -> Optional[EncodePool]:
+        """Bulk encode pool, if enabled."""
+        if self.bulk_workers <= 1:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = EncodePool(
+                    self._model_name, self._device, self.bulk_workers, self.bulk_threads_per_worker
+                )
+                weakref.finalize(self, self._pool.close)
+            return self._pool
+
+    def close(self) -> None:
+        """Stop the bulk encode workers, if any."""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def prepare_texts(self, texts: List[str], kind: str = "passage") -> List[str]:
+        """Add the model's input prefix (E5 models expect 'query:'/'passage:').
+
+        Args:
+            texts: Raw texts
+            kind: "query" or "passage"
+        """
+        if "e5" in self._model_name.lower():
+            return [f"{kind}: {text}" for text in texts]
+        return list(texts)
 
     def embed_texts(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
-        """Create embeddings for multiple texts."""
+        """Create embeddings for multiple texts.
+
+        Runs at bulk priority: the model is released after every
+        ``batch_size`` texts so pending queries can run in between.
+        """
         print(f"[INFO] Creating local embeddings for {len(texts)} texts...")
 
         # Add prefix for E5 models
-        if "e5" in self._model_name.lower():
-            texts = [f"passage: {text}" for text in texts]
-            print(f"[INFO] Using E5 model - adding 'passage:' prefix")
-
-        # Encode all texts
-        embeddings = self.model.encode(
-            texts,
-            batch_size=batch_size,
-            show_progress_bar=True,
-            convert_to_numpy=True,
-            normalize_embeddings=True
+        return self._encode_bulk(self.prepare_texts(texts, "passage"), batch_size, report=True)
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Input tokens per text, prefix and special tokens included."""
+        encoded = self.model.tokenizer(
+            self.prepare_texts(texts, "passage"),
+            add_special_tokens=True,
+            truncation=False
+        )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut ``text`` at a token boundary so it fits with prefix and special tokens."""
+        reserved = self.count_tokens([""])[0]
+        encoded = self.model.tokenizer(
+            text,
+            add_special_tokens=False,
+            truncation=False,
+            return_offsets_mapping=True
         )
+        offsets = encoded["offset_mapping"]
+        keep = max(0, max_tokens - reserved)
+        if len(offsets) <= keep:
+            return text
+        return text[:offsets[keep - 1][1]] if keep else ""
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self._encode_chunk(self.prepare_texts(texts, "passage"))
+
+    def _embed_batches(self, batches: List[List[str]]) -> Iterator[np.ndarray]:
+        pool = self._bulk_pool()
+        if pool is None:
+            yield from super()._embed_batches(batches)
+            return
+        yield from pool.map(self.prepare_texts(texts, "passage") for texts in batches)
+
+    def embed_queries(self, queries: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Create embeddings for many queries.
+
+        Batched query embedding is offline work, so it runs at bulk priority.
+        """
+        return self._encode_bulk(self.prepare_texts(queries, "query"), batch_size)
 
-        return [emb for emb in embeddings]
+    def _encode_bulk(self, texts: List[str], batch_size: int, report: bool = False) -> List[np.ndarray]:
+        """Encode prepared texts one chunk at a time at bulk priority."""
+        embeddings = []
+        report_every = max(1, len(texts) // 10)
+        chunks = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+        pool = self._bulk_pool() if len(chunks) > 1 else None
+        if pool is not None:
+            encoded = pool.map(chunks)
+        else:
+            encoded = (self._encode_chunk(chunk) for chunk in chunks)
+
+        for i, batch in zip(range(0, len(texts), batch_size), encoded):
+            embeddings.extend(batch)
+
+            done = min(i + batch_size, len(texts))
+            if report and (done == len(texts) or done // report_every != i // report_every):
+                print(f"[INFO] Embedded {done}/{len(texts)} texts")
+
+        return embeddings
+
+    def _encode_chunk(self, texts: List[str]) -> np.ndarray:
+        with self._lock.hold(interactive=False):
+            block = self.model.encode(
+                texts,
+                batch_size=len(texts),
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
+        return block.astype(np.float32, copy=False)
 
     def embed_query(self, query: str) -> np.ndarray:
-        """Create embedding for a single query."""
+        """Create embedding for a single query (interactive priority)."""
         # Add prefix for E5 models
-        query_text = query
-        if "e5" in self._model_name.lower():
-            query_text = f"query: {query}"
+        query_text = self.prepare_texts([query], "query")[0]
 
-        return self.model.encode(
-            query_text,
-            convert_to_numpy=True,
-            normalize_embeddings=True
-        )
+        with self._lock.hold(interactive=True):
+            return self.model.encode(
+                query_text,
+                convert_to_numpy=True,
+                normalize_embeddings=True
+            )
 
     @property
     def dimension(self) -> int:
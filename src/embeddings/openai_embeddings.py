@@ -1,10 +1,11 @@
 """OpenAI embedding provider."""
-import os
+import base64
 from typing import List
 import numpy as np
-from openai import OpenAI
 
 from .base import EmbeddingProvider
+from src.utils.openai_pool import get_openai_client
+from src.utils.tokens import count_tokens, truncate_to_tokens
 
 
 class OpenAIEmbeddings(EmbeddingProvider):
@@ -16,6 +17,12 @@ class OpenAIEmbeddings(EmbeddingProvider):
         'text-embedding-ada-002': 1536,
     }
 
+    # API limits: 8191 tokens per input, 300k tokens and 2048 inputs per request
+    max_input_tokens = 8191
+    max_batch_tokens = 300_000
+    max_batch_items = 2048
+    padded_batches = False
+
     def __init__(self, model: str = "text-embedding-3-large", api_key: str = None):
         """Initialize OpenAI embeddings.
 
@@ -24,7 +31,23 @@ class OpenAIEmbeddings(EmbeddingProvider):
             api_key: OpenAI API key (defaults to OPENAI_API_KEY env var)
         """
         self._model_name = model
-        self.client = OpenAI(api_key=api_key or os.environ.get("OPENAI_API_KEY"))
+        # Pooled: clients per API key share keep-alive connections
+        self.client = get_openai_client(api_key)
+
+    def _create(self, inputs) -> np.ndarray:
+        """One embeddings request, decoded into a float32 block.
+
+        Vectors are requested base64-encoded and decoded straight into one
+        array, not parsed as lists of Python floats.
+        """
+        response = self.client.embeddings.create(
+            model=self._model_name,
+            input=inputs,
+            encoding_format="base64"
+        )
+        data = sorted(response.data, key=lambda item: item.index)
+        raw = b"".join(base64.b64decode(item.embedding) for item in data)
+        return np.frombuffer(raw, dtype="<f4").reshape(len(data), -1)
 
     def embed_texts(self, texts: List[str], batch_size: int = 100) -> List[np.ndarray]:
         """Create embeddings for multiple texts."""
@@ -33,15 +56,7 @@ class OpenAIEmbeddings(EmbeddingProvider):
         print(f"[INFO] Creating OpenAI embeddings for {len(texts)} texts...")
 
         for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-
-            response = self.client.embeddings.create(
-                model=self._model_name,
-                input=batch
-            )
-
-            batch_embeddings = [np.array(item.embedding) for item in response.data]
-            embeddings.extend(batch_embeddings)
+            embeddings.extend(self._create(texts[i:i + batch_size]))
 
             print(f"[INFO] Embedded {min(i + batch_size, len(texts))}/{len(texts)} texts")
 
@@ -49,11 +64,23 @@ class OpenAIEmbeddings(EmbeddingProvider):
 
     def embed_query(self, query: str) -> np.ndarray:
         """Create embedding for a single query."""
-        response = self.client.embeddings.create(
-            model=self._model_name,
-            input=query
-        )
-        return np.array(response.data[0].embedding)
+        return self._create(query)[0]
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        return [count_tokens(text, self._model_name) for text in texts]
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        return truncate_to_tokens(text, max_tokens, self._model_name)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        return self._create(texts)
+
+    def embed_queries(self, queries: List[str], batch_size: int = 100) -> List[np.ndarray]:
+        """Create embeddings for many queries, ``batch_size`` per API call."""
+        embeddings = []
+        for i in range(0, len(queries), batch_size):
+            embeddings.extend(self._create(queries[i:i + batch_size]))
+        return embeddings
 
     @property
     def dimension(self) -> int:
@@ -0,0 +1,127 @@
+"""Embedding provider backed by the shared inference sidecar."""
+import json
+import socket
+import threading
+from typing import List
+
+import numpy as np
+
+from .base import EmbeddingProvider
+from .inference_server import HEADER_LENGTH_SIZE, pack_header, unpack_length
+
+
+class RemoteEmbeddings(EmbeddingProvider):
+    """Sends encode requests to ``src.embeddings.inference_server`` over a Unix socket."""
+
+    def __init__(self, socket_path: str = "/tmp/feattie-embeddings.sock", model: str = None, timeout: float = 60.0):
+        """Initialize remote embeddings.
+
+        Args:
+            socket_path: Unix socket of the inference sidecar
+            model: Expected model name (checked against the sidecar's model)
+            timeout: Socket timeout in seconds
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        # One connection per thread; requests on a connection are sequential
+        self._local = threading.local()
+
+        info = self._request({"op": "info"})[0]
+        if model and info["model"] != model:
+            raise ValueError(
+                f"Embedding sidecar serves {info['model']}, but {model} was requested"
+            )
+        self._model_name = info["model"]
+        self._dimension = info["dim"]
+        self.max_input_tokens = info.get("max_tokens", self.max_input_tokens)
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    @staticmethod
+    def _recv_exactly(sock: socket.socket, size: int) -> bytes:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            n = sock.recv_into(view[received:])
+            if n == 0:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            received += n
+        return bytes(buf)
+
+    def _roundtrip(self, sock: socket.socket, request: dict):
+        sock.sendall(pack_header(request))
+        length = unpack_length(self._recv_exactly(sock, HEADER_LENGTH_SIZE))
+        header = json.loads(self._recv_exactly(sock, length))
+        if "error" in header:
+            raise RuntimeError(f"Embedding sidecar error: {header['error']}")
+
+        payload = None
+        if request["op"] == "encode":
+            count, dim = header["count"], header["dim"]
+            data = self._recv_exactly(sock, count * dim * 4)
+            payload = np.frombuffer(data, dtype="<f4").reshape(count, dim)
+        return header, payload
+
+    def _request(self, request: dict):
+        """Send a request, reconnecting once if the connection went stale."""
+        sock = getattr(self._local, "sock", None)
+        for attempt in range(2):
+            if sock is None:
+                sock = self._local.sock = self._connect()
+            try:
+                return self._roundtrip(sock, request)
+            except (ConnectionError, BrokenPipeError, socket.timeout):
+                sock.close()
+                sock = self._local.sock = None
+                if attempt == 1:
+                    raise
+
+    def embed_texts(self, texts: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Create embeddings for multiple texts.
+
+        Texts are sent in ``batch_size`` chunks so interactive queries from
+        other workers can be interleaved by the sidecar.
+        """
+        print(f"[INFO] Creating sidecar embeddings for {len(texts)} texts...")
+
+        embeddings = []
+        for i in range(0, len(texts), batch_size):
+            _, vectors = self._request(
+                {"op": "encode", "kind": "passage", "priority": "bulk", "texts": texts[i:i + batch_size]}
+            )
+            embeddings.extend(vectors)
+        return embeddings
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Create embedding for a single query."""
+        _, vectors = self._request({"op": "encode", "kind": "query", "priority": "interactive", "texts": [query]})
+        return vectors[0]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        _, vectors = self._request({"op": "encode", "kind": "passage", "priority": "bulk", "texts": texts})
+        return vectors
+
+    def embed_queries(self, queries: List[str], batch_size: int = 32) -> List[np.ndarray]:
+        """Create embeddings for many queries, ``batch_size`` per request."""
+        embeddings = []
+        for i in range(0, len(queries), batch_size):
+            _, vectors = self._request(
+                {"op": "encode", "kind": "query", "priority": "bulk", "texts": queries[i:i + batch_size]}
+            )
+            embeddings.extend(vectors)
+        return embeddings
+
+    @property
+    def dimension(self) -> int:
+        """Get embedding dimension."""
+        return self._dimension
+
+    @property
+    def model_name(self) -> str:
+        """Get model name."""
+        return self._model_name
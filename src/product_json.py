@@ -0,0 +1,71 @@
+"""Pre-serialized product JSON for search responses.
+
+Building a pydantic model per hit and encoding it on every request costs
+more CPU than the search itself for small catalogs. Instead, each product's
+result object is serialized once when an index is loaded (see
+``ProductIndex``), up to its ``similarity`` value, and responses are
+stitched together from those fragments.
+
+The output is byte-for-byte what ``ProductResult.model_dump_json()`` gives
+for the same product. orjson is used when installed.
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, Iterable
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(value: Any) -> bytes:
+    """Compact UTF-8 JSON (non-ASCII kept as is, like pydantic and Starlette)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def _optional(value: Any, kind: Callable[[Any], Any]) -> Any:
+    return None if value is None else kind(value)
+
+
+def product_fragment(product: Dict[str, Any]) -> bytes:
+    """A product's result object, open after ``"similarity":``.
+
+    Fields and types follow ``ProductResult`` in ``src.api.server``; null or
+    missing fields (e.g. a price ``shop_pull`` could not parse) are ``null``.
+
+    Raises:
+        TypeError, ValueError: A field holds a value of the wrong type
+    """
+    colors = product.get("colors")
+    sizes = product.get("sizes")
+    result = {
+        "product_id": _optional(product.get("product_id"), int),
+        "variant_id": _optional(product.get("variant_id"), int),
+        "title": _optional(product.get("title"), str),
+        "vendor": _optional(product.get("vendor"), str),
+        "product_type": _optional(product.get("product_type"), str),
+        "price": _optional(product.get("price"), float),
+        "colors": None if colors is None else [str(c) for c in colors],
+        "sizes": None if sizes is None else [str(s) for s in sizes],
+    }
+    return dumps(result)[:-1] + b',"similarity":'
+
+
+def results_json(
+    results: Iterable[Dict[str, Any]],
+    fragment: Callable[[Dict[str, Any]], bytes] = product_fragment
+) -> bytes:
+    """JSON array of search results (``{"product": ..., "similarity": ...}`` dicts).
+
+    Args:
+        results: Search results
+        fragment: Returns the pre-serialized fragment of a product
+    """
+    return b"[" + b",".join(
+        fragment(r["product"]) + dumps(float(r["similarity"])) + b"}" for r in results
+    ) + b"]"
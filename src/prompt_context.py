@@ -0,0 +1,94 @@
+"""Product context snippets for LLM prompts.
+
+Snippets are built once per product when an index is loaded (see
+``ProductIndex``) and packed into a token budget per request, so answering a
+question does no per-product string parsing.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+NO_PRODUCTS = "Hiç ürün bulunamadı."
+
+
+def product_snippet(product: Dict[str, Any]) -> str:
+    """Describe one product for the LLM (without rank or score)."""
+    lines = [
+        f"  Başlık: {product['title']}",
+        f"  Marka: {product['vendor']}",
+        f"  Kategori: {product['product_type']}",
+        f"  Fiyat: {product['price']} TL",
+    ]
+
+    if product.get('colors'):
+        lines.append(f"  Renkler: {', '.join(product['colors'])}")
+
+    if product.get('sizes'):
+        lines.append(f"  Bedenler: {', '.join(product['sizes'])}")
+
+    # Add description from text field
+    text = product.get('text', '')
+    if 'Tags:' in text:
+        parts = text.split('Tags:')
+        if len(parts) > 1 and len(parts[1]) > 50:
+            desc = parts[1].split('.', 1)
+            if len(desc) > 1:
+                description = desc[1].strip()
+                if description:
+                    lines.append(f"  Açıklama: {description[:300]}")
+
+    return "\n".join(lines)
+
+
+def snippet_with_tokens(product: Dict[str, Any]) -> Tuple[str, int]:
+    """``product_snippet`` plus its token count."""
+    snippet = product_snippet(product)
+    return snippet, count_tokens(snippet)
+
+
+def _entry(rank: int, snippet: str, similarity: float) -> str:
+    return f"Ürün {rank}:\n{snippet}\n  Eşleşme Skoru: {similarity:.2f}"
+
+
+@lru_cache(maxsize=1)
+def _entry_overhead() -> int:
+    """Tokens added around a snippet by ``_entry`` (plus the separator)."""
+    return count_tokens(_entry(1, "", 0.0)) + 1
+
+
+def pack_products(entries: Sequence[Tuple[str, int, float]], token_budget: int) -> Tuple[str, int]:
+    """Pack ranked product snippets into a token budget.
+
+    Snippets are taken in rank order; one that does not fit is skipped so a
+    smaller, lower-ranked one can still use the space. The best product is
+    always included, truncated if needed.
+
+    Args:
+        entries: ``(snippet, snippet_tokens, similarity)`` per result, best first
+        token_budget: Maximum tokens of product context
+
+    Returns:
+        Tuple of (context text, estimated tokens used)
+    """
+    if not entries:
+        return NO_PRODUCTS, count_tokens(NO_PRODUCTS)
+
+    overhead = _entry_overhead()
+    parts: List[str] = []
+    used = 0
+    for snippet, tokens, similarity in entries:
+        cost = tokens + overhead
+        if used + cost > token_budget:
+            if parts:
+                continue
+            # Nothing packed yet: shorten the top product rather than drop it
+            snippet = truncate_to_tokens(snippet, max(0, token_budget - overhead))
+            cost = count_tokens(snippet) + overhead
+
+        parts.append(_entry(len(parts) + 1, snippet, similarity))
+        used += cost
+
+    return "\n\n".join(parts), used
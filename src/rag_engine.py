@@ -2,17 +2,228 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import Callable, List, Dict, Any, Optional, Tuple
 
 import numpy as np
 from dotenv import load_dotenv
 
+from src.build_checkpoint import BuildCheckpoint, BuildProgress, remove_checkpoint
 from src.embeddings import get_embedding_provider, EmbeddingProvider
+from src.product_json import product_fragment
+from src.prompt_context import product_snippet, snippet_with_tokens
+from src.utils.metrics import INDEX_SIZE, stage
+from src.utils.ranking import select_top
+from src.utils.snapshots import next_generation, remove_other_generations, replace_meta
+from src.utils.startup import phase
+from src.utils.tokens import count_tokens
+from src.variants import group_variants, product_text, rank_variants
 
 # Load environment variables
 load_dotenv()
 
+# Upper bound on query×catalog scores materialized at once by batch search
+SCORE_BLOCK_ELEMENTS = 16 * 1024 * 1024
+
+
+def _fragment_or_none(product: Dict[str, Any]) -> Optional[bytes]:
+    """Pre-serialized result JSON, or None for a malformed row.
+
+    A bad row must not stop the index from being served; it is serialized
+    (and fails) only when a search returns it.
+    """
+    try:
+        return product_fragment(product)
+    except (TypeError, ValueError) as e:
+        print(f"[WARN] Product {product.get('product_id')} not pre-serialized: {e}")
+        return None
+
+
+class ProductIndex:
+    """Immutable snapshot of the searchable catalog.
+
+    Vectors are stored as one L2-normalized float32 matrix so cosine
+    similarity is a single matrix-vector product. Searches take a reference
+    to the current snapshot, so a rebuilt index can be swapped in without
+    locking readers. LLM context snippets, their token counts and the JSON
+    of each product in search responses are also computed once here.
+
+    In ``product`` mode each matrix row is a product shared by its
+    ``variants``; ``products`` holds the first variant of each.
+    """
+
+    def __init__(
+        self,
+        products: List[Dict[str, Any]],
+        matrix: np.ndarray,
+        model_name: str,
+        version: int = 0,
+        variants: Optional[List[List[Dict[str, Any]]]] = None
+    ):
+        self.products = products
+        self.matrix = matrix
+        self.model_name = model_name
+        self.version = version
+        self.variants = variants
+        self.product_ids = [p["product_id"] for p in products]
+        # Worker processes scoring this matrix, when sharded search is enabled
+        self.sharded = None
+
+        # All catalog rows, one per variant
+        if variants is None:
+            self.variant_rows = products
+            self._variants_by_product = {}
+        else:
+            self.variant_rows = [v for group in variants for v in group]
+            self._variants_by_product = {group[0]["product_id"]: group for group in variants}
+
+        self.snippets = [product_snippet(p) for p in self.variant_rows]
+        self.snippet_tokens = np.fromiter(
+            (count_tokens(s) for s in self.snippets), dtype=np.int32, count=len(self.variant_rows)
+        )
+        self.fragments = [_fragment_or_none(p) for p in self.variant_rows]
+        self._rows_by_variant = {p.get("variant_id"): i for i, p in enumerate(self.variant_rows)}
+        self._first_by_product: Dict[Any, Dict[str, Any]] = {}
+        for p in products:
+            self._first_by_product.setdefault(p["product_id"], p)
+
+    def product(self, product_id: Any) -> Optional[Dict[str, Any]]:
+        """First catalog row of a product, or None if it is not indexed."""
+        return self._first_by_product.get(product_id)
+
+    @property
+    def mode(self) -> str:
+        """``variant`` (one vector per catalog row) or ``product``."""
+        return "variant" if self.variants is None else "product"
+
+    def context_snippet(self, product: Dict[str, Any]) -> Tuple[str, int]:
+        """Precomputed ``(snippet, token_count)`` for a product of this index."""
+        row = self._rows_by_variant.get(product.get("variant_id"))
+        if row is not None and self.variant_rows[row] is product:
+            return self.snippets[row], int(self.snippet_tokens[row])
+
+        # Product from another (swapped out) index
+        return snippet_with_tokens(product)
+
+    def result_fragment(self, product: Dict[str, Any]) -> bytes:
+        """Pre-serialized result JSON for a product of this index (see ``src.product_json``)."""
+        row = self._rows_by_variant.get(product.get("variant_id"))
+        if row is not None and self.variant_rows[row] is product and self.fragments[row] is not None:
+            return self.fragments[row]
+
+        # Product from another (swapped out) index
+        return product_fragment(product)
+
+    @classmethod
+    def from_vectors(
+        cls,
+        products: List[Dict[str, Any]],
+        vectors,
+        model_name: str,
+        variants: Optional[List[List[Dict[str, Any]]]] = None
+    ) -> "ProductIndex":
+        """Build an index from per-row vectors, normalizing them."""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(len(products), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix /= norms
+        return cls(products, matrix, model_name, variants=variants)
+
+    def resolve_variants(
+        self,
+        product: Dict[str, Any],
+        similarity: float,
+        query: Optional[str],
+        limit: int
+    ) -> List[Dict[str, Any]]:
+        """Results for a matched row: its variants that best match ``query``."""
+        variants = self._variants_by_product.get(product["product_id"], [product])
+        return [
+            {"product": variant, "similarity": similarity}
+            for variant in rank_variants(variants, query)[:limit]
+        ]
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def save(self, snapshot_dir: str, source: Optional[Dict[str, Any]] = None) -> None:
+        """Persist the index to ``snapshot_dir``.
+
+        The data files are written as a new generation and ``meta.json`` is
+        then replaced atomically to name them (see ``src.utils.snapshots``),
+        so a crash leaves either the old or the new snapshot, never a mix.
+        """
+        directory = Path(snapshot_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+        generation = next_generation(directory / "meta.json")
+        embeddings_name = f"embeddings-{generation:06d}.npy"
+        products_name = f"products-{generation:06d}.jsonl"
+
+        with (directory / embeddings_name).open("wb") as f:
+            np.save(f, self.matrix)
+            f.flush()
+            os.fsync(f.fileno())
+
+        with (directory / products_name).open("w", encoding="utf-8") as f:
+            for product in self.variant_rows:
+                f.write(json.dumps(product, ensure_ascii=False))
+                f.write("\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        meta = {
+            "generation": generation,
+            "embeddings": embeddings_name,
+            "products": products_name,
+            "model": self.model_name,
+            "mode": self.mode,
+            "count": len(self.variant_rows),
+            "rows": len(self.products),
+            "dimension": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+            "created_at": time.time(),
+            "source": source or {},
+        }
+        replace_meta(directory / "meta.json", meta)
+        remove_other_generations(directory, {embeddings_name, products_name})
+
+    @classmethod
+    def load(cls, snapshot_dir: str) -> Optional[Tuple["ProductIndex", Dict[str, Any]]]:
+        """Load a snapshot saved by ``save``.
+
+        The matrix is memory-mapped, so loading is fast regardless of size.
+
+        Returns:
+            Tuple of (index, meta), or None if the snapshot is missing or invalid
+        """
+        directory = Path(snapshot_dir)
+        try:
+            meta = json.loads((directory / "meta.json").read_text(encoding="utf-8"))
+            matrix = np.load(directory / meta["embeddings"], mmap_mode="r")
+            products = []
+            with (directory / meta["products"]).open("r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        products.append(json.loads(line))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Could not load index snapshot from {snapshot_dir}: {e}")
+            return None
+
+        variants = group_variants(products) if meta.get("mode") == "product" else None
+        rows = len(variants) if variants is not None else len(products)
+        if len(products) != meta.get("count") or matrix.shape[0] != rows:
+            print(f"[WARN] Index snapshot in {snapshot_dir} is incomplete; ignoring it")
+            return None
+
+        if variants is not None:
+            return cls([group[0] for group in variants], matrix, meta.get("model", ""), variants=variants), meta
+        return cls(products, matrix, meta.get("model", "")), meta
+
 
 class ProductRAG:
     """RAG system for product search with flexible embedding providers."""
@@ -22,6 +233,9 @@ class ProductRAG:
         jsonl_path: str,
         embedding_provider: str = "openai",
         embedding_model: Optional[str] = None,
+        shards: int = 0,
+        index_mode: str = "variant",
+        checkpoint_dir: Optional[str] = None,
         **provider_kwargs
     ):
         """Initialize RAG system with product data.
@@ -30,59 +244,318 @@ class ProductRAG:
             jsonl_path: Path to products_rag.jsonl file
             embedding_provider: "openai" or "local"
             embedding_model: Model name (provider-specific)
+            shards: Split scoring across this many worker processes (0/1 = in-process)
+            index_mode: "variant" embeds every catalog row; "product" embeds
+                each product once and picks variants by color/size
+            checkpoint_dir: Index builds checkpoint completed batches here and
+                resume from them after a failure or restart
             **provider_kwargs: Additional provider arguments (api_key, device, etc.)
         """
         self.jsonl_path = jsonl_path
         self.products: List[Dict[str, Any]] = []
-        self.embeddings: List[np.ndarray] = []
+        self._index: Optional[ProductIndex] = None
+        self._index_version = 0
+
+        # Background rebuild state
+        self._build_lock = threading.Lock()
+        self._build_thread: Optional[threading.Thread] = None
+        self.last_build_error: Optional[str] = None
+        self.last_built_at: Optional[float] = None
+        self._snapshot_source: Optional[Dict[str, Any]] = None
+        self.shards = shards
+        if index_mode not in ("variant", "product"):
+            raise ValueError(f"Unknown index mode: {index_mode}")
+        self.index_mode = index_mode
+        self.checkpoint_dir = checkpoint_dir
+        self.build_progress: Optional[BuildProgress] = None
+        self._index_listeners: List[Callable[[ProductIndex], None]] = []
 
         # Initialize embedding provider
         if embedding_model:
             provider_kwargs['model'] = embedding_model
 
-        self.embedding_provider: EmbeddingProvider = get_embedding_provider(
-            embedding_provider,
-            **provider_kwargs
-        )
+        with phase("provider_init"):
+            self.embedding_provider: EmbeddingProvider = get_embedding_provider(
+                embedding_provider,
+                **provider_kwargs
+            )
 
         print(f"[INFO] Using {embedding_provider} embeddings with model: {self.embedding_provider.model_name}")
 
         # Load products
-        self._load_products(jsonl_path)
+        with phase("load_products"):
+            self.products = self._load_products(jsonl_path)
 
-    def _load_products(self, jsonl_path: str) -> None:
+    @staticmethod
+    def _load_products(jsonl_path: str) -> List[Dict[str, Any]]:
         """Load products from JSONL file."""
         path = Path(jsonl_path)
         if not path.exists():
             raise FileNotFoundError(f"JSONL file not found: {jsonl_path}")
 
+        products = []
         with path.open("r", encoding="utf-8") as f:
             for line in f:
                 line = line.strip()
                 if line:
-                    self.products.append(json.loads(line))
+                    products.append(json.loads(line))
+
+        print(f"[INFO] Loaded {len(products)} products")
+        return products
+
+    @staticmethod
+    def _source_signature(jsonl_path: str) -> Dict[str, Any]:
+        """Identify a catalog file version (used to detect stale snapshots)."""
+        stat = Path(jsonl_path).stat()
+        return {"path": str(jsonl_path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    @property
+    def index(self) -> Optional[ProductIndex]:
+        """Currently served index snapshot."""
+        return self._index
+
+    @property
+    def ready(self) -> bool:
+        """Whether an index is loaded and searches can be served."""
+        return self._index is not None
+
+    @property
+    def index_version(self) -> int:
+        """Monotonic version, bumped every time a new index is swapped in."""
+        return self._index_version
+
+    @property
+    def embeddings(self) -> np.ndarray:
+        """Normalized embedding matrix of the current index."""
+        index = self._index
+        if index is None:
+            return np.empty((0, self.embedding_provider.dimension), dtype=np.float32)
+        return index.matrix
+
+    @property
+    def building(self) -> bool:
+        """Whether a background build is in progress."""
+        return self._build_thread is not None and self._build_thread.is_alive()
+
+    def add_index_listener(self, listener: Callable[[ProductIndex], None]) -> None:
+        """Call ``listener(index)`` whenever a new index is served (and now, if one is)."""
+        self._index_listeners.append(listener)
+        if self._index is not None:
+            listener(self._index)
+
+    def _swap_index(self, index: ProductIndex) -> None:
+        """Atomically replace the served index."""
+        if self.shards > 1 and len(index) > 0:
+            from src.sharded_index import ShardedIndex
+            index.sharded = ShardedIndex(index.matrix, index.product_ids, self.shards)
+
+        previous = self._index
+        self._index_version += 1
+        index.version = self._index_version
+        self._index = index
+        self.products = index.variant_rows
+        INDEX_SIZE.labels("default").set(len(index))
+
+        # Searches still holding the old index fall back to in-process scoring
+        if previous is not None and previous.sharded is not None:
+            previous.sharded.close()
+
+        for listener in self._index_listeners:
+            try:
+                listener(index)
+            except Exception as e:
+                print(f"[WARN] Index listener failed: {e}")
+
+    def close(self) -> None:
+        """Release worker processes and shared memory of the served index."""
+        index = self._index
+        if index is not None and index.sharded is not None:
+            index.sharded.close()
+        self.embedding_provider.close()
+
+    def build_index(self, products: List[Dict[str, Any]], batch_size: Optional[int] = None) -> ProductIndex:
+        """Embed products into a new index without touching the served one.
+
+        Args:
+            products: Product rows to index
+            batch_size: Fixed number of texts per batch; by default batches are
+                packed to the provider's token limits
+        """
+        print(f"[INFO] Creating embeddings for {len(products)} products...")
+
+        variants = None
+        if self.index_mode == "product":
+            variants = group_variants(products)
+            texts = [product_text(group) for group in variants]
+            products = [group[0] for group in variants]
+        else:
+            texts = [p["text"] for p in products]
+
+        # Identical texts are embedded once
+        unique_texts = list(dict.fromkeys(texts))
+        if len(unique_texts) < len(texts):
+            print(f"[INFO] Embedding {len(unique_texts)} unique texts for {len(texts)} index rows")
+
+        # Embeddings are written block by block into one preallocated matrix
+        matrix = np.empty((len(unique_texts), self.embedding_provider.dimension), dtype=np.float32)
+
+        # Texts embedded by an earlier, interrupted build are reused
+        checkpoint = None
+        missing = list(range(len(unique_texts)))
+        if self.checkpoint_dir:
+            checkpoint = BuildCheckpoint(
+                self.checkpoint_dir, self.embedding_provider.model_name, self.embedding_provider.dimension
+            )
+            missing = []
+            for row, text in enumerate(unique_texts):
+                vector = checkpoint.get(text)
+                if vector is None:
+                    missing.append(row)
+                else:
+                    matrix[row] = vector
+            if len(missing) < len(unique_texts):
+                resumed = len(unique_texts) - len(missing)
+                print(f"[INFO] Resuming index build: {resumed}/{len(unique_texts)} texts from checkpoint")
+
+        progress = self.build_progress = BuildProgress(len(unique_texts), done=len(unique_texts) - len(missing))
+        missing_texts = [unique_texts[row] for row in missing]
+
+        try:
+            if batch_size is None:
+                blocks = self.embedding_provider.iter_document_blocks(missing_texts)
+            else:
+                blocks = self._fixed_size_blocks(missing_texts, batch_size)
+            for positions, block in blocks:
+                matrix[[missing[p] for p in positions]] = block
+                if checkpoint is not None:
+                    checkpoint.append([missing_texts[p] for p in positions], block)
+                progress.advance(len(positions))
+        except Exception as e:
+            progress.fail(str(e))
+            raise
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        progress.finish()
+
+        if len(unique_texts) < len(texts):
+            row_of_text = {text: row for row, text in enumerate(unique_texts)}
+            matrix = matrix[[row_of_text[text] for text in texts]]
+
+        index = ProductIndex.from_vectors(
+            products, matrix, self.embedding_provider.model_name, variants=variants
+        )
+
+        print(f"[INFO] Embeddings created successfully ({self.embedding_provider.dimension} dimensions)")
+        return index
 
-        print(f"[INFO] Loaded {len(self.products)} products")
+    def _fixed_size_blocks(self, texts: List[str], batch_size: int):
+        """``iter_document_blocks`` counterpart for a fixed batch size."""
+        for i in range(0, len(texts), batch_size):
+            chunk = texts[i:i + batch_size]
+            vectors = self.embedding_provider.embed_texts(chunk, batch_size=batch_size)
+            yield list(range(i, i + len(chunk))), np.asarray(vectors, dtype=np.float32)
 
     def create_embeddings(self, batch_size: Optional[int] = None) -> None:
-        """Create embeddings for all products.
+        """Create embeddings for all loaded products and serve them.
 
         Args:
-            batch_size: Batch size for processing (provider-specific default if None)
+            batch_size: Fixed number of texts per batch (token-packed if None)
         """
-        print(f"[INFO] Creating embeddings for {len(self.products)} products...")
+        self._swap_index(self.build_index(self.products, batch_size=batch_size))
+        if self.checkpoint_dir:
+            remove_checkpoint(self.checkpoint_dir)
 
-        texts = [p["text"] for p in self.products]
+    def load_snapshot(self, snapshot_dir: str) -> bool:
+        """Serve a previously saved index if it matches the current model.
 
-        # Use provider-specific batch size if not specified
-        if batch_size is None:
-            # Check class name as string
-            provider_class_name = self.embedding_provider.__class__.__name__
-            batch_size = 100 if provider_class_name == 'OpenAIEmbeddings' else 32
+        Returns:
+            True if a snapshot was loaded
+        """
+        loaded = ProductIndex.load(snapshot_dir)
+        if loaded is None:
+            return False
+
+        index, meta = loaded
+        if index.model_name != self.embedding_provider.model_name:
+            print(f"[WARN] Index snapshot was built with {index.model_name}; ignoring it")
+            return False
+        if index.mode != self.index_mode:
+            print(f"[WARN] Index snapshot was built in {index.mode} mode; ignoring it")
+            return False
+
+        self._swap_index(index)
+        self._snapshot_source = meta.get("source", {})
+        print(f"[INFO] Loaded index snapshot with {len(index)} products from {snapshot_dir}")
+        return True
+
+    def snapshot_is_stale(self, jsonl_path: Optional[str] = None) -> bool:
+        """Whether the catalog file changed since the loaded snapshot was built."""
+        if self._snapshot_source is None:
+            return True
+        try:
+            return self._snapshot_source != self._source_signature(jsonl_path or self.jsonl_path)
+        except OSError:
+            return False
+
+    def start_background_build(
+        self,
+        jsonl_path: Optional[str] = None,
+        snapshot_dir: Optional[str] = None
+    ) -> bool:
+        """Rebuild the index from a fresh catalog file in a background thread.
 
-        self.embeddings = self.embedding_provider.embed_texts(texts, batch_size=batch_size)
+        The current index keeps serving until the new one is complete, then
+        it is swapped in atomically (and saved to ``snapshot_dir``, if given).
 
-        print(f"[INFO] Embeddings created successfully ({self.embedding_provider.dimension} dimensions)")
+        Returns:
+            False if a build is already running
+        """
+        with self._build_lock:
+            if self.building:
+                return False
+            self._build_thread = threading.Thread(
+                target=self._build_in_background,
+                args=(jsonl_path or self.jsonl_path, snapshot_dir),
+                name="index-builder",
+                daemon=True
+            )
+            self._build_thread.start()
+        return True
+
+    def _build_in_background(self, jsonl_path: str, snapshot_dir: Optional[str]) -> None:
+        try:
+            source = self._source_signature(jsonl_path)
+            products = self._load_products(jsonl_path)
+            index = self.build_index(products)
+            if snapshot_dir:
+                index.save(snapshot_dir, source=source)
+            self._swap_index(index)
+            if self.checkpoint_dir:
+                remove_checkpoint(self.checkpoint_dir)
+            self.jsonl_path = jsonl_path
+            self._snapshot_source = source
+            self.last_build_error = None
+            self.last_built_at = time.time()
+            print(f"[INFO] Index rebuilt with {len(index)} products (version {index.version})")
+        except Exception as e:
+            self.last_build_error = str(e)
+            print(f"[ERROR] Background index build failed: {e}")
+
+    def build_status(self) -> Dict[str, Any]:
+        """Summary of the served index and background build."""
+        index = self._index
+        return {
+            "ready": index is not None,
+            "building": self.building,
+            "index_version": self._index_version,
+            "size": len(index) if index is not None else 0,
+            "mode": self.index_mode,
+            "model": self.embedding_provider.model_name,
+            "last_built_at": self.last_built_at,
+            "last_error": self.last_build_error,
+            "progress": self.build_progress.snapshot() if self.build_progress else None,
+        }
 
     def search(self, query: str, top_k: int = 3, deduplicate: bool = True) -> List[Dict[str, Any]]:
         """Search for products using query.
@@ -95,40 +568,175 @@ class ProductRAG:
         Returns:
             List of top-k most relevant products with similarity scores
         """
-        if len(self.embeddings) == 0:
+        if self._index is None:
             raise ValueError("No embeddings found. Call create_embeddings() first.")
 
-        # Get query embedding
-        query_embedding = self.embedding_provider.embed_query(query)
+        query_embedding = self.embed_query(query)
+        return self.search_by_vector(query_embedding, top_k=top_k, deduplicate=deduplicate, query=query)
 
-        # Calculate cosine similarities
-        similarities = []
-        for product, embedding in zip(self.products, self.embeddings):
-            similarity = np.dot(query_embedding, embedding) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(embedding)
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query as a normalized float32 vector."""
+        with stage("embed_query"):
+            query_embedding = np.asarray(
+                self.embedding_provider.embed_query(query), dtype=np.float32
             )
-            similarities.append({
-                "product": product,
-                "similarity": float(similarity)
-            })
-
-        # Sort by similarity
-        similarities.sort(key=lambda x: x["similarity"], reverse=True)
-
-        # Deduplicate by product_id (keep highest scoring variant)
-        if deduplicate:
-            seen_products = set()
-            unique_results = []
-            for result in similarities:
-                product_id = result["product"]["product_id"]
-                if product_id not in seen_products:
-                    seen_products.add(product_id)
-                    unique_results.append(result)
-                    if len(unique_results) >= top_k:
-                        break
-            return unique_results
-
-        return similarities[:top_k]
+
+        norm = np.linalg.norm(query_embedding)
+        if norm > 0:
+            query_embedding = query_embedding / norm
+        return query_embedding
+
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed many queries in provider batches.
+
+        Returns:
+            2-D float32 array with one normalized query per row
+        """
+        if not queries:
+            return np.zeros((0, self.embedding_provider.dimension), dtype=np.float32)
+
+        with stage("embed_query"):
+            query_embeddings = np.asarray(
+                self.embedding_provider.embed_queries(list(queries)), dtype=np.float32
+            ).reshape(len(queries), -1)
+
+        norms = np.linalg.norm(query_embeddings, axis=1, keepdims=True)
+        np.divide(query_embeddings, norms, out=query_embeddings, where=norms > 0)
+        return query_embeddings
+
+    def search_many(self, queries: List[str], top_k: int = 3, deduplicate: bool = True) -> List[List[Dict[str, Any]]]:
+        """Search for many queries at once.
+
+        Queries are embedded in one provider batch and scored with
+        matrix-matrix products instead of one scan per query.
+
+        Args:
+            queries: Search query texts
+            top_k: Number of top results per query
+            deduplicate: If True, return only unique products (not variants)
+
+        Returns:
+            One result list (as returned by ``search``) per query
+        """
+        if self._index is None:
+            raise ValueError("No embeddings found. Call create_embeddings() first.")
+
+        return self.search_by_vectors(
+            self.embed_queries(queries), top_k=top_k, deduplicate=deduplicate, queries=queries
+        )
+
+    def search_by_vector(
+        self,
+        query_embedding: np.ndarray,
+        top_k: int = 3,
+        deduplicate: bool = True,
+        query: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Search with an already embedded (normalized) query.
+
+        Args:
+            query_embedding: Output of ``embed_query``
+            top_k: Number of top results to return
+            deduplicate: If True, return only unique products (not variants)
+            query: Query text, used to pick variants in product index mode
+
+        Returns:
+            List of top-k most relevant products with similarity scores
+        """
+        queries = None if query is None else [query]
+        return self.search_by_vectors(
+            query_embedding[None, :], top_k=top_k, deduplicate=deduplicate, queries=queries
+        )[0]
+
+    def search_by_vectors(
+        self,
+        query_embeddings: np.ndarray,
+        top_k: int = 3,
+        deduplicate: bool = True,
+        queries: Optional[List[str]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """Search with a block of already embedded (normalized) queries.
+
+        Args:
+            query_embeddings: 2-D array, one query per row (see ``embed_queries``)
+            top_k: Number of top results per query
+            deduplicate: If True, return only unique products (not variants)
+            queries: Query texts, used to pick variants in product index mode
+
+        Returns:
+            One result list per query
+        """
+        index = self._index
+        if index is None:
+            raise ValueError("No embeddings found. Call create_embeddings() first.")
+
+        if index.variants is not None:
+            # Rows are products already; each hit expands to its best variants
+            return [
+                self._expand_variants(index, results, queries[n] if queries else None, top_k, deduplicate)
+                for n, results in enumerate(self._score(index, query_embeddings, top_k, False))
+            ]
+        return self._score(index, query_embeddings, top_k, deduplicate)
+
+    @staticmethod
+    def _expand_variants(
+        index: ProductIndex,
+        results: List[Dict[str, Any]],
+        query: Optional[str],
+        top_k: int,
+        deduplicate: bool
+    ) -> List[Dict[str, Any]]:
+        """Replace product rows by their variants best matching ``query``."""
+        expanded = []
+        for result in results:
+            limit = 1 if deduplicate else top_k - len(expanded)
+            expanded.extend(index.resolve_variants(result["product"], result["similarity"], query, limit))
+            if len(expanded) >= top_k:
+                break
+        return expanded
+
+    @staticmethod
+    def _score(
+        index: ProductIndex,
+        query_embeddings: np.ndarray,
+        top_k: int,
+        deduplicate: bool
+    ) -> List[List[Dict[str, Any]]]:
+        """Top rows of ``index`` for each query."""
+        # Sharded: each shard scores and ranks its rows, then results merge
+        sharded = index.sharded
+        if sharded is not None and not sharded.closed:
+            try:
+                with stage("score"):
+                    merged = sharded.search(query_embeddings, top_k, deduplicate)
+                return [
+                    [
+                        {"product": index.products[i], "similarity": float(score)}
+                        for i, score in zip(rows.tolist(), scores.tolist())
+                    ]
+                    for rows, scores in merged
+                ]
+            except RuntimeError:
+                pass  # Index was swapped out meanwhile; score in-process
+
+        # Score blocks of queries with one matrix product each, bounding the
+        # size of the query×catalog score block
+        block = max(1, SCORE_BLOCK_ELEMENTS // max(1, len(index)))
+        results = []
+        for start in range(0, len(query_embeddings), block):
+            # Calculate cosine similarities (index rows are already normalized)
+            with stage("score"):
+                scores = query_embeddings[start:start + block] @ index.matrix.T
+
+            # Rank, deduplicating by product_id (keep highest scoring variant)
+            with stage("dedup" if deduplicate else "rank"):
+                for row_scores in scores:
+                    selected = select_top(row_scores, top_k, index.product_ids, deduplicate)
+                    results.append([
+                        {"product": index.products[i], "similarity": float(row_scores[i])}
+                        for i in selected
+                    ])
+        return results
 
     def get_product_ids(self, query: str, top_k: int = 3, deduplicate: bool = True) -> List[int]:
         """Search and return only product IDs.
@@ -0,0 +1,238 @@
+"""Server-side conversation sessions.
+
+Callers send only the new message and a ``session_id``; the history lives
+here. Prompts include the newest turns that fit a token budget, and older
+turns are folded into a running summary in the background, so prompt size
+stays flat as a conversation grows. Sessions expire after a TTL and the
+least recently used ones are evicted when the store exceeds its memory
+budget.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config import get_config
+from src.utils.tokens import count_tokens
+
+# Approximate fixed cost of a stored message besides its text
+_MESSAGE_OVERHEAD_BYTES = 120
+
+SUMMARY_PREFIX = "Önceki konuşmanın özeti:\n"
+
+
+class Session:
+    """History of one conversation."""
+
+    def __init__(self, session_id: str, tenant_id: Any = None):
+        self.session_id = session_id
+        self.tenant_id = tenant_id
+        self.key = f"{tenant_id}:{session_id}"
+        self.messages: List[Dict[str, Any]] = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.compacting = False
+        self.last_access = time.monotonic()
+        self.size = 0
+
+    def _recompute_size(self) -> None:
+        self.size = len(self.summary.encode("utf-8")) + sum(
+            len(m["content"].encode("utf-8")) + _MESSAGE_OVERHEAD_BYTES for m in self.messages
+        )
+
+
+class SessionStore:
+    """TTL + memory-bounded LRU of conversation sessions."""
+
+    def __init__(
+        self,
+        ttl_seconds: float = 1800,
+        max_bytes: int = 64 * 1024 * 1024,
+        history_token_budget: int = 1000,
+        compact_after_tokens: int = 400
+    ):
+        """Initialize the store.
+
+        Args:
+            ttl_seconds: Idle time after which a session is dropped
+            max_bytes: Approximate memory budget for all sessions
+            history_token_budget: Maximum history tokens (summary included) per prompt
+            compact_after_tokens: Summarize turns outside the window once they reach this size
+        """
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes
+        self.history_token_budget = history_token_budget
+        self.compact_after_tokens = compact_after_tokens
+
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _evict(self) -> None:
+        """Drop expired sessions, then the least recently used over budget."""
+        now = time.monotonic()
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.ttl and self._bytes <= self.max_bytes:
+                break
+            del self._sessions[session_id]
+            self._bytes -= session.size
+
+    def _tracked(self, session: Session) -> bool:
+        """Whether ``session`` is still in the store (not evicted)."""
+        return self._sessions.get(session.key) is session
+
+    def get(self, session_id: str, tenant_id: Any = None) -> Session:
+        """Get a session, creating it if it is unknown or expired.
+
+        A session belongs to the tenant that created it; another tenant using
+        the same id gets a fresh session.
+        """
+        key = f"{tenant_id}:{session_id}"
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = Session(session_id, tenant_id)
+            self._sessions.move_to_end(key)
+            session.last_access = time.monotonic()
+            return session
+
+    def append(self, session: Session, role: str, content: str) -> None:
+        """Add a message to a session."""
+        with self._lock:
+            session.messages.append({
+                "role": role,
+                "content": content,
+                "tokens": count_tokens(content),
+            })
+            added = len(content.encode("utf-8")) + _MESSAGE_OVERHEAD_BYTES
+            session.size += added
+            session.last_access = time.monotonic()
+            if self._tracked(session):
+                self._bytes += added
+            self._evict()
+
+    def _window_start(self, session: Session) -> int:
+        """Index of the oldest message that fits the history budget."""
+        budget = self.history_token_budget - session.summary_tokens
+        start = len(session.messages)
+        used = 0
+        while start > 0:
+            tokens = session.messages[start - 1]["tokens"]
+            if used + tokens > budget:
+                break
+            used += tokens
+            start -= 1
+        return start
+
+    def history(self, session: Session) -> List[Dict[str, str]]:
+        """Chat messages for the next prompt: the summary, then the newest turns."""
+        with self._lock:
+            start = self._window_start(session)
+            messages = []
+            if session.summary:
+                messages.append({"role": "system", "content": SUMMARY_PREFIX + session.summary})
+            messages.extend(
+                {"role": m["role"], "content": m["content"]} for m in session.messages[start:]
+            )
+            return messages
+
+    def needs_compaction(self, session: Session) -> bool:
+        """Whether enough turns have left the history window to summarize them."""
+        with self._lock:
+            if session.compacting:
+                return False
+            older = session.messages[:self._window_start(session)]
+            return sum(m["tokens"] for m in older) >= self.compact_after_tokens
+
+    def _pending_compaction(self, session: Session) -> Optional[Tuple[str, List[Dict[str, str]], int]]:
+        """Turns to summarize, if enough have fallen out of the history window.
+
+        Returns:
+            ``(previous_summary, messages, upto)``, or None. Marks the session
+            as compacting.
+        """
+        with self._lock:
+            if session.compacting:
+                return None
+            upto = self._window_start(session)
+            older = session.messages[:upto]
+            if sum(m["tokens"] for m in older) < self.compact_after_tokens:
+                return None
+            session.compacting = True
+            return (
+                session.summary,
+                [{"role": m["role"], "content": m["content"]} for m in older],
+                upto,
+            )
+
+    def _complete_compaction(self, session: Session, summary: Optional[str], upto: int) -> None:
+        """Store a new summary covering the first ``upto`` messages and drop them.
+
+        ``summary=None`` means summarizing failed; the turns stay queued.
+        """
+        with self._lock:
+            session.compacting = False
+            if summary is None:
+                return
+            session.summary = summary
+            session.summary_tokens = count_tokens(summary)
+            del session.messages[:upto]
+
+            before = session.size
+            session._recompute_size()
+            if self._tracked(session):
+                self._bytes += session.size - before
+
+    def compact(self, session: Session, summarize: Callable[[str, List[Dict[str, str]]], str]) -> None:
+        """Summarize turns outside the history window (blocking; run in the background)."""
+        pending = self._pending_compaction(session)
+        if pending is None:
+            return
+
+        previous, messages, upto = pending
+        try:
+            summary = summarize(previous, messages)
+        except Exception as e:
+            print(f"[WARN] Session {session.session_id} compaction failed: {e}")
+            summary = None
+        self._complete_compaction(session, summary, upto)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes}
+
+
+def trim_history(messages: List[Dict[str, str]], token_budget: int) -> List[Dict[str, str]]:
+    """Newest messages of a caller-supplied history that fit ``token_budget``."""
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        tokens = count_tokens(message.get("content", ""))
+        if used + tokens > token_budget:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+    return kept
+
+
+# Global store
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    """Get the global session store, configured from ``sessions``."""
+    global _store
+    if _store is None:
+        config = get_config()
+        _store = SessionStore(
+            ttl_seconds=config.get('sessions', 'ttl_seconds', default=1800),
+            max_bytes=int(config.get('sessions', 'max_memory_mb', default=64) * 1024 * 1024),
+            history_token_budget=config.get('sessions', 'history_token_budget', default=1000),
+            compact_after_tokens=config.get('sessions', 'compact_after_tokens', default=400),
+        )
+    return _store
@@ -0,0 +1,53 @@
+"""Worker process for sharded search (see ``src.sharded_index``).
+
+numpy is imported inside ``serve_shard`` so the BLAS thread count can be
+pinned before the library initializes.
+"""
+import os
+
+
+def serve_shard(conn, matrix_name, shape, groups_name, start, stop, threads=1):
+    """Score queries against rows ``[start, stop)`` until told to stop.
+
+    Each message is ``(request_id, queries, top_k, deduplicate)``; the reply
+    is ``(request_id, results, error)`` with one ``(rows, scores)`` pair per
+    query, holding the shard-local top-k with global row numbers. A request
+    that fails gets ``(request_id, None, error message)`` and the worker keeps
+    serving. Requests are answered in the order received.
+    """
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[var] = str(threads)
+
+    from multiprocessing import shared_memory
+
+    import numpy as np
+    from src.utils.ranking import select_top
+
+    # Workers are spawned by the coordinator and share its resource tracker,
+    # which unlinks the blocks only if the coordinator dies without cleanup
+    matrix_shm = shared_memory.SharedMemory(name=matrix_name)
+    groups_shm = shared_memory.SharedMemory(name=groups_name)
+    matrix = np.ndarray(shape, dtype=np.float32, buffer=matrix_shm.buf)[start:stop]
+    groups = np.ndarray((shape[0],), dtype=np.int64, buffer=groups_shm.buf)[start:stop]
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+
+            request_id, queries, top_k, deduplicate = message
+            try:
+                scores = queries @ matrix.T
+                replies = []
+                for row_scores in scores:
+                    selected = np.asarray(select_top(row_scores, top_k, groups, deduplicate), dtype=np.int64)
+                    replies.append((selected + start, row_scores[selected]))
+            except Exception as e:
+                conn.send((request_id, None, f"{type(e).__name__}: {e}"))
+                continue
+            conn.send((request_id, replies, None))
+    finally:
+        del matrix, groups
+        matrix_shm.close()
+        groups_shm.close()
+        conn.close()
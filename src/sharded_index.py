@@ -0,0 +1,227 @@
+"""Process-parallel sharded scoring for large catalogs.
+
+The normalized embedding matrix is copied once into shared memory and split
+into contiguous row ranges. Each shard is served by its own worker process
+(``src.shard_worker``), so one query fans out across cores: every shard
+returns its local top-k and the coordinator merges them.
+
+Searches from concurrent threads are pipelined: requests are tagged with an
+id and queued on every shard, and a reader thread per shard hands replies
+back to the waiting caller, so shards never wait for each other.
+"""
+from __future__ import annotations
+
+import itertools
+import multiprocessing
+import threading
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.shard_worker import serve_shard
+
+
+class _PendingSearch:
+    """Replies collected for one in-flight search."""
+
+    def __init__(self, shards: int):
+        self.replies: List[Any] = [None] * shards
+        self.remaining = shards
+        self.error: Optional[str] = None
+        self.done = threading.Event()
+
+
+class ShardedIndex:
+    """Scores queries against a matrix split across worker processes."""
+
+    def __init__(self, matrix: np.ndarray, product_ids: Sequence[Any], shards: int, threads_per_shard: int = 1):
+        """Start one worker process per shard.
+
+        Args:
+            matrix: Normalized float32 embedding matrix (rows = catalog items)
+            product_ids: Product of each row, used for deduplication
+            shards: Number of shards / worker processes
+            threads_per_shard: BLAS threads per worker
+        """
+        n, dim = matrix.shape
+        self.shards = max(1, min(shards, n)) if n else 1
+        # Guards _pending, _closed and _failed; notified when a search completes
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._closed = False
+        # Set when a worker process dies; searches then go in-process
+        self._failed: Optional[str] = None
+        self._pending: Dict[int, _PendingSearch] = {}
+        self._request_ids = itertools.count()
+
+        # Dense integer group ids so workers can deduplicate without the products
+        codes = {}
+        groups = np.fromiter(
+            (codes.setdefault(pid, len(codes)) for pid in product_ids),
+            dtype=np.int64,
+            count=n
+        )
+
+        self._matrix_shm = shared_memory.SharedMemory(create=True, size=max(1, matrix.size * 4))
+        self._groups_shm = shared_memory.SharedMemory(create=True, size=max(1, n * 8))
+        np.ndarray((n, dim), dtype=np.float32, buffer=self._matrix_shm.buf)[:] = matrix
+        np.ndarray((n,), dtype=np.int64, buffer=self._groups_shm.buf)[:] = groups
+        self._groups = groups
+
+        # spawn: workers must not inherit the server's threads and locks
+        ctx = multiprocessing.get_context("spawn")
+        bounds = np.linspace(0, n, self.shards + 1).astype(int)
+        self._workers: List[Tuple[Any, Any]] = []
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=serve_shard,
+                args=(
+                    child_conn, self._matrix_shm.name, (n, dim), self._groups_shm.name,
+                    int(start), int(stop), threads_per_shard
+                ),
+                name=f"search-shard-{start}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self._workers.append((process, parent_conn))
+
+        # One send lock and one reply reader per shard
+        self._send_locks = [threading.Lock() for _ in self._workers]
+        self._readers = [
+            threading.Thread(target=self._read_replies, args=(shard,), name=f"search-shard-reader-{shard}", daemon=True)
+            for shard in range(len(self._workers))
+        ]
+        for reader in self._readers:
+            reader.start()
+
+        print(f"[INFO] Sharded index started: {n} rows across {self.shards} processes")
+
+    @property
+    def closed(self) -> bool:
+        """True once closed or once a worker has died (``close`` still frees it)."""
+        return self._closed or self._failed is not None
+
+    def _read_replies(self, shard: int) -> None:
+        """Hand a shard's replies to the searches waiting for them."""
+        conn = self._workers[shard][1]
+        while True:
+            try:
+                request_id, replies, error = conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                pending = self._pending.get(request_id)
+                if pending is None:
+                    continue
+                if error is not None:
+                    # Other shards' replies to this request are then ignored
+                    pending.error = f"Search shard {shard} failed: {error}"
+                    pending.remaining = 0
+                else:
+                    pending.replies[shard] = replies
+                    pending.remaining -= 1
+                if pending.remaining == 0:
+                    del self._pending[request_id]
+                    pending.done.set()
+                    self._idle.notify_all()
+
+        # Worker gone: stop sending to it and fail whatever is still waiting on it
+        with self._lock:
+            if not self._closed and self._failed is None:
+                self._failed = f"Search shard {shard} stopped"
+                print(f"[WARN] {self._failed}; scoring in-process until the index is replaced")
+            for request_id, pending in list(self._pending.items()):
+                if pending.replies[shard] is None:
+                    pending.error = f"Search shard {shard} stopped"
+                    del self._pending[request_id]
+                    pending.done.set()
+            self._idle.notify_all()
+
+    def search(self, queries: np.ndarray, top_k: int, deduplicate: bool) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Score a block of normalized queries.
+
+        Safe to call from many threads; concurrent searches are pipelined
+        through the shards.
+
+        Args:
+            queries: 2-D float32 array, one normalized query per row
+            top_k: Number of results per query
+            deduplicate: If True, keep only the best row per product
+
+        Returns:
+            One ``(rows, scores)`` pair per query, best first
+        """
+        queries = np.ascontiguousarray(queries, dtype=np.float32)
+        pending = _PendingSearch(len(self._workers))
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sharded index is closed")
+            if self._failed is not None:
+                raise RuntimeError(self._failed)
+            request_id = next(self._request_ids)
+            self._pending[request_id] = pending
+
+        message = (request_id, queries, top_k, deduplicate)
+        try:
+            for send_lock, (_, conn) in zip(self._send_locks, self._workers):
+                with send_lock:
+                    conn.send(message)
+        except (BrokenPipeError, OSError) as e:
+            with self._lock:
+                if self._pending.pop(request_id, None) is not None:
+                    self._idle.notify_all()
+            raise RuntimeError(f"Search shard unavailable: {e}")
+
+        pending.done.wait()
+        if pending.error:
+            raise RuntimeError(pending.error)
+        replies = pending.replies
+
+        merged = []
+        for q in range(len(queries)):
+            rows = np.concatenate([shard[q][0] for shard in replies])
+            scores = np.concatenate([shard[q][1] for shard in replies])
+            # Shard-local winners are the only candidates for the global top-k
+            order = np.lexsort((rows, -scores))
+            rows, scores = rows[order], scores[order]
+            if deduplicate:
+                _, first = np.unique(self._groups[rows], return_index=True)
+                keep = np.sort(first)
+                rows, scores = rows[keep], scores[keep]
+            merged.append((rows[:top_k], scores[:top_k]))
+        return merged
+
+    def close(self) -> None:
+        """Stop worker processes and free shared memory.
+
+        Waits for in-flight searches to finish first.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            while self._pending:
+                self._idle.wait()
+
+        for (process, conn), send_lock in zip(self._workers, self._send_locks):
+            try:
+                with send_lock:
+                    conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process, conn in self._workers:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        for reader in self._readers:
+            reader.join(timeout=5)
+        for _, conn in self._workers:
+            conn.close()
+
+        self._matrix_shm.close()
+        self._matrix_shm.unlink()
+        self._groups_shm.close()
+        self._groups_shm.unlink()
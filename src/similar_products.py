@@ -0,0 +1,424 @@
+"""Precomputed "similar products" neighbour graph.
+
+Each product's top-K most similar products are computed offline from the
+``ProductIndex`` (one vector per product: the normalized mean of its variant
+vectors) and stored on disk, so lookups need no embedding call and no scan.
+
+When a new index is served, only what changed is recomputed: products whose
+vector changed (detected by a per-product fingerprint) get new neighbour
+lists, lists that pointed at changed or removed products are rebuilt, and
+every other list just merges in the changed products as candidates.
+
+Usage:
+    python -m src.similar_products --snapshot ./out/index_snapshot --out ./out/similar_products
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.snapshots import next_generation, remove_other_generations, replace_meta
+
+# Most rows of queries scored against the catalog per matrix product
+BLOCK_ROWS = 1024
+
+# Scratch memory for score blocks, shared by all worker threads
+DEFAULT_MEMORY_MB = 512
+
+# Bytes per score-block cell: float32 score, its negated copy and the int64
+# argpartition index
+_BYTES_PER_CELL = 16
+
+# Threads used when no worker count is given
+MAX_DEFAULT_WORKERS = 8
+
+# Incremental updates touching more than this share of products rebuild fully
+FULL_REBUILD_FRACTION = 0.25
+
+# Vector components are compared in steps of 1/FINGERPRINT_SCALE
+FINGERPRINT_SCALE = 1024
+
+
+def product_vectors(index) -> Tuple[List[Any], np.ndarray]:
+    """One normalized vector per product of a ``ProductIndex``.
+
+    Returns:
+        ``(product_ids, matrix)`` in catalog order
+    """
+    matrix = np.asarray(index.matrix, dtype=np.float32)
+    if index.mode == "product":
+        return list(index.product_ids), np.array(matrix)
+
+    codes: Dict[Any, int] = {}
+    groups = np.fromiter(
+        (codes.setdefault(pid, len(codes)) for pid in index.product_ids),
+        dtype=np.int64,
+        count=len(index.product_ids)
+    )
+    vectors = np.zeros((len(codes), matrix.shape[1]), dtype=np.float32)
+    np.add.at(vectors, groups, matrix)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return list(codes), vectors
+
+
+def fingerprints(vectors: np.ndarray) -> np.ndarray:
+    """64-bit digest of every row, to detect changed products.
+
+    Rows are quantized first, so float noise from re-embedding or
+    re-normalizing an unchanged text does not count as a change.
+    """
+    quantized = np.round(np.asarray(vectors, dtype=np.float32) * FINGERPRINT_SCALE).astype(np.int16)
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b(row.tobytes(), digest_size=8).digest(), "little")
+            for row in quantized
+        ),
+        dtype=np.uint64,
+        count=len(vectors)
+    )
+
+
+def _top_k(scores: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Best ``k`` columns per row of ``scores``, with their ``rows`` labels, best first."""
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        scores = np.take_along_axis(scores, part, axis=1)
+        rows = np.take_along_axis(rows, part, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(rows, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def _block_rows(columns: int, memory_mb: float) -> int:
+    """Rows per score block so that one block of ``columns`` fits ``memory_mb``."""
+    rows = int(memory_mb * 1024 * 1024) // max(1, columns * _BYTES_PER_CELL)
+    return max(1, min(BLOCK_ROWS, rows))
+
+
+def top_neighbours(
+    vectors: np.ndarray,
+    query_rows: Sequence[int],
+    k: int,
+    workers: Optional[int] = None,
+    memory_mb: float = DEFAULT_MEMORY_MB
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-``k`` neighbours (excluding self) of the given rows of ``vectors``.
+
+    Blocks of rows are scored with one matrix product each, spread over a
+    thread pool (BLAS releases the GIL). Blocks are sized so that all
+    threads together stay within ``memory_mb`` of scratch memory.
+
+    Returns:
+        ``(neighbours, scores)``: int32 rows and float32 similarities,
+        ``len(query_rows)`` × ``k``
+    """
+    query_rows = np.asarray(query_rows, dtype=np.int64)
+    neighbours = np.empty((len(query_rows), k), dtype=np.int32)
+    scores = np.empty((len(query_rows), k), dtype=np.float32)
+    if k == 0 or len(query_rows) == 0:
+        return neighbours, scores
+
+    workers = workers or min(os.cpu_count() or 1, MAX_DEFAULT_WORKERS)
+    block_rows = _block_rows(len(vectors), memory_mb / workers)
+    workers = min(workers, -(-len(query_rows) // block_rows))
+
+    def work(start: int) -> None:
+        block = query_rows[start:start + block_rows]
+        block_scores = vectors[block] @ vectors.T
+        block_scores[np.arange(len(block)), block] = -np.inf
+        labels = np.broadcast_to(np.arange(len(vectors), dtype=np.int32), block_scores.shape)
+        rows, best = _top_k(block_scores, labels, k)
+        neighbours[start:start + len(block)] = rows
+        scores[start:start + len(block)] = best
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(work, range(0, len(query_rows), block_rows)))
+    return neighbours, scores
+
+
+class NeighbourGraph:
+    """Top-K similar products of every product."""
+
+    def __init__(
+        self,
+        product_ids: Sequence[Any],
+        neighbours: np.ndarray,
+        scores: np.ndarray,
+        prints: np.ndarray,
+        k: int,
+        model_name: str = ""
+    ):
+        self.product_ids = np.asarray(product_ids)
+        self.neighbours = neighbours
+        self.scores = scores
+        self.fingerprints = prints
+        self.k = k
+        self.model_name = model_name
+        self._rows = {pid: i for i, pid in enumerate(self.product_ids.tolist())}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @classmethod
+    def build(
+        cls,
+        index,
+        k: int = 20,
+        workers: Optional[int] = None,
+        memory_mb: float = DEFAULT_MEMORY_MB
+    ) -> "NeighbourGraph":
+        """Compute the graph of a ``ProductIndex`` from scratch."""
+        product_ids, vectors = product_vectors(index)
+        k = max(0, min(k, len(product_ids) - 1))
+        neighbours, scores = top_neighbours(vectors, range(len(product_ids)), k, workers, memory_mb)
+        return cls(
+            product_ids, neighbours, scores.astype(np.float16), fingerprints(vectors), k, index.model_name
+        )
+
+    def update(
+        self,
+        index,
+        k: int,
+        workers: Optional[int] = None,
+        memory_mb: float = DEFAULT_MEMORY_MB
+    ) -> Tuple["NeighbourGraph", int]:
+        """Graph for a new ``ProductIndex``, recomputing only what changed.
+
+        Args:
+            index: The new index
+            k: Configured neighbours per product; a graph with a different
+                (e.g. clamped to a smaller catalog) k is rebuilt
+            workers: Threads for neighbour computation
+            memory_mb: Scratch memory budget (see ``top_neighbours``)
+
+        Returns:
+            ``(graph, recomputed)``: the new graph (``self`` if nothing
+            changed) and the number of neighbour lists computed from scratch
+        """
+        product_ids, vectors = product_vectors(index)
+        prints = fingerprints(vectors)
+        n = len(product_ids)
+        k = max(0, min(k, n - 1))
+
+        # Old row of every product whose vector is unchanged, else -1
+        old_rows = np.array([self._rows.get(pid, -1) for pid in product_ids], dtype=np.int64)
+        known = old_rows >= 0
+        known[known] = self.fingerprints[old_rows[known]] == prints[known]
+        changed = np.flatnonzero(~known)
+        removed = len(self) - int((old_rows >= 0).sum())
+
+        if index.model_name != self.model_name or k != self.k or k == 0 or (
+            len(changed) + removed > FULL_REBUILD_FRACTION * max(1, n)
+        ):
+            graph = NeighbourGraph.build(index, k, workers, memory_mb)
+            return graph, len(graph)
+        if len(changed) == 0 and removed == 0:
+            return self, 0
+
+        # Old neighbour lists in new row numbers; -1 marks changed/removed products
+        new_row_of_old = np.full(len(self), -1, dtype=np.int64)
+        new_row_of_old[old_rows[known]] = np.flatnonzero(known)
+        clean = np.flatnonzero(known)
+        remapped = new_row_of_old[self.neighbours[old_rows[clean]]]
+
+        # Lists that lost a neighbour are recomputed, as are changed products
+        stale = (remapped < 0).any(axis=1)
+        dirty = np.concatenate([changed, clean[stale]])
+        clean, remapped = clean[~stale], remapped[~stale]
+        clean_scores = self.scores[old_rows[clean]].astype(np.float32)
+
+        neighbours = np.empty((n, k), dtype=np.int32)
+        scores = np.empty((n, k), dtype=np.float32)
+        neighbours[dirty], scores[dirty] = top_neighbours(vectors, dirty, k, workers, memory_mb)
+
+        # Clean lists only need the changed products as extra candidates
+        block_rows = _block_rows(k + len(changed), memory_mb)
+        for start in range(0, len(clean), block_rows):
+            rows = clean[start:start + block_rows]
+            candidate_scores = np.concatenate(
+                [clean_scores[start:start + block_rows], vectors[rows] @ vectors[changed].T], axis=1
+            )
+            candidate_rows = np.concatenate(
+                [remapped[start:start + block_rows], np.broadcast_to(changed, (len(rows), len(changed)))], axis=1
+            )
+            neighbours[rows], scores[rows] = _top_k(candidate_scores, candidate_rows, k)
+
+        graph = NeighbourGraph(product_ids, neighbours, scores.astype(np.float16), prints, k, index.model_name)
+        return graph, len(dirty)
+
+    def lookup(self, product_id: Any, limit: Optional[int] = None) -> Optional[List[Tuple[Any, float]]]:
+        """Most similar products as ``(product_id, score)``, or None if unknown."""
+        row = self._rows.get(product_id)
+        if row is None:
+            return None
+        limit = self.k if limit is None else min(limit, self.k)
+        ids = self.product_ids[self.neighbours[row, :limit]].tolist()
+        return list(zip(ids, self.scores[row, :limit].astype(float).tolist()))
+
+    def save(self, directory: str) -> None:
+        """Persist the graph as a new generation (see ``src.utils.snapshots``)."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        generation = next_generation(path / "meta.json")
+        files = {}
+        for name, array in (
+            ("product_ids", self.product_ids),
+            ("neighbours", self.neighbours),
+            ("scores", self.scores),
+            ("fingerprints", self.fingerprints),
+        ):
+            files[name] = f"{name}-{generation:06d}.npy"
+            with (path / files[name]).open("wb") as f:
+                np.save(f, np.asarray(array), allow_pickle=False)
+                f.flush()
+                os.fsync(f.fileno())
+
+        meta = {
+            "generation": generation,
+            "files": files,
+            "k": self.k,
+            "count": len(self),
+            "model": self.model_name,
+            "created_at": time.time(),
+        }
+        replace_meta(path / "meta.json", meta)
+        remove_other_generations(path, files.values())
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["NeighbourGraph"]:
+        """Load a saved graph (memory-mapped), or None if missing or invalid."""
+        path = Path(directory)
+        try:
+            meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+            arrays = {
+                name: np.load(path / meta["files"][name], mmap_mode="r")
+                for name in ("product_ids", "neighbours", "scores", "fingerprints")
+            }
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[WARN] Could not load similar-products graph from {directory}: {e}")
+            return None
+
+        if any(len(array) != meta.get("count") for array in arrays.values()):
+            print(f"[WARN] Similar-products graph in {directory} is incomplete; ignoring it")
+            return None
+
+        return cls(
+            arrays["product_ids"], arrays["neighbours"], arrays["scores"], arrays["fingerprints"],
+            meta["k"], meta.get("model", "")
+        )
+
+
+class SimilarProducts:
+    """Serves the neighbour graph and keeps it in sync with the served index."""
+
+    def __init__(
+        self,
+        directory: str,
+        k: int = 20,
+        workers: Optional[int] = None,
+        memory_mb: float = DEFAULT_MEMORY_MB
+    ):
+        """Load the saved graph, if any.
+
+        Args:
+            directory: Where the graph is stored
+            k: Neighbours kept per product
+            workers: Threads for neighbour computation (CPU count, at most
+                ``MAX_DEFAULT_WORKERS``, if None)
+            memory_mb: Scratch memory for neighbour computation
+        """
+        self.directory = directory
+        self.k = k
+        self.workers = workers
+        self.memory_mb = memory_mb
+        self.graph: Optional[NeighbourGraph] = NeighbourGraph.load(directory)
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._pending = None
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, index) -> None:
+        """Bring the graph up to date with ``index`` in a background thread.
+
+        Calls made while a refresh runs are folded into one follow-up
+        refresh for the newest index.
+        """
+        with self._lock:
+            self._pending = index
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._refresh_loop, name="similar-products", daemon=True)
+            self._thread.start()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            with self._lock:
+                index, self._pending = self._pending, None
+                if index is None:
+                    self._thread = None
+                    return
+            try:
+                start = time.perf_counter()
+                if self.graph is None:
+                    graph = NeighbourGraph.build(index, self.k, self.workers, self.memory_mb)
+                    recomputed = len(graph)
+                else:
+                    graph, recomputed = self.graph.update(index, self.k, self.workers, self.memory_mb)
+                if graph is not self.graph:
+                    graph.save(self.directory)
+                    self.graph = graph
+                    print(
+                        f"[INFO] Similar-products graph updated: {recomputed}/{len(graph)} lists "
+                        f"recomputed in {time.perf_counter() - start:.1f}s"
+                    )
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ERROR] Similar-products graph update failed: {e}")
+
+
+def main():
+    """Build or update the graph of a saved index snapshot."""
+    import argparse
+
+    from src.rag_engine import ProductIndex
+
+    parser = argparse.ArgumentParser(description="Precompute similar-product neighbours")
+    parser.add_argument("--snapshot", default="./out/index_snapshot", help="Index snapshot directory")
+    parser.add_argument("--out", default="./out/similar_products", help="Graph directory")
+    parser.add_argument("--k", type=int, default=20, help="Neighbours per product")
+    parser.add_argument("--workers", type=int, default=0, help="Threads (0 = CPU count, at most 8)")
+    parser.add_argument("--memory-mb", type=float, default=DEFAULT_MEMORY_MB, help="Scratch memory budget")
+    parser.add_argument("--full", action="store_true", help="Rebuild instead of updating an existing graph")
+    args = parser.parse_args()
+
+    loaded = ProductIndex.load(args.snapshot)
+    if loaded is None:
+        raise SystemExit(f"No valid index snapshot in {args.snapshot}")
+    index, _ = loaded
+
+    start = time.perf_counter()
+    previous = None if args.full else NeighbourGraph.load(args.out)
+    if previous is None:
+        graph = NeighbourGraph.build(index, args.k, args.workers or None, args.memory_mb)
+        recomputed = len(graph)
+    else:
+        graph, recomputed = previous.update(index, args.k, args.workers or None, args.memory_mb)
+    graph.save(args.out)
+    print(
+        f"[INFO] {len(graph)} products, {recomputed} neighbour lists computed "
+        f"in {time.perf_counter() - start:.1f}s -> {args.out}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Retrieval over tenant custom contexts (FAQ, policies, ...).
+
+Instead of sending a tenant's whole context with every chat message, the
+context is split into chunks and embedded once. Each query then gets only
+its best-scoring chunks, packed into a token budget. Contexts that already
+fit the budget are used as-is.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import numpy as np
+
+from config import get_config
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(text: str, chunk_tokens: int = 200) -> List[str]:
+    """Split text into chunks of about ``chunk_tokens`` tokens.
+
+    Paragraphs (blank-line separated) are kept together where possible;
+    longer ones are split on sentence boundaries.
+    """
+    pieces = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if count_tokens(paragraph) <= chunk_tokens:
+            pieces.append(paragraph)
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            # A single over-long sentence is cut rather than dropped
+            while count_tokens(sentence) > chunk_tokens:
+                head = truncate_to_tokens(sentence, chunk_tokens)
+                if not head:
+                    break
+                pieces.append(head)
+                sentence = sentence[len(head):].strip()
+            if sentence:
+                pieces.append(sentence)
+
+    # Merge neighbouring pieces up to the chunk size
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if current and current_tokens + tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class ContextIndex:
+    """Embedded chunks of one tenant context."""
+
+    def __init__(self, chunks: List[str], vectors, model_name: str):
+        self.chunks = chunks
+        self.tokens = np.array([count_tokens(c) for c in chunks], dtype=np.int32)
+        self.model_name = model_name
+
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(chunks), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = matrix / norms
+
+    def select(self, query_embedding: np.ndarray, token_budget: int) -> str:
+        """Best-scoring chunks that fit in ``token_budget``, in document order."""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        scores = self.matrix @ query
+        chosen = []
+        used = 0
+        for i in np.argsort(-scores, kind="stable"):
+            if used + self.tokens[i] <= token_budget:
+                chosen.append(int(i))
+                used += int(self.tokens[i])
+
+        return "\n\n".join(self.chunks[i] for i in sorted(chosen))
+
+
+class TenantContextStore:
+    """Per-tenant context indexes, rebuilt when a tenant's context changes.
+
+    Keeps at most ``max_tenants`` indexes, evicting the least recently used.
+    """
+
+    def __init__(self, chunk_tokens: int = 200, max_tenants: int = 256):
+        self.chunk_tokens = chunk_tokens
+        self.max_tenants = max_tenants
+        self._indexes: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _digest(context: str, model_name: str) -> str:
+        return hashlib.sha1(f"{model_name}\0{context}".encode("utf-8")).hexdigest()
+
+    def lookup(self, tenant_id: Any, context: str, model_name: str) -> Optional[ContextIndex]:
+        """Cached index for a tenant's current context, or None."""
+        digest = self._digest(context, model_name)
+        with self._lock:
+            entry = self._indexes.get(tenant_id)
+            if entry is not None and entry[0] == digest:
+                self._indexes.move_to_end(tenant_id)
+                return entry[1]
+        return None
+
+    def get(self, tenant_id: Any, context: str, embedder) -> ContextIndex:
+        """Index for a tenant's current context, chunking and embedding it on a miss."""
+        index = self.lookup(tenant_id, context, embedder.model_name)
+        if index is not None:
+            return index
+        digest = self._digest(context, embedder.model_name)
+
+        chunks = chunk_text(context, self.chunk_tokens)
+        index = ContextIndex(chunks, embedder.embed_texts(chunks), embedder.model_name)
+
+        with self._lock:
+            self._indexes[tenant_id] = (digest, index)
+            self._indexes.move_to_end(tenant_id)
+            while len(self._indexes) > self.max_tenants:
+                self._indexes.popitem(last=False)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+
+# Global store
+_store: Optional[TenantContextStore] = None
+
+
+def get_context_store() -> TenantContextStore:
+    """Get the global tenant context store, configured from ``tenant_context``."""
+    global _store
+    if _store is None:
+        config = get_config()
+        _store = TenantContextStore(
+            chunk_tokens=config.get('tenant_context', 'chunk_tokens', default=200),
+            max_tenants=config.get('tenant_context', 'max_tenants', default=256),
+        )
+    return _store
@@ -0,0 +1,387 @@
+"""Admission control with bounded queues and load shedding.
+
+Each operation class (embed, search, llm) has a concurrency limit, a maximum
+queue depth and a queueing deadline. Requests that would exceed the queue,
+or that cannot start before the deadline, fail fast with ``Overloaded`` so
+latency under overload stays bounded instead of growing with the backlog.
+
+Multi-tenant callers go through ``admit_tenant``: each tenant is rate limited
+by a token bucket, and queued requests are ordered by weighted fair queueing
+so one tenant's bulk traffic cannot starve the others.
+"""
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from config import get_config
+from src.utils.metrics import (
+    ADMISSION_IN_FLIGHT,
+    ADMISSION_QUEUE_DEPTH,
+    ADMISSION_REJECTIONS,
+    ADMISSION_WAIT,
+    TENANT_ADMISSION_WAIT,
+)
+
+# Defaults for operation classes missing from the ``admission`` config section
+DEFAULT_LIMITS = {
+    "embed": {"concurrency": 4, "queue_depth": 64, "timeout_ms": 2000},
+    "search": {"concurrency": 8, "queue_depth": 128, "timeout_ms": 1000},
+    "llm": {"concurrency": 16, "queue_depth": 64, "timeout_ms": 5000},
+}
+
+# Defaults for tenants missing from the ``tenants`` config section
+DEFAULT_TENANT_LIMITS = {
+    "weight": 1.0,
+    "max_queued": 16,
+    "embed_rate": 20.0,
+    "embed_burst": 40,
+    "llm_rate": 5.0,
+    "llm_burst": 10,
+}
+
+
+class Overloaded(Exception):
+    """Raised when a request is shed; mapped to an HTTP error with Retry-After."""
+
+    def __init__(self, operation: str, reason: str, retry_after: int, status_code: int = 503):
+        super().__init__(f"{operation} capacity exhausted ({reason})")
+        self.operation = operation
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class AdmissionController:
+    """Concurrency limit plus a bounded, deadline-aware wait queue.
+
+    Waiters are kept in a heap ordered by ``(priority, arrival)``; with the
+    default priority this is plain FIFO. ``fair_tag`` computes priorities for
+    weighted fair queueing between tenants.
+    """
+
+    def __init__(self, operation: str, concurrency: int, queue_depth: int, timeout_ms: float):
+        """Initialize the controller.
+
+        Args:
+            operation: Operation class name (metric label)
+            concurrency: Maximum requests executing at once
+            queue_depth: Maximum requests waiting; more are rejected immediately
+            timeout_ms: Maximum time a request may wait before it is rejected
+        """
+        self.operation = operation
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.timeout = timeout_ms / 1000.0
+
+        self.active = 0
+        self._waiters: List[list] = []
+        self._waiting = 0
+        self._seq = itertools.count()
+        # Smoothed execution time, used to estimate Retry-After
+        self._service_time = 0.1
+
+        # Weighted fair queueing state: the tag of the last admitted request
+        # and the finish tag of each tenant's latest request
+        self.virtual_time = 0.0
+        self._finish_tags: Dict[Any, float] = {}
+        self._tenant_waiting: Dict[Any, int] = {}
+
+    @property
+    def queued(self) -> int:
+        return self._waiting
+
+    def retry_after(self) -> int:
+        """Seconds until a rejected caller is likely to be admitted."""
+        backlog = (self._waiting + 1) * self._service_time / max(1, self.concurrency)
+        return max(1, math.ceil(backlog))
+
+    def _reject(self, reason: str) -> Overloaded:
+        ADMISSION_REJECTIONS.labels(self.operation, reason).inc()
+        return Overloaded(self.operation, reason, self.retry_after())
+
+    def fair_tag(self, tenant: Any, weight: float, cost: float = 1.0) -> float:
+        """Virtual finish tag for a tenant's next request.
+
+        A tenant's requests are spaced ``cost / weight`` apart in virtual time,
+        so a backlogged tenant is interleaved with, not ahead of, the others.
+        """
+        start = max(self.virtual_time, self._finish_tags.get(tenant, 0.0))
+        tag = start + cost / max(weight, 1e-6)
+        self._finish_tags[tenant] = tag
+
+        if len(self._finish_tags) > 1024:
+            # Tenants whose tags are in the past have no backlog to remember
+            self._finish_tags = {
+                t: f for t, f in self._finish_tags.items() if f > self.virtual_time
+            }
+        return tag
+
+    def _update_gauges(self) -> None:
+        ADMISSION_QUEUE_DEPTH.labels(self.operation).set(self._waiting)
+        ADMISSION_IN_FLIGHT.labels(self.operation).set(self.active)
+
+    def _observe_wait(self, elapsed: float, tenant: Any) -> None:
+        ADMISSION_WAIT.labels(self.operation).observe(elapsed)
+        if tenant is not None:
+            TENANT_ADMISSION_WAIT.labels(self.operation, str(tenant)).observe(elapsed)
+
+    async def acquire(self, priority: float = 0.0, tenant: Any = None, tenant_queue_limit: Optional[int] = None) -> None:
+        """Wait for an execution slot.
+
+        Args:
+            priority: Heap priority; lower values are admitted first
+            tenant: Tenant label for per-tenant wait metrics and queue limits
+            tenant_queue_limit: Maximum requests this tenant may have queued
+
+        Raises:
+            Overloaded: The queue is full or the deadline passed while waiting
+        """
+        if self.active < self.concurrency and self._waiting == 0:
+            self.active += 1
+            self.virtual_time = max(self.virtual_time, priority)
+            self._update_gauges()
+            self._observe_wait(0.0, tenant)
+            return
+
+        if self._waiting >= self.queue_depth:
+            raise self._reject("queue_full")
+        if tenant_queue_limit is not None and self._tenant_waiting.get(tenant, 0) >= tenant_queue_limit:
+            raise self._reject("tenant_queue_full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        self._waiting += 1
+        if tenant is not None:
+            self._tenant_waiting[tenant] = self._tenant_waiting.get(tenant, 0) + 1
+        self._update_gauges()
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just as the deadline hit; give it back
+                self.release()
+            else:
+                future.cancel()
+                self._waiting -= 1
+            self._update_gauges()
+            raise self._reject("deadline")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+                self._waiting -= 1
+            self._update_gauges()
+            raise
+        finally:
+            if tenant is not None:
+                remaining = self._tenant_waiting[tenant] - 1
+                if remaining:
+                    self._tenant_waiting[tenant] = remaining
+                else:
+                    del self._tenant_waiting[tenant]
+            self._observe_wait(time.perf_counter() - start, tenant)
+
+    def try_acquire(self, tenant: Any = None) -> bool:
+        """Take a slot only if one is free and nobody is queued (never waits)."""
+        if self.active >= self.concurrency or self._waiting:
+            return False
+        self.active += 1
+        self._update_gauges()
+        self._observe_wait(0.0, tenant)
+        return True
+
+    def release(self) -> None:
+        """Free a slot, handing it to the next live waiter if any."""
+        while self._waiters:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.cancelled():
+                continue
+            self._waiting -= 1
+            self.virtual_time = max(self.virtual_time, priority)
+            future.set_result(None)  # slot passes directly to the waiter
+            self._update_gauges()
+            return
+
+        self.active -= 1
+        self._update_gauges()
+
+    @asynccontextmanager
+    async def slot(self, priority: float = 0.0, **kwargs) -> AsyncIterator[None]:
+        """Hold an execution slot for the duration of the block.
+
+        Keyword arguments are passed to ``acquire``.
+        """
+        await self.acquire(priority, **kwargs)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self.release()
+
+
+# Global controllers, one per operation class
+_controllers: Dict[str, AdmissionController] = {}
+
+
+def get_admission(operation: str) -> AdmissionController:
+    """Get the controller for an operation class, configured from ``admission``."""
+    controller = _controllers.get(operation)
+    if controller is None:
+        limits = dict(DEFAULT_LIMITS.get(operation, DEFAULT_LIMITS["search"]))
+        limits.update(get_config().get('admission', operation, default={}) or {})
+        controller = AdmissionController(
+            operation,
+            concurrency=limits["concurrency"],
+            queue_depth=limits["queue_depth"],
+            timeout_ms=limits["timeout_ms"],
+        )
+        _controllers[operation] = controller
+    return controller
+
+
+def admit(operation: str, priority: float = 0.0):
+    """Shortcut for ``get_admission(operation).slot(priority)``."""
+    return get_admission(operation).slot(priority)
+
+
+class TokenBucket:
+    """Token bucket rate limiter (``rate`` tokens per second, up to ``burst``)."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def configure(self, rate: float, burst: float) -> None:
+        """Apply changed limits, keeping the tokens already accrued."""
+        self._refill()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = min(self.tokens, float(burst))
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1.0) -> float:
+        """Take ``cost`` tokens.
+
+        Returns:
+            0.0 if the tokens were taken, else seconds until they will be available
+        """
+        self._refill()
+
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+# Global token buckets, keyed by (operation, tenant)
+_buckets: Dict[Tuple[str, Any], TokenBucket] = {}
+
+
+def tenant_limits(tenant: Any) -> Dict[str, Any]:
+    """Scheduling limits for a tenant.
+
+    Merges ``DEFAULT_TENANT_LIMITS``, ``tenants.default`` and the tenant's own
+    entry (keyed by tenant id) from the ``tenants`` config section.
+    """
+    section = get_config().get('tenants', default={}) or {}
+    limits = dict(DEFAULT_TENANT_LIMITS)
+    limits.update(section.get('default') or {})
+    limits.update(section.get(tenant) or section.get(str(tenant)) or {})
+    return limits
+
+
+def max_tenant_cost(operation: str, tenant: Any) -> Optional[float]:
+    """Largest ``cost`` a single ``admit_tenant`` call may have (the bucket's burst).
+
+    Bulk callers split their work into pieces of at most this cost. None if
+    the operation is not rate limited.
+    """
+    limits = tenant_limits(tenant)
+    rate = limits.get(f"{operation}_rate")
+    if not rate:
+        return None
+    return float(limits.get(f"{operation}_burst") or rate)
+
+
+@asynccontextmanager
+async def admit_tenant(
+    operation: str,
+    tenant: Any,
+    cost: float = 1.0,
+    max_wait: float = 0.0,
+    background: bool = False
+) -> AsyncIterator[None]:
+    """Hold an execution slot on behalf of a tenant.
+
+    The tenant's token bucket for ``operation`` must cover ``cost``, otherwise
+    the request is rejected with 429; a cost larger than the bucket's burst
+    can never be covered and is rejected with 413 (see ``max_tenant_cost``).
+    Queued requests are admitted in weighted fair order across tenants.
+
+    Args:
+        operation: Operation class (``embed``, ``llm``, ...)
+        tenant: Tenant id
+        cost: Work units of this request (e.g. number of texts)
+        max_wait: Seconds to wait for the bucket to refill before rejecting;
+            bulk callers use this to be paced at the tenant's rate
+        background: Lowest priority: run only on an idle slot with nothing
+            queued, else reject with reason ``busy`` (the caller retries later)
+
+    Raises:
+        Overloaded: Rate limited, or shed by the shared admission controller
+    """
+    limits = tenant_limits(tenant)
+    controller = get_admission(operation)
+
+    rate = limits.get(f"{operation}_rate")
+    if rate:
+        burst = limits.get(f"{operation}_burst") or rate
+        if cost > burst:
+            ADMISSION_REJECTIONS.labels(operation, "cost_exceeds_burst").inc()
+            raise Overloaded(operation, "cost_exceeds_burst", 1, status_code=413)
+
+        key = (operation, tenant)
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = _buckets[key] = TokenBucket(rate, burst)
+        elif bucket.rate != rate or bucket.burst != burst:
+            bucket.configure(rate, burst)
+        wait = bucket.take(cost)
+        deadline = time.monotonic() + max_wait
+        while wait and time.monotonic() + wait <= deadline:
+            await asyncio.sleep(wait)
+            wait = bucket.take(cost)
+        if wait:
+            ADMISSION_REJECTIONS.labels(operation, "rate_limited").inc()
+            raise Overloaded(operation, "rate_limited", max(1, math.ceil(wait)), status_code=429)
+
+    if background:
+        if not controller.try_acquire(tenant):
+            raise controller._reject("busy")
+        try:
+            yield
+        finally:
+            controller.release()
+        return
+
+    priority = controller.fair_tag(tenant, limits["weight"], cost)
+    async with controller.slot(priority, tenant=tenant, tenant_queue_limit=limits.get("max_queued")):
+        yield
@@ -0,0 +1,58 @@
+"""Single-flight coalescing of identical in-flight calls.
+
+When many clients send the same query at once, only the first call does the
+work; the others wait for it and share its result (or exception). Nothing is
+cached: once the call finishes, the next identical request starts a new one.
+"""
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+from src.utils.metrics import COALESCED_CALLS, COALESCE_LEADERS
+
+T = TypeVar("T")
+
+
+def normalize_query(query: str) -> str:
+    """Query text as used in coalescing keys (case and whitespace folded)."""
+    return " ".join(query.split()).casefold()
+
+
+class SingleFlight:
+    """Shares one in-flight computation between concurrent identical calls."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run ``fn()`` unless a call with the same key is already running.
+
+        The work runs in its own task, so a caller that disconnects does not
+        cancel it for the others.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            COALESCE_LEADERS.labels(self.operation).inc()
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            COALESCED_CALLS.labels(self.operation).inc()
+        return await asyncio.shield(task)
+
+
+# Global flights, one per operation
+_flights: Dict[str, SingleFlight] = {}
+
+
+def coalesce(operation: str, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Awaitable[Any]:
+    """Shortcut for ``SingleFlight(operation).do(key, fn)`` on a shared instance."""
+    flight = _flights.get(operation)
+    if flight is None:
+        flight = _flights[operation] = SingleFlight(operation)
+    return flight.do(key, fn)
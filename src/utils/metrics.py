@@ -0,0 +1,272 @@
+"""Prometheus metrics and per-stage latency instrumentation.
+
+Request handlers open a ``track_request`` block and code on the hot path wraps
+each stage in ``stage(name)``. Stage timings are recorded on the active request
+(so they can be inspected after the fact) and exported as histograms labelled
+by endpoint, tenant and provider.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus-client is not installed."""
+
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+
+    def observe(self, value: float) -> None:
+        pass
+
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def dec(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+
+def _histogram(name: str, documentation: str, labelnames, buckets=None):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    if buckets is None:
+        return Histogram(name, documentation, labelnames)
+    return Histogram(name, documentation, labelnames, buckets=buckets)
+
+
+def _gauge(name: str, documentation: str, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Gauge(name, documentation, labelnames)
+
+
+def _counter(name: str, documentation: str, labelnames=()):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+# Latency buckets (seconds) covering in-memory scoring up to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+REQUEST_LATENCY = _histogram(
+    "feattie_request_duration_seconds",
+    "End-to-end request latency",
+    ["endpoint", "tenant", "provider"],
+    buckets=LATENCY_BUCKETS,
+)
+
+STAGE_LATENCY = _histogram(
+    "feattie_stage_duration_seconds",
+    "Latency of individual request stages",
+    ["endpoint", "tenant", "provider", "stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+INDEX_SIZE = _gauge(
+    "feattie_index_size",
+    "Number of vectors in the search index",
+    ["tenant"],
+)
+
+LOADED_MODELS = _gauge(
+    "feattie_loaded_models",
+    "Embedding models currently loaded in this process",
+    ["model"],
+)
+
+EVENT_LOOP_LAG = _gauge(
+    "feattie_event_loop_lag_seconds",
+    "Delay between scheduled and actual wake-up of the event loop",
+)
+
+STARTUP_SECONDS = _gauge(
+    "feattie_startup_seconds",
+    "Time spent in startup imports and phases",
+    ["kind", "name"],
+)
+
+ADMISSION_QUEUE_DEPTH = _gauge(
+    "feattie_admission_queue_depth",
+    "Requests waiting for an execution slot",
+    ["operation"],
+)
+
+ADMISSION_IN_FLIGHT = _gauge(
+    "feattie_admission_in_flight",
+    "Requests holding an execution slot",
+    ["operation"],
+)
+
+ADMISSION_REJECTIONS = _counter(
+    "feattie_admission_rejections_total",
+    "Requests rejected by admission control",
+    ["operation", "reason"],
+)
+
+ADMISSION_WAIT = _histogram(
+    "feattie_admission_wait_seconds",
+    "Time spent waiting for an execution slot",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TENANT_ADMISSION_WAIT = _histogram(
+    "feattie_tenant_admission_wait_seconds",
+    "Time a tenant's requests spent waiting for an execution slot",
+    ["operation", "tenant"],
+    buckets=LATENCY_BUCKETS,
+)
+
+OPENAI_HTTP_REQUESTS = _counter(
+    "feattie_openai_http_requests_total",
+    "HTTP requests sent through the pooled OpenAI clients",
+)
+
+OPENAI_CONNECTIONS = _counter(
+    "feattie_openai_connections_opened_total",
+    "New connections opened by the pooled OpenAI clients",
+)
+
+COALESCE_LEADERS = _counter(
+    "feattie_coalesce_leaders_total",
+    "Calls that did the work for a group of identical in-flight requests",
+    ["operation"],
+)
+
+COALESCED_CALLS = _counter(
+    "feattie_coalesced_calls_total",
+    "Calls saved by sharing an identical in-flight call's result",
+    ["operation"],
+)
+
+RESULT_CACHE_LOOKUPS = _counter(
+    "feattie_result_cache_lookups_total",
+    "Search result cache lookups by outcome (hit, miss, not_modified)",
+    ["operation", "outcome"],
+)
+
+
+@dataclass
+class RequestTimings:
+    """Stage timings collected for a single request."""
+
+    endpoint: str
+    tenant: str = "default"
+    provider: str = "none"
+    started_at: float = field(default_factory=time.perf_counter)
+    stages: Dict[str, float] = field(default_factory=dict)
+    total: Optional[float] = None
+    # Thread currently doing work for this request (updated on stage entry)
+    active_thread: int = field(default_factory=threading.get_ident)
+
+
+_current_request: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "feattie_current_request", default=None
+)
+
+
+def current_request() -> Optional[RequestTimings]:
+    """Get timings of the request being handled, if any."""
+    return _current_request.get()
+
+
+def set_request_labels(tenant: Optional[str] = None, provider: Optional[str] = None) -> None:
+    """Attach tenant/provider labels to the current request.
+
+    Labels are usually only known once the request body has been parsed, so
+    handlers call this after ``track_request`` has been opened by middleware.
+    """
+    timings = _current_request.get()
+    if timings is None:
+        return
+    if tenant is not None:
+        timings.tenant = str(tenant)
+    if provider is not None:
+        timings.provider = provider
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[RequestTimings]:
+    """Time a whole request and make it the target of ``stage`` blocks."""
+    timings = RequestTimings(endpoint=endpoint)
+    token = _current_request.set(timings)
+    try:
+        yield timings
+    finally:
+        timings.total = time.perf_counter() - timings.started_at
+        _current_request.reset(token)
+        REQUEST_LATENCY.labels(timings.endpoint, timings.tenant, timings.provider).observe(
+            timings.total
+        )
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time one stage of the current request.
+
+    Outside of a request (CLI usage, background builds) the block still runs
+    but nothing is recorded.
+    """
+    timings = _current_request.get()
+    if timings is None:
+        yield
+        return
+
+    timings.active_thread = threading.get_ident()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings.stages[name] = timings.stages.get(name, 0.0) + elapsed
+        STAGE_LATENCY.labels(
+            timings.endpoint, timings.tenant, timings.provider, name
+        ).observe(elapsed)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """Sample event-loop lag forever; run as a background task."""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, loop.time() - expected))
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Render all metrics in the Prometheus text exposition format.
+
+    Returns:
+        Tuple of (payload, content type)
+    """
+    if not PROMETHEUS_AVAILABLE:
+        return (
+            b"# prometheus-client is not installed\n",
+            "text/plain; version=0.0.4; charset=utf-8",
+        )
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,134 @@
+"""Process-wide pool of OpenAI clients.
+
+Constructing ``OpenAI(...)`` per request throws away its HTTP connection
+pool, so every call pays TCP and TLS setup again. Clients are cached here by
+``(api_key, base_url)`` and all of them share one keep-alive ``httpx``
+connection pool. Idle clients are evicted least-recently-used first.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from config import get_config
+from src.utils.metrics import OPENAI_CONNECTIONS, OPENAI_HTTP_REQUESTS
+
+
+class OpenAIClientPool:
+    """LRU cache of OpenAI clients over a shared HTTP connection pool."""
+
+    def __init__(
+        self,
+        max_clients: int = 256,
+        idle_seconds: float = 600,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30,
+        timeout: float = 60
+    ):
+        """Initialize the pool.
+
+        Args:
+            max_clients: Maximum cached clients (one per API key / base URL)
+            idle_seconds: Clients unused for this long are evicted
+            max_connections: Connection limit of the shared HTTP pool
+            max_keepalive_connections: Idle connections kept open for reuse
+            keepalive_expiry: Seconds an idle connection is kept open
+            timeout: Default request timeout in seconds
+        """
+        self.max_clients = max_clients
+        self.idle_seconds = idle_seconds
+        self._clients: "OrderedDict[Tuple[str, Optional[str]], list]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.connections_opened = 0
+        self.clients_created = 0
+        self.clients_evicted = 0
+
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(timeout, connect=10.0),
+            event_hooks={"request": [self._on_request]}
+        )
+
+    def _on_request(self, request: httpx.Request) -> None:
+        self.requests += 1
+        OPENAI_HTTP_REQUESTS.inc()
+        # httpcore reports connection setup through the trace extension
+        request.extensions["trace"] = self._trace
+
+    def _trace(self, event_name: str, info: Dict[str, Any]) -> None:
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+            OPENAI_CONNECTIONS.inc()
+
+    def get(self, api_key: str, base_url: Optional[str] = None):
+        """Get the cached client for ``(api_key, base_url)``, creating it if needed."""
+        from openai import OpenAI
+
+        key = (api_key, base_url)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                entry[1] = now
+                self._clients.move_to_end(key)
+                return entry[0]
+
+            kwargs = {"api_key": api_key, "http_client": self.http_client}
+            if base_url:
+                kwargs["base_url"] = base_url
+            client = OpenAI(**kwargs)
+            self._clients[key] = [client, now]
+            self.clients_created += 1
+
+            # Clients hold no connections of their own, so dropping one is cheap
+            while self._clients:
+                oldest = next(iter(self._clients.values()))
+                if len(self._clients) <= self.max_clients and now - oldest[1] < self.idle_seconds:
+                    break
+                self._clients.popitem(last=False)
+                self.clients_evicted += 1
+            return client
+
+    def stats(self) -> Dict[str, Any]:
+        """Client cache and connection reuse statistics."""
+        reused = max(0, self.requests - self.connections_opened)
+        return {
+            "clients": len(self._clients),
+            "clients_created": self.clients_created,
+            "clients_evicted": self.clients_evicted,
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "connection_reuse_ratio": round(reused / self.requests, 3) if self.requests else None,
+        }
+
+
+# Global pool
+_pool: Optional[OpenAIClientPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_openai_pool() -> OpenAIClientPool:
+    """Get the global client pool, configured from ``openai_pool``."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            settings = get_config().get('openai_pool', default={}) or {}
+            _pool = OpenAIClientPool(**settings)
+        return _pool
+
+
+def get_openai_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """Pooled OpenAI client; ``api_key`` defaults to ``OPENAI_API_KEY``."""
+    return get_openai_pool().get(api_key or os.environ.get("OPENAI_API_KEY"), base_url)
@@ -0,0 +1,275 @@
+"""On-demand profiling and slow-request capture.
+
+A profiling session runs cProfile for the next N requests or for T seconds
+while a sampler thread records collapsed stacks of the threads serving those
+requests. Work a request hands to threadpool threads (through ``call``) is
+profiled on those threads and merged into the session's results. The sampler
+thread also samples the stack of any request still in flight past the
+slow-request threshold; when such a request finishes it is stored, with its
+stage timings and most frequent stacks, in a bounded ring buffer.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple, TypeVar
+
+from config import get_config
+from src.utils.metrics import RequestTimings, current_request
+
+T = TypeVar("T")
+
+
+def _collapse(frame) -> str:
+    """Render a frame stack as a single ``outer;...;inner`` line."""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
+
+
+class ProfileSession:
+    """A single cProfile run bounded by request count and/or wall time."""
+
+    def __init__(self, max_requests: Optional[int] = None, duration: Optional[float] = None):
+        if not max_requests and not duration:
+            raise ValueError("Specify max_requests or duration")
+
+        self.max_requests = max_requests
+        self.duration = duration
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.requests_profiled = 0
+        self.samples: Counter = Counter()
+        self.profile = cProfile.Profile()
+        # Merged profiles of work run on threadpool threads
+        self.worker_stats: Optional[pstats.Stats] = None
+        self._active = 0
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def _expired(self) -> bool:
+        if self.duration and time.time() - self.started_at >= self.duration:
+            return True
+        if self.max_requests and self.requests_profiled >= self.max_requests:
+            return True
+        return False
+
+    def add_worker_profile(self, profile: cProfile.Profile) -> None:
+        """Merge the profile of a call made on a worker thread."""
+        if self.worker_stats is None:
+            self.worker_stats = pstats.Stats(profile)
+        else:
+            self.worker_stats.add(profile)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "status": "done" if self.done else "running",
+            "max_requests": self.max_requests,
+            "duration": self.duration,
+            "requests_profiled": self.requests_profiled,
+            "stack_samples": sum(self.samples.values()),
+        }
+
+    def render(self, fmt: str = "text", limit: int = 50) -> bytes:
+        """Render results as ``text`` (pstats summary), ``pstats`` (binary,
+        loadable with ``pstats.Stats``/snakeviz) or ``collapsed`` stacks."""
+        if fmt == "collapsed":
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            return ("\n".join(lines) + "\n").encode("utf-8")
+
+        stats = pstats.Stats(self.profile)
+        if self.worker_stats is not None:
+            stats.add(self.worker_stats)
+        if fmt == "pstats":
+            return marshal.dumps(stats.stats)
+        if fmt == "text":
+            stream = io.StringIO()
+            stats.stream = stream
+            stats.sort_stats("cumulative").print_stats(limit)
+            return stream.getvalue().encode("utf-8")
+        raise ValueError(f"Unknown profile format: {fmt}. Choose 'text', 'pstats' or 'collapsed'")
+
+
+class RequestProfiler:
+    """Tracks in-flight requests for profiling sessions and slow-request capture."""
+
+    def __init__(
+        self,
+        slow_request_ms: float = 1000.0,
+        buffer_size: int = 100,
+        sample_interval_ms: float = 10.0,
+    ):
+        """Initialize the profiler.
+
+        Args:
+            slow_request_ms: Requests slower than this are captured (0 disables)
+            buffer_size: Number of slow requests kept in the ring buffer
+            sample_interval_ms: Stack sampling interval for sessions and watchdog
+        """
+        self.slow_request_s = slow_request_ms / 1000.0
+        self.sample_interval = sample_interval_ms / 1000.0
+        self.slow_requests: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.session: Optional[ProfileSession] = None
+
+        self._lock = threading.Lock()
+        # id(timings) -> (timings, collapsed stack samples once over threshold)
+        self._in_flight: Dict[int, Tuple[RequestTimings, Counter]] = {}
+        # id(timings) -> session profiling that request
+        self._profiled: Dict[int, ProfileSession] = {}
+        self._sampler: Optional[threading.Thread] = None
+
+    # Profiling sessions ---------------------------------------------------
+
+    def start_session(self, max_requests: Optional[int] = None, duration: Optional[float] = None) -> ProfileSession:
+        """Start a new profiling session, replacing any finished one."""
+        with self._lock:
+            if self.session is not None and not self.session.done:
+                raise RuntimeError("A profiling session is already running")
+            self.session = ProfileSession(max_requests=max_requests, duration=duration)
+        self._ensure_sampler()
+        return self.session
+
+    def _finish_session_locked(self, session: ProfileSession) -> None:
+        if not session.done and session._active == 0 and session._expired():
+            session.finished_at = time.time()
+
+    # Request tracking -----------------------------------------------------
+
+    @contextmanager
+    def observe(self, timings: RequestTimings) -> Iterator[None]:
+        """Wrap the handling of one request."""
+        key = id(timings)
+        with self._lock:
+            self._in_flight[key] = (timings, Counter())
+            session = self.session
+            if session is not None and not session.done and not session._expired():
+                if session._active == 0:
+                    session.profile.enable()
+                session._active += 1
+                self._profiled[key] = session
+            else:
+                session = None
+        if session is not None or self.slow_request_s > 0:
+            self._ensure_sampler()
+
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - timings.started_at
+            with self._lock:
+                _, samples = self._in_flight.pop(key)
+                self._profiled.pop(key, None)
+                if session is not None:
+                    session._active -= 1
+                    session.requests_profiled += 1
+                    if session._active == 0:
+                        session.profile.disable()
+                    self._finish_session_locked(session)
+
+            if self.slow_request_s > 0 and elapsed >= self.slow_request_s:
+                self.slow_requests.append({
+                    "timestamp": datetime.now(timezone.utc).isoformat(),
+                    "endpoint": timings.endpoint,
+                    "tenant": timings.tenant,
+                    "provider": timings.provider,
+                    "elapsed_ms": elapsed * 1000,
+                    "stages_ms": {k: v * 1000 for k, v in timings.stages.items()},
+                    "stack_samples": [
+                        {"stack": stack, "count": count}
+                        for stack, count in samples.most_common(5)
+                    ],
+                })
+
+    def call(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Call ``fn`` on a worker thread, profiling it if its request is being profiled.
+
+        The session's cProfile only sees the event-loop thread, so work handed
+        to threadpool threads is profiled here and merged into the session.
+        """
+        timings = current_request()
+        session = self._profiled.get(id(timings)) if timings is not None else None
+        if session is None or session.done:
+            return fn(*args, **kwargs)
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active (one per interpreter since Python 3.12)
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.disable()
+            with self._lock:
+                session.add_worker_profile(profile)
+
+    # Sampler thread -------------------------------------------------------
+
+    def _ensure_sampler(self) -> None:
+        with self._lock:
+            if self._sampler is not None and self._sampler.is_alive():
+                return
+            self._sampler = threading.Thread(
+                target=self._sample_loop, name="request-profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        while True:
+            time.sleep(self.sample_interval)
+            if not self._in_flight and (self.session is None or self.session.done):
+                continue
+
+            now = time.perf_counter()
+            frames = sys._current_frames()
+
+            with self._lock:
+                session = self.session
+                if session is not None and not session.done:
+                    # Time-bounded sessions may end while no request is active
+                    self._finish_session_locked(session)
+                    if not session.done and session._active > 0:
+                        threads = {t.active_thread for t, _ in self._in_flight.values()}
+                        for thread_id in threads:
+                            frame = frames.get(thread_id)
+                            if frame is not None:
+                                session.samples[_collapse(frame)] += 1
+
+                for timings, samples in self._in_flight.values():
+                    if now - timings.started_at >= self.slow_request_s > 0:
+                        frame = frames.get(timings.active_thread)
+                        if frame is not None:
+                            samples[_collapse(frame)] += 1
+
+            del frames
+
+
+# Global profiler instance
+_profiler = None
+
+
+def get_profiler() -> RequestProfiler:
+    """Get global profiler instance configured from ``profiling`` settings."""
+    global _profiler
+    if _profiler is None:
+        config = get_config()
+        _profiler = RequestProfiler(
+            slow_request_ms=config.get('profiling', 'slow_request_ms', default=1000),
+            buffer_size=config.get('profiling', 'slow_request_buffer', default=100),
+            sample_interval_ms=config.get('profiling', 'sample_interval_ms', default=10),
+        )
+    return _profiler
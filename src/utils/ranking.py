@@ -0,0 +1,52 @@
+"""Top-k selection over similarity scores.
+
+Kept free of heavy imports so shard worker processes can use it.
+"""
+from typing import Any, List, Sequence
+
+import numpy as np
+
+
+def select_top(scores: np.ndarray, top_k: int, group_ids: Sequence[Any], deduplicate: bool) -> List[int]:
+    """Pick row indices of the top-k scores, optionally one per group.
+
+    Only a candidate pool is sorted (``argpartition``); with deduplication the
+    pool grows until it yields ``top_k`` distinct groups. Ties keep catalog
+    order.
+
+    Args:
+        scores: 1-D similarity scores
+        top_k: Number of rows to return
+        group_ids: Group (product) of each row, used for deduplication
+        deduplicate: If True, keep only the best row per group
+
+    Returns:
+        Row indices, best first
+    """
+    n = len(scores)
+    if n == 0 or top_k <= 0:
+        return []
+
+    if not deduplicate:
+        k = min(top_k, n)
+        idx = np.sort(np.argpartition(-scores, k - 1)[:k])
+        return idx[np.argsort(-scores[idx], kind="stable")].tolist()
+
+    pool = min(n, top_k * 4)
+    while True:
+        idx = np.sort(np.argpartition(-scores, pool - 1)[:pool]) if pool < n else np.arange(n)
+        idx = idx[np.argsort(-scores[idx], kind="stable")]
+
+        seen_groups = set()
+        selected = []
+        for i in idx.tolist():
+            group_id = group_ids[i]
+            if group_id not in seen_groups:
+                seen_groups.add(group_id)
+                selected.append(i)
+                if len(selected) >= top_k:
+                    return selected
+
+        if pool >= n:
+            return selected
+        pool = min(n, pool * 4)
@@ -0,0 +1,94 @@
+"""Cache of search results keyed by index version.
+
+Results depend only on the query, its parameters and the index they were
+computed against, so they are cached under ``(tenant, index version, key)``.
+Once a tenant's index version moves on (rebuild, upsert), its older entries
+are dropped and never served again. ``etag_for`` and ``etag_matches`` let the
+API tag responses so clients and CDNs can revalidate them with
+``If-None-Match``.
+"""
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+from src.utils.metrics import RESULT_CACHE_LOOKUPS
+
+_ENTRY_OVERHEAD_BYTES = 200
+
+
+def etag_for(payload: bytes) -> str:
+    """Strong ETag of a response body."""
+    return '"' + hashlib.blake2b(payload, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header matches ``etag``."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResultCache:
+    """Bounded LRU of serialized results, invalidated per tenant by index version."""
+
+    def __init__(self, max_entries: int = 10000, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[Any, int, Hashable], bytes]" = OrderedDict()
+        self._by_tenant: Dict[Any, Set[Tuple[Any, int, Hashable]]] = {}
+        self._versions: Dict[Any, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _observe_version(self, tenant: Any, version: int) -> bool:
+        """Track the newest version of a tenant; False if ``version`` is outdated."""
+        current = self._versions.get(tenant)
+        if current is not None and version < current:
+            return False
+        if current is not None and version > current:
+            for key in self._by_tenant.pop(tenant, set()):
+                self._bytes -= len(self._entries.pop(key)) + _ENTRY_OVERHEAD_BYTES
+        self._versions[tenant] = version
+        return True
+
+    def _remove(self, key: Tuple[Any, int, Hashable]) -> None:
+        value = self._entries.pop(key)
+        self._bytes -= len(value) + _ENTRY_OVERHEAD_BYTES
+        keys = self._by_tenant.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+
+    def get(self, operation: str, tenant: Any, version: int, key: Hashable) -> Optional[bytes]:
+        """Cached value, or None."""
+        full_key = (tenant, version, (operation, key))
+        with self._lock:
+            value = None
+            if self._observe_version(tenant, version):
+                value = self._entries.get(full_key)
+                if value is not None:
+                    self._entries.move_to_end(full_key)
+        RESULT_CACHE_LOOKUPS.labels(operation, "hit" if value is not None else "miss").inc()
+        return value
+
+    def put(self, operation: str, tenant: Any, version: int, key: Hashable, value: bytes) -> None:
+        """Cache ``value``; ignored if the tenant's index has moved past ``version``."""
+        full_key = (tenant, version, (operation, key))
+        with self._lock:
+            if not self._observe_version(tenant, version):
+                return
+            if full_key in self._entries:
+                self._remove(full_key)
+            self._entries[full_key] = value
+            self._by_tenant.setdefault(tenant, set()).add(full_key)
+            self._bytes += len(value) + _ENTRY_OVERHEAD_BYTES
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes, "tenants": len(self._by_tenant)}
+
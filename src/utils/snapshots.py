@@ -0,0 +1,58 @@
+"""Crash-safe snapshot directories.
+
+A snapshot is a set of data files named by generation (``<name>-<gen>.<ext>``)
+plus ``meta.json``, which names the files of the current generation. A save
+writes a new generation's files, then atomically replaces ``meta.json``, then
+removes the files of older generations. A crash at any point leaves
+``meta.json`` pointing at one complete generation, never a mix of two.
+"""
+from __future__ import annotations
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+_GENERATION_FILE = re.compile(r".+-\d{6}\.[A-Za-z0-9.]+$")
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def next_generation(meta_path: Path) -> int:
+    """Generation after the one ``meta_path`` names (1 if there is none)."""
+    try:
+        return int(json.loads(meta_path.read_text(encoding="utf-8")).get("generation", 0)) + 1
+    except (OSError, ValueError, AttributeError):
+        return 1
+
+
+def replace_meta(meta_path: Path, meta: Dict[str, Any]) -> None:
+    """Write ``meta_path`` via a temporary file, fsync it and rename it into place."""
+    tmp = meta_path.with_name(meta_path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(json.dumps(meta).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, meta_path)
+    _fsync_dir(meta_path.parent)
+
+
+def remove_other_generations(directory: Path, keep: Iterable[str]) -> None:
+    """Delete generation files in ``directory`` other than ``keep``.
+
+    Memory-mapped readers of deleted files keep working (POSIX).
+    """
+    keep = set(keep)
+    for path in directory.iterdir():
+        if path.name not in keep and _GENERATION_FILE.match(path.name):
+            try:
+                path.unlink()
+            except OSError as e:
+                print(f"[WARN] Could not remove old snapshot file {path}: {e}")
@@ -0,0 +1,152 @@
+"""Startup-time report broken down by import and phase.
+
+Importing this module installs an import timer for a fixed set of heavy
+libraries, so servers import it before anything else. Startup code wraps its
+steps in ``phase(name)``; once the server is ready, ``finish()`` logs the
+report and exports it as ``feattie_startup_seconds`` gauges.
+"""
+from __future__ import annotations
+
+import importlib.abc
+import importlib.util
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Top-level packages whose import time is worth tracking
+TRACKED_IMPORTS = (
+    "numpy",
+    "fastapi",
+    "pydantic",
+    "openai",
+    "prometheus_client",
+    "sentence_transformers",
+    "torch",
+    "transformers",
+)
+
+
+class StartupReport:
+    """Collects import and phase timings from process start until ready."""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready_at: Optional[float] = None
+        self.imports: List[Tuple[str, float]] = []
+        self.phases: List[Tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.ready_at is not None
+
+    def record_import(self, module: str, seconds: float) -> None:
+        with self._lock:
+            self.imports.append((module, seconds))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a startup phase. Phases run after ``finish()`` are not recorded."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if not self.finished:
+                with self._lock:
+                    self.phases.append((name, time.perf_counter() - start))
+
+    def summary(self) -> Dict[str, Any]:
+        end = self.ready_at if self.ready_at is not None else time.perf_counter()
+        return {
+            "ready": self.finished,
+            "total_seconds": end - self.started_at,
+            "imports": [{"module": m, "seconds": s} for m, s in self.imports],
+            "phases": [{"phase": p, "seconds": s} for p, s in self.phases],
+        }
+
+    def finish(self) -> None:
+        """Mark the process ready, log the report and export gauges."""
+        from src.utils.metrics import STARTUP_SECONDS
+
+        if self.finished:
+            return
+        self.ready_at = time.perf_counter()
+
+        summary = self.summary()
+        print(f"[INFO] Startup completed in {summary['total_seconds']:.2f}s")
+        for module, seconds in self.imports:
+            print(f"[INFO]   import {module}: {seconds:.3f}s")
+            STARTUP_SECONDS.labels("import", module).set(seconds)
+        for name, seconds in self.phases:
+            print(f"[INFO]   phase {name}: {seconds:.3f}s")
+            STARTUP_SECONDS.labels("phase", name).set(seconds)
+        STARTUP_SECONDS.labels("total", "total").set(summary["total_seconds"])
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Loader proxy that times ``exec_module`` and then removes itself."""
+
+    def __init__(self, loader, name: str, report: StartupReport):
+        self._loader = loader
+        self._name = name
+        self._report = report
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Restore the real loader so nothing downstream sees the proxy
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._report.record_import(self._name, time.perf_counter() - start)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """Meta path finder that wraps loaders of tracked top-level packages.
+
+    Times are inclusive: importing ``sentence_transformers`` includes the
+    ``torch`` import it triggers, which is also reported on its own.
+    """
+
+    def __init__(self, report: StartupReport, modules):
+        self._report = report
+        self._modules = set(modules)
+        self._resolving = set()
+
+    def find_spec(self, fullname, path=None, target=None):
+        if fullname not in self._modules or fullname in self._resolving:
+            return None
+
+        self._resolving.add(fullname)
+        try:
+            spec = importlib.util.find_spec(fullname)
+        finally:
+            self._resolving.discard(fullname)
+
+        if spec is None or spec.loader is None:
+            return None
+        spec.loader = _TimedLoader(spec.loader, fullname, self._report)
+        return spec
+
+
+# Global report instance, started when this module is first imported
+_report = StartupReport()
+sys.meta_path.insert(0, _ImportTimer(_report, TRACKED_IMPORTS))
+
+
+def get_startup_report() -> StartupReport:
+    """Get global startup report."""
+    return _report
+
+
+def phase(name: str):
+    """Time a startup phase on the global report."""
+    return _report.phase(name)
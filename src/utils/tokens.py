@@ -0,0 +1,46 @@
+"""Token counting for prompt budgets.
+
+Uses tiktoken when it is installed; otherwise falls back to a character-based
+estimate that errs on the high side, which is the safe direction for budgets.
+"""
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# Fallback estimate; Turkish text averages a little over 3 characters per token
+CHARS_PER_TOKEN = 3.0
+
+
+@lru_cache(maxsize=16)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    """Count (or estimate) the tokens ``text`` uses for ``model``."""
+    if not text:
+        return 0
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding(model).encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Cut ``text`` so it fits in ``max_tokens``."""
+    if max_tokens <= 0:
+        return ""
+    if TIKTOKEN_AVAILABLE:
+        encoding = _encoding(model)
+        tokens = encoding.encode(text, disallowed_special=())
+        return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
+    return text[:int(max_tokens * CHARS_PER_TOKEN)]
@@ -0,0 +1,77 @@
+"""Product-level indexing of variant rows.
+
+``shop_pull.build_rag_and_sot`` writes one RAG row per variant, and those
+rows differ only by a color/size suffix. In ``product`` index mode, the
+variants of a product share a single embedding of the product text, which
+lists every color and size. The variant is picked after retrieval by
+matching its color/size against the query.
+"""
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Sequence
+
+
+def group_variants(rows: Sequence[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group variant rows by ``product_id``, keeping the catalog order."""
+    groups: Dict[Any, List[Dict[str, Any]]] = {}
+    for row in rows:
+        groups.setdefault(row.get("product_id"), []).append(row)
+    return list(groups.values())
+
+
+def _unique(values) -> List[str]:
+    seen = {}
+    for value in values:
+        if value:
+            seen.setdefault(value.casefold(), value)
+    return list(seen.values())
+
+
+def product_text(variants: Sequence[Dict[str, Any]]) -> str:
+    """Text embedded once for all variants of a product.
+
+    The leading "<title> <color> <size>." sentence of the variant text is
+    replaced by the product title and the lists of all colors and sizes.
+    """
+    first = variants[0]
+    text = first.get("text") or ""
+    if len(variants) == 1:
+        return text
+
+    title = (first.get("title") or "").split(" — ")[0].strip()
+    colors = _unique(c for v in variants for c in v.get("colors") or [])
+    sizes = _unique(s for v in variants for s in v.get("sizes") or [])
+
+    fragment = " ".join([title, *(first.get("colors") or []), *(first.get("sizes") or [])]).strip()
+    if fragment and text.startswith(fragment + "."):
+        text = text[len(fragment) + 1:].lstrip()
+
+    parts = [f"{title}." if title else ""]
+    if colors:
+        parts.append(f"Colors: {', '.join(colors)}.")
+    if sizes:
+        parts.append(f"Sizes: {', '.join(sizes)}.")
+    parts.append(text)
+    return " ".join(p for p in parts if p)
+
+
+def _normalize(text: str) -> str:
+    return " " + " ".join(re.findall(r"\w+", text.casefold())) + " "
+
+
+def match_score(variant: Dict[str, Any], normalized_query: str) -> int:
+    """Number of the variant's colors/sizes mentioned in the query."""
+    return sum(
+        _normalize(value) in normalized_query
+        for value in (*(variant.get("colors") or []), *(variant.get("sizes") or []))
+        if value
+    )
+
+
+def rank_variants(variants: Sequence[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """Variants ordered by how well they match the query (catalog order on ties)."""
+    if not query:
+        return list(variants)
+    normalized = _normalize(query)
+    return sorted(variants, key=lambda v: -match_score(v, normalized))
@@ -0,0 +1,429 @@
+"""Persistent per-tenant vector store.
+
+Each tenant has its own directory::
+
+    manifest.json       segments, dimension, model and the last compacted log
+    seg-<gen>.npy       normalized float32 vectors (memory-mapped on load)
+    seg-<gen>.ids.npy   int64 ids of the segment rows
+    log-<gen>.bin       append-only upserts and deletes made after compaction
+
+Writes go to the log (one fsync per batch) and are applied in memory on top
+of the segments. Log records are ``length | crc32 | payload``; a torn or
+corrupt tail left by a crash is truncated when the log is replayed. Once
+enough records pile up, a background thread folds the segments and logs
+into one new segment; the manifest is replaced atomically, so a crash at
+any point leaves either the old or the new state on disk.
+"""
+from __future__ import annotations
+
+import json
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config import get_config
+from src.utils.ranking import select_top
+
+_RECORD_HEADER = struct.Struct(">II")  # payload length, crc32
+_RECORD_KEY = struct.Struct("<Bq")  # op, id
+_UPSERT = 1
+_DELETE = 2
+
+
+def _fsync_dir(directory: Path) -> None:
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _write_atomic(path: Path, write) -> None:
+    """Write ``path`` via a temporary file, fsync it and rename it into place."""
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """An immutable block of vectors plus a mask of rows still current."""
+
+    def __init__(self, name: str, matrix: np.ndarray, ids: np.ndarray):
+        self.name = name
+        self.matrix = matrix
+        self.ids = ids
+        self.alive = np.ones(len(ids), dtype=bool)
+
+
+class TenantVectors:
+    """Vectors of one tenant: memory-mapped segments plus an append log."""
+
+    def __init__(self, directory: str, compact_after_records: int = 5000, fsync: bool = True):
+        """Open (or create) a tenant directory and recover its state.
+
+        Args:
+            directory: Tenant directory
+            compact_after_records: Compact once the log holds this many records
+            fsync: fsync the log after every write batch
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.compact_after_records = compact_after_records
+        self.fsync = fsync
+
+        self._lock = threading.RLock()
+        self._compacting = False
+        # Bumped by every upsert and delete (keys cached search results)
+        self.version = 0
+        self.dim: Optional[int] = None
+        self.model: Optional[str] = None
+        self._load()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads((self.directory / "manifest.json").read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {"segments": [], "compacted_through": 0, "dim": None, "model": None}
+
+    def _write_manifest(self, segments: List[str], compacted_through: int) -> None:
+        manifest = {
+            "segments": segments,
+            "compacted_through": compacted_through,
+            "dim": self.dim,
+            "model": self.model,
+        }
+        _write_atomic(
+            self.directory / "manifest.json",
+            lambda f: f.write(json.dumps(manifest).encode("utf-8"))
+        )
+        _fsync_dir(self.directory)
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"log-{generation:06d}.bin"
+
+    def _log_generations(self) -> List[int]:
+        return sorted(int(p.stem.split("-")[1]) for p in self.directory.glob("log-*.bin"))
+
+    def _load(self) -> None:
+        """Load segments from the manifest and replay newer logs."""
+        manifest = self._read_manifest()
+        self.dim = manifest.get("dim")
+        self.model = manifest.get("model")
+        self._compacted_through = manifest.get("compacted_through", 0)
+
+        self._segments: List[_Segment] = []
+        for name in manifest.get("segments", []):
+            matrix = np.load(self.directory / f"{name}.npy", mmap_mode="r")
+            ids = np.load(self.directory / f"{name}.ids.npy")
+            self._segments.append(_Segment(name, matrix, ids))
+        self._reset_memory()
+
+        # Files not referenced by the manifest are leftovers of an
+        # interrupted compaction (or already compacted)
+        live = set(manifest.get("segments", []))
+        for path in self.directory.glob("seg-*.npy"):
+            if path.name.split(".")[0] not in live:
+                path.unlink()
+        for path in self.directory.glob("*.tmp"):
+            path.unlink()
+
+        generations = []
+        for generation in self._log_generations():
+            if generation <= self._compacted_through:
+                self._log_path(generation).unlink()
+            else:
+                generations.append(generation)
+
+        self._log_records = 0
+        for generation in generations:
+            self._log_records += self._replay(self._log_path(generation))
+
+        self._generation = generations[-1] if generations else self._compacted_through + 1
+        self._log = self._log_path(self._generation).open("ab")
+
+    def _reset_memory(self) -> None:
+        """Index segment rows by id; the overlay holds upserts since compaction."""
+        self._locations: Dict[int, Tuple[int, int]] = {}
+        for s, segment in enumerate(self._segments):
+            for row, vector_id in enumerate(segment.ids.tolist()):
+                self._locations[vector_id] = (s, row)
+        self._overlay: Dict[int, np.ndarray] = {}
+        self._overlay_block: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+    def _replay(self, path: Path) -> int:
+        """Apply a log file, truncating a torn or corrupt tail. Returns records applied."""
+        applied = 0
+        good = 0
+        with path.open("rb") as f:
+            data = f.read()
+
+        offset = 0
+        while offset + _RECORD_HEADER.size <= len(data):
+            length, crc = _RECORD_HEADER.unpack_from(data, offset)
+            start = offset + _RECORD_HEADER.size
+            payload = data[start:start + length]
+            if len(payload) < length or zlib.crc32(payload) != crc:
+                break
+            op, vector_id = _RECORD_KEY.unpack_from(payload)
+            if op == _UPSERT:
+                self._apply_upsert(vector_id, np.frombuffer(payload, dtype="<f4", offset=_RECORD_KEY.size))
+            else:
+                self._apply_delete(vector_id)
+            applied += 1
+            offset = good = start + length
+
+        if good < len(data):
+            print(f"[WARN] Truncating {len(data) - good} corrupt bytes at the end of {path}")
+            with path.open("r+b") as f:
+                f.truncate(good)
+        return applied
+
+    def _append(self, records: List[bytes]) -> None:
+        frames = b"".join(
+            _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload for payload in records
+        )
+        self._log.write(frames)
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._log_records += len(records)
+
+    def _apply_upsert(self, vector_id: int, vector: np.ndarray) -> None:
+        location = self._locations.pop(vector_id, None)
+        if location is not None:
+            self._segments[location[0]].alive[location[1]] = False
+        self._overlay[vector_id] = vector
+        self._overlay_block = None
+
+    def _apply_delete(self, vector_id: int) -> bool:
+        location = self._locations.pop(vector_id, None)
+        if location is not None:
+            self._segments[location[0]].alive[location[1]] = False
+        found = self._overlay.pop(vector_id, None) is not None or location is not None
+        self._overlay_block = None
+        return found
+
+    def _overlay_arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        if self._overlay_block is None:
+            ids = np.fromiter(self._overlay.keys(), dtype=np.int64, count=len(self._overlay))
+            matrix = (
+                np.stack(list(self._overlay.values())) if self._overlay
+                else np.zeros((0, self.dim or 0), dtype=np.float32)
+            )
+            self._overlay_block = (ids, matrix)
+        return self._overlay_block
+
+    def upsert(self, ids: Sequence[int], vectors, model: Optional[str] = None) -> int:
+        """Insert or replace vectors.
+
+        Raises:
+            ValueError: Dimension or model differs from the stored vectors
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) != len(ids):
+            raise ValueError("Expected one vector per id")
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        matrix = np.ascontiguousarray(matrix / norms, dtype="<f4")
+
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                self.model = model
+                # The log format depends on the dimension: record it first
+                self._write_manifest([s.name for s in self._segments], self._compacted_through)
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+            if model and self.model and model != self.model:
+                raise ValueError(f"Store holds {self.model} vectors, got {model}")
+
+            records = [
+                _RECORD_KEY.pack(_UPSERT, int(vector_id)) + row.tobytes()
+                for vector_id, row in zip(ids, matrix)
+            ]
+            self._append(records)
+            for vector_id, row in zip(ids, matrix):
+                self._apply_upsert(int(vector_id), row)
+            self.version += 1
+
+        self.maybe_compact()
+        return len(records)
+
+    def delete(self, ids: Iterable[int]) -> int:
+        """Delete vectors by id. Returns how many existed."""
+        ids = [int(i) for i in ids]
+        with self._lock:
+            self._append([_RECORD_KEY.pack(_DELETE, vector_id) for vector_id in ids])
+            deleted = sum(self._apply_delete(vector_id) for vector_id in ids)
+            self.version += 1
+
+        self.maybe_compact()
+        return deleted
+
+    def search(self, query: np.ndarray, top_k: int = 10) -> List[Tuple[int, float]]:
+        """Top-k ``(id, cosine similarity)`` pairs, best first."""
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+
+        with self._lock:
+            if self.dim is not None and len(query) != self.dim:
+                raise ValueError(f"Expected a {self.dim}-dimensional query, got {len(query)}")
+            blocks = [(s.matrix, s.ids, s.alive.copy()) for s in self._segments]
+            overlay_ids, overlay_matrix = self._overlay_arrays()
+
+        candidates = []
+        for matrix, ids, alive in blocks + [(overlay_matrix, overlay_ids, None)]:
+            if len(ids) == 0:
+                continue
+            scores = matrix @ query
+            if alive is not None:
+                scores[~alive] = -np.inf
+            for row in select_top(scores, top_k, ids, False):
+                if np.isfinite(scores[row]):
+                    candidates.append((int(ids[row]), float(scores[row])))
+
+        candidates.sort(key=lambda c: -c[1])
+        return candidates[:top_k]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._locations) + len(self._overlay)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "vectors": len(self._locations) + len(self._overlay),
+                "version": self.version,
+                "dimension": self.dim,
+                "model": self.model,
+                "segments": len(self._segments),
+                "segment_rows": int(sum(len(s.ids) for s in self._segments)),
+                "log_records": self._log_records,
+                "compacting": self._compacting,
+            }
+
+    def maybe_compact(self) -> bool:
+        """Start a background compaction if the log is large enough."""
+        with self._lock:
+            if self._compacting or self._log_records < self.compact_after_records:
+                return False
+            self._compacting = True
+
+        threading.Thread(target=self._compact_guarded, name="vector-compaction", daemon=True).start()
+        return True
+
+    def compact(self) -> None:
+        """Fold segments and logs into one segment (blocking)."""
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        self._compact_guarded()
+
+    def _compact_guarded(self) -> None:
+        try:
+            self._compact()
+        except Exception as e:
+            print(f"[ERROR] Vector store compaction failed in {self.directory}: {e}")
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _compact(self) -> None:
+        # Freeze the current log and snapshot the state it produced; writes
+        # made meanwhile go to the next log generation
+        with self._lock:
+            frozen = self._generation
+            self._log.close()
+            self._generation += 1
+            self._log = self._log_path(self._generation).open("ab")
+            self._log_records = 0
+
+            blocks = [(s.matrix, s.ids, s.alive.copy()) for s in self._segments]
+            overlay_ids, overlay_matrix = self._overlay_arrays()
+            old_segments = [s.name for s in self._segments]
+
+        matrix = np.concatenate(
+            [np.asarray(m[alive]) for m, _, alive in blocks] + [overlay_matrix]
+        ).astype("<f4", copy=False)
+        ids = np.concatenate(
+            [segment_ids[alive] for _, segment_ids, alive in blocks] + [overlay_ids]
+        ).astype(np.int64, copy=False)
+
+        name = f"seg-{frozen:06d}"
+        _write_atomic(self.directory / f"{name}.npy", lambda f: np.save(f, matrix))
+        _write_atomic(self.directory / f"{name}.ids.npy", lambda f: np.save(f, ids))
+        self._write_manifest([name], frozen)
+
+        # Swap in the new segment and re-apply writes made during compaction
+        with self._lock:
+            self._compacted_through = frozen
+            self._segments = [_Segment(name, np.load(self.directory / f"{name}.npy", mmap_mode="r"), ids)]
+            self._reset_memory()
+            self._log.flush()
+            self._log_records = self._replay(self._log_path(self._generation))
+
+        for old in old_segments:
+            for suffix in (".npy", ".ids.npy"):
+                path = self.directory / f"{old}{suffix}"
+                if old != name and path.exists():
+                    path.unlink()
+        for generation in self._log_generations():
+            if generation <= frozen:
+                self._log_path(generation).unlink()
+
+        print(f"[INFO] Compacted {self.directory}: {len(ids)} vectors in {name}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._log.close()
+
+
+class VectorStore:
+    """Directory of per-tenant vector stores, opened on first use."""
+
+    def __init__(self, root: str, compact_after_records: int = 5000, fsync: bool = True):
+        self.root = Path(root)
+        self.compact_after_records = compact_after_records
+        self.fsync = fsync
+        self._tenants: Dict[int, TenantVectors] = {}
+        self._lock = threading.Lock()
+
+    def tenant(self, tenant_id: int) -> TenantVectors:
+        tenant_id = int(tenant_id)
+        with self._lock:
+            store = self._tenants.get(tenant_id)
+            if store is None:
+                store = self._tenants[tenant_id] = TenantVectors(
+                    str(self.root / str(tenant_id)),
+                    compact_after_records=self.compact_after_records,
+                    fsync=self.fsync
+                )
+            return store
+
+
+# Global store
+_store: Optional[VectorStore] = None
+
+
+def get_vector_store() -> VectorStore:
+    """Get the global tenant vector store, configured from ``vector_store``."""
+    global _store
+    if _store is None:
+        config = get_config()
+        _store = VectorStore(
+            config.get('data', 'tenant_vectors', default="./out/tenant_vectors"),
+            compact_after_records=config.get('vector_store', 'compact_after_records', default=5000),
+            fsync=config.get('vector_store', 'fsync', default=True),
+        )
+    return _store